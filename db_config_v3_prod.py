@@ -0,0 +1,145 @@
+import os
+import threading
+import logging
+import time
+from collections import namedtuple
+import oracledb
+
+logger = logging.getLogger(__name__)
+
+# Defaults are the original hardcoded production connection; every value can
+# be overridden per role from the environment, e.g.
+#   STATREP_DB_WRITE_DSN / STATREP_DB_WRITE_USER / STATREP_DB_WRITE_PASSWORD
+#   STATREP_DB_READ_DSN  / STATREP_DB_READ_USER  / STATREP_DB_READ_PASSWORD
+#   STATREP_DB_READ_POOL_MAX, STATREP_DB_WRITE_POOL_MIN, ...
+#   STATREP_DB_WRITE_SQLITE / STATREP_DB_READ_SQLITE - a SQLite file in place
+#     of the Oracle service (local stand-in, see db_sqlite_v3_prod)
+# Unset READ values fall back to the WRITE ones, so a single-database
+# deployment needs no configuration at all.
+DEFAULT_DSN = '''(description= (retry_count=3)(retry_delay=2)(address=(protocol=tcps)(port=1521)(host=adb.us-phoenix-1.oraclecloud.com))(connect_data=(service_name=g5cdaf2f9aabdbb_yeiublpmhgwxw343_low.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))'''
+DEFAULT_USER = "MAILMAN"
+DEFAULT_PASSWORD = "$Tms320c52password!"
+DEFAULT_POOL_MIN = 1
+POOL_PING_INTERVAL = 60  # seconds idle before a pooled connection is pinged on acquire
+# An exhausted pool makes acquire() wait this long, then fail (DPY-4005), so
+# a busy process reports "database unavailable" instead of hanging the caller
+POOL_WAIT_TIMEOUT_MS = 5000
+
+# Pool size per process. Each open form session holds a STATREP and a handles
+# connection (its reference lists are read once and released); the submission
+# writers hold one each; SERVICE_CONNECTIONS covers the change feed, index
+# loads and concurrent API requests. Set STATREP_DB_EXPECTED_SESSIONS to the
+# sessions one worker serves, or STATREP_DB_*_POOL_MAX to size it directly.
+EXPECTED_SESSIONS_ENV = "STATREP_DB_EXPECTED_SESSIONS"
+DEFAULT_EXPECTED_SESSIONS = 20
+CONNECTIONS_PER_SESSION = 2
+WRITER_COUNT = 4         # submission writer threads (statrep_submit_queue_v3_prod)
+SERVICE_CONNECTIONS = 8
+
+# Reads about a handle or location someone just wrote go to the primary
+# for this long, so replica lag never hides a report its author just submitted
+READ_YOUR_WRITES_SECONDS = 30.0
+
+ROLES = ("write", "read")
+
+DatabaseSettings = namedtuple("DatabaseSettings", "dsn user password pool_min pool_max sqlite")
+
+def _env(role, name, default):
+    value = os.getenv(f"STATREP_DB_{role.upper()}_{name}")
+    if value:
+        return value
+    if role == "read":
+        return _env("write", name, default)
+    return default
+
+def default_pool_max():
+    """Connections one process can hold at once (see CONNECTIONS_PER_SESSION)"""
+    sessions = int(os.getenv(EXPECTED_SESSIONS_ENV) or DEFAULT_EXPECTED_SESSIONS)
+    return sessions * CONNECTIONS_PER_SESSION + WRITER_COUNT + SERVICE_CONNECTIONS
+
+def get_settings(role="write"):
+    """Connection settings for a role ("write" = primary, "read" = replica/read-only service)"""
+    if role not in ROLES:
+        raise ValueError(f"unknown database role {role!r}")
+    return DatabaseSettings(
+        dsn=_env(role, "DSN", DEFAULT_DSN),
+        user=_env(role, "USER", DEFAULT_USER),
+        password=_env(role, "PASSWORD", DEFAULT_PASSWORD),
+        pool_min=int(_env(role, "POOL_MIN", DEFAULT_POOL_MIN)),
+        pool_max=int(_env(role, "POOL_MAX", default_pool_max())),
+        sqlite=_env(role, "SQLITE", None),
+    )
+
+def read_replica_configured():
+    """True when reads have their own service (otherwise everything uses the primary)"""
+    read, write = get_settings("read"), get_settings("write")
+    return (read.dsn, read.user, read.password, read.sqlite) != (write.dsn, write.user, write.password, write.sqlite)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(role="write"):
+    """Return the process-wide connection pool for a role, creating it on first use"""
+    if role == "read" and not read_replica_configured():
+        role = "write"
+    with _pools_lock:
+        pool = _pools.get(role)
+        if pool is None:
+            settings = get_settings(role)
+            pool = oracledb.create_pool(
+                user=settings.user,
+                password=settings.password,
+                dsn=settings.dsn,
+                min=settings.pool_min,
+                max=settings.pool_max,
+                increment=1,
+                ping_interval=POOL_PING_INTERVAL,
+                getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                wait_timeout=POOL_WAIT_TIMEOUT_MS,
+            )
+            _pools[role] = pool
+            logger.info(f"Created {role} pool ({settings.pool_min}-{settings.pool_max} connections)")
+        return pool
+
+def acquire_connection(role="write"):
+    """Take a connection from the role's pool (close() gives it back)"""
+    if role == "read" and not read_replica_configured():
+        role = "write"
+    path = get_settings(role).sqlite
+    if path:
+        # Imported here: the stand-in builds on modules that import this one
+        from db_sqlite_v3_prod import connect
+        return connect(path)
+    return get_pool(role).acquire()
+
+
+class RecentWrites:
+    def __init__(self, window=READ_YOUR_WRITES_SECONDS):
+        """
+        Process-wide record of which handles and locations were written in
+        the last window seconds - reads about them are sent to the primary.
+        """
+        self.window = window
+        self._written = {}  # key -> monotonic time of the last write
+        self._lock = threading.Lock()
+
+    def note(self, *keys):
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._written[key] = now
+            if len(self._written) > 10000:
+                cutoff = now - self.window
+                self._written = {k: t for k, t in self._written.items() if t > cutoff}
+
+    def any_recent(self, *keys):
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            return any(self._written.get(key, 0) > cutoff for key in keys)
+
+
+_recent_writes = RecentWrites()
+
+def get_recent_writes():
+    return _recent_writes
@@ -0,0 +1,273 @@
+import threading
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the session is gone (idle timeout, network drop, DB restart)
+# rather than that the statement was wrong
+DISCONNECT_ERRORS = (
+    "DPY-1001",   # not connected to database
+    "DPY-4011",   # the database or network closed the connection
+    "DPY-6005",   # cannot connect to database
+    "ORA-02396",  # exceeded maximum idle time
+    "ORA-03113",  # end-of-file on communication channel
+    "ORA-03114",  # not connected to ORACLE
+    "ORA-03135",  # connection lost contact
+    "ORA-12170",  # connect timeout
+    "ORA-12541",  # no listener
+    "ORA-25408",  # can not safely replay call
+)
+
+# Ping a connection before using it if it has sat idle this long
+PING_AFTER_IDLE_SECONDS = 60.0
+
+# Circuit breaker defaults - after FAILURE_THRESHOLD consecutive connection
+# failures, calls fail fast for RESET_TIMEOUT seconds before one trial reconnect
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 30.0
+
+class DatabaseUnavailable(Exception):
+    """Raised instead of waiting on the database while it is known to be down"""
+
+def is_disconnect(error):
+    """True if an exception means the connection is dead"""
+    message = str(error)
+    return any(code in message for code in DISCONNECT_ERRORS)
+
+def dsn_label(dsn):
+    """Short name for a connect descriptor (its service name), for logs and status"""
+    match = re.search(r"service_name=([^.)]+)", dsn or "")
+    return match.group(1) if match else (dsn or "database")
+
+def is_read_only(statement):
+    """True for statements that are safe to re-run on a fresh connection"""
+    return statement.lstrip().upper().startswith(("SELECT", "WITH"))
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        """
+        closed: calls go through. open: calls fail fast until reset_timeout
+        passes. half-open: one trial call decides whether to close or reopen.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call (or reconnect) may be attempted now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                self._trial_running = False
+            if self.state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            changed = self.state != "closed"
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+        if changed:
+            logger.info(f"Database circuit {self.name} closed - connection restored")
+            self._notify()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            changed = False
+            if self.state == "half-open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                changed = self.state != "open"
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_running = False
+        if changed:
+            logger.warning(f"Database circuit {self.name} open after {self.failures} failures")
+            self._notify()
+
+    def retry_in(self):
+        """Seconds until the next trial reconnect (0 unless open)"""
+        with self._lock:
+            if self.state != "open":
+                return 0
+            return max(0, int(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def add_listener(self, callback):
+        """Register callback(breaker) to run on every state change"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+        return callback
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"Circuit listener {callback!r} failed: {str(e)}")
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(name):
+    """Return the process-wide breaker for a database service (one per DSN)"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+def all_circuit_breakers():
+    with _breakers_lock:
+        return list(_breakers.values())
+
+
+class _DeadConnection:
+    """Stands in for a dropped connection until the next call reconnects"""
+    def __init__(self, error):
+        self.error = error
+
+    def commit(self):
+        raise DatabaseUnavailable(f"Connection lost before commit: {self.error}")
+
+    def cursor(self):
+        raise DatabaseUnavailable(f"Connection lost: {self.error}")
+
+    def rollback(self):
+        pass  # the server already rolled back the dropped session
+
+    def close(self):
+        pass
+
+    def ping(self):
+        raise DatabaseUnavailable(f"Connection lost: {self.error}")
+
+
+class ResilientCursor:
+    def __init__(self, owner):
+        """Cursor proxy that health-checks the owner's connection around every statement"""
+        object.__setattr__(self, "_owner", owner)
+
+    def execute(self, statement, *args, **kwargs):
+        return self._owner._run_statement("execute", statement, args, kwargs)
+
+    def executemany(self, statement, *args, **kwargs):
+        return self._owner._run_statement("executemany", statement, args, kwargs)
+
+    def close(self):
+        # Never reconnect just to close
+        raw = self._owner.__dict__.get("_raw_cursor")
+        if raw is not None:
+            raw.close()
+
+    def __getattr__(self, name):
+        # var(), fetch*, rowfactory... go to the live cursor - after a drop
+        # that means reconnecting first, like a statement would
+        self._owner._ensure_ready()
+        return getattr(self._owner._raw_cursor, name)
+
+    def __setattr__(self, name, value):
+        self._owner._ensure_ready()
+        setattr(self._owner._raw_cursor, name, value)
+
+
+class ResilientConnectionMixin:
+    """
+    Mixin for the *Database classes. Keeps self.connection / self.cursor usable
+    across dropped connections: idle connections are pinged before use, dead
+    ones are replaced on the next call (read-only statements are retried once
+    right away), and a shared circuit breaker makes calls fail fast while
+    the database is down. The class only needs connect() and connection_string.
+    """
+    ping_after_idle = PING_AFTER_IDLE_SECONDS
+
+    @property
+    def cursor(self):
+        if self.__dict__.get("_raw_cursor") is None and self.__dict__.get("connection") is None:
+            return None  # never connected (or closed)
+        proxy = self.__dict__.get("_cursor_proxy")
+        if proxy is None:
+            proxy = self._cursor_proxy = ResilientCursor(self)
+        return proxy
+
+    @cursor.setter
+    def cursor(self, value):
+        self._raw_cursor = value
+        self._last_used = time.monotonic()
+
+    @property
+    def connection_lost(self):
+        """True after a dropped connection, until the next call reconnects"""
+        return isinstance(self.__dict__.get("connection"), _DeadConnection)
+
+    @property
+    def breaker(self):
+        return get_circuit_breaker(dsn_label(self.connection_string))
+
+    def _mark_dead(self, error):
+        logger.warning(f"{type(self).__name__} connection lost: {str(error)}")
+        try:
+            if self.connection is not None:
+                self.connection.close()
+        except Exception:
+            pass
+        self.connection = _DeadConnection(error)
+        self._raw_cursor = None
+        self.breaker.record_failure()
+
+    def _ensure_ready(self):
+        """Ping an idle connection, reconnect a dead one, or fail fast if the circuit is open"""
+        if self.__dict__.get("_raw_cursor") is not None:
+            if time.monotonic() - self._last_used < self.ping_after_idle:
+                return
+            try:
+                self.connection.ping()
+                self._last_used = time.monotonic()
+                return
+            except Exception as e:
+                self._mark_dead(e)
+
+        breaker = self.breaker
+        if not breaker.allow():
+            raise DatabaseUnavailable(f"Database unavailable - retrying in {breaker.retry_in()}s")
+        success, error = self.connect()
+        if not success:
+            self.connection = _DeadConnection(error)
+            breaker.record_failure()
+            raise DatabaseUnavailable(error)
+        breaker.record_success()
+
+    def _run_statement(self, method, statement, args, kwargs):
+        self._ensure_ready()
+        try:
+            result = getattr(self._raw_cursor, method)(statement, *args, **kwargs)
+        except Exception as e:
+            if not is_disconnect(e):
+                raise
+            self._mark_dead(e)
+            if method != "execute" or not is_read_only(statement):
+                raise  # DML may have been part of a larger transaction - let the caller decide
+            self._ensure_ready()
+            result = getattr(self._raw_cursor, method)(statement, *args, **kwargs)
+        self._last_used = time.monotonic()
+        return result
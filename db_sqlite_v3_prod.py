@@ -0,0 +1,215 @@
+import re
+import sqlite3
+from datetime import datetime, timezone
+import oracledb
+from manage_schema_v3_prod import to_sqlite_sql
+
+# SQLite stand-in for the Oracle pools, for development and benchmarks on a
+# box without the database: set STATREP_DB_WRITE_SQLITE (and, for a read/write
+# split, STATREP_DB_READ_SQLITE) to files set up with
+#   python manage_schema_v3_prod.py apply --sqlite PATH
+# acquire_connection() then hands out these connections instead of pooled
+# Oracle ones. They speak the slice of the oracledb API the *Database classes
+# use: Oracle SQL (via to_sqlite_sql), var() with RETURNING ... INTO,
+# rowfactory, batcherrors, ping(), and IntegrityError with the ORA code the
+# callers look for. MERGE is not translated - provisioning and sync keep
+# their own SQLite paths.
+
+BUSY_TIMEOUT_SECONDS = 10.0
+
+# Stored as "YYYY-MM-DD HH:MM:SS" text; fetched back as naive UTC datetimes like Oracle's
+DATETIME_COLUMNS = {"datetime_group", "last_used", "pin_changed_at", "modified_at", "applied_at"}
+
+RETURNING_INTO = re.compile(r"\s+RETURNING\s+(\w+)\s+INTO\s+:(\w+)\s*$", re.IGNORECASE)
+
+_translated = {}
+
+def _translate(statement):
+    sql = _translated.get(statement)
+    if sql is None:
+        sql = _translated[statement] = to_sqlite_sql(statement)
+    return sql
+
+def _bind_value(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat(sep=" ")
+    return value
+
+def _bind(params):
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return {name: _bind_value(value) for name, value in params.items()}
+    return tuple(_bind_value(value) for value in params)
+
+def _oracle_error(error):
+    """Re-raise SQLite errors as the oracledb classes (and ORA codes) the callers check for"""
+    message = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        code = "ORA-00001" if "UNIQUE" in message else "ORA-02290"
+        return oracledb.IntegrityError(f"{code}: {message}")
+    if isinstance(error, sqlite3.ProgrammingError) and "closed" in message:
+        return oracledb.InterfaceError(f"DPY-1001: not connected to database ({message})")
+    return oracledb.DatabaseError(message)
+
+
+class _Var:
+    def __init__(self, kind):
+        """Output bind for RETURNING ... INTO (getvalue() is a list, as for Oracle DML)"""
+        self.kind = kind
+        self.value = None
+
+    def getvalue(self, pos=0):
+        return self.value
+
+
+class _BatchError:
+    def __init__(self, offset, message):
+        self.offset = offset
+        self.message = message
+
+
+class SqliteCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection._sqlite.cursor()
+        self._batch_errors = []
+        self.rowfactory = None
+        self.arraysize = 100
+        self.prefetchrows = 2
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def var(self, kind):
+        return _Var(kind)
+
+    def execute(self, statement, params=None, **kwargs):
+        out = None
+        match = RETURNING_INTO.search(statement)
+        if match:
+            statement = statement[:match.start()] + f" RETURNING {match.group(1)}"
+            name = match.group(2)
+            if isinstance(params, dict):
+                params = dict(params)
+                out = params.pop(name)
+            else:
+                params = list(params)
+                out = params.pop(int(name) - 1)
+        try:
+            self._cursor.execute(_translate(statement), _bind(params or kwargs or None))
+            if out is not None:
+                out.value = [self._cursor.fetchone()[0]]
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def executemany(self, statement, rows, batcherrors=False, **kwargs):
+        sql = _translate(statement)
+        self._batch_errors = []
+        try:
+            if not batcherrors:
+                self._cursor.executemany(sql, [_bind(row) for row in rows])
+                return
+            if not self._connection._sqlite.in_transaction:
+                self._cursor.execute("BEGIN")   # so releasing a savepoint doesn't commit
+            for offset, row in enumerate(rows):
+                self._cursor.execute("SAVEPOINT batch_row")
+                try:
+                    self._cursor.execute(sql, _bind(row))
+                except sqlite3.DatabaseError as e:
+                    self._cursor.execute("ROLLBACK TO batch_row")
+                    self._batch_errors.append(_BatchError(offset, str(_oracle_error(e))))
+                self._cursor.execute("RELEASE batch_row")
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def getbatcherrors(self):
+        return list(self._batch_errors)
+
+    def _row(self, values):
+        if values is None:
+            return None
+        columns = [column[0].lower() for column in self._cursor.description]
+        values = tuple(datetime.fromisoformat(value) if name in DATETIME_COLUMNS and isinstance(value, str)
+                       else value for name, value in zip(columns, values))
+        return self.rowfactory(*values) if self.rowfactory else values
+
+    def fetchone(self):
+        try:
+            return self._row(self._cursor.fetchone())
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def fetchmany(self, size=None):
+        try:
+            return [self._row(values) for values in self._cursor.fetchmany(size or self.arraysize)]
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def fetchall(self):
+        try:
+            return [self._row(values) for values in self._cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany()
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    dialect = "sqlite"
+
+    def __init__(self, path):
+        """One connection to a stand-in database file (WAL, so readers don't block the writer)"""
+        self.path = path
+        self._sqlite = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._sqlite.execute("PRAGMA journal_mode=WAL")
+
+    def cursor(self):
+        try:
+            return SqliteCursor(self)
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def commit(self):
+        try:
+            self._sqlite.commit()
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def rollback(self):
+        try:
+            self._sqlite.rollback()
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def ping(self):
+        try:
+            self._sqlite.execute("SELECT 1")
+        except sqlite3.Error as e:
+            raise _oracle_error(e) from e
+
+    def close(self):
+        self._sqlite.close()
+
+
+def connect(path):
+    """Open a stand-in connection (close() closes it - there is no pool to return it to)"""
+    try:
+        return SqliteConnection(path)
+    except sqlite3.Error as e:
+        raise _oracle_error(e) from e
@@ -0,0 +1,200 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from statrep_db_v3_prod import StatrepDatabase, parse_datetime_group, get_central_tz
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PART_SIZE_MB = 100
+FETCH_BATCH_SIZE = 2000
+
+def to_json_value(value):
+    """Make a fetched column value safe for CSV/NDJSON output"""
+    if isinstance(value, datetime):
+        # datetime_group comes back as naive UTC
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return value
+
+def parse_date_arg(value):
+    """Accept "YYYY-MM-DD" or "YYYY-MM-DD HH:MM" (US Central) on the command line"""
+    if len(value.strip()) == 10:
+        value = value.strip() + " 00:00"
+    return parse_datetime_group(value)
+
+class PartWriter:
+    def __init__(self, out_dir, prefix, fmt, part_size, part_number=1):
+        """
+        Write rows into gzip parts (prefix-00001.csv.gz, ...), rolling over
+        once a part's compressed size reaches part_size bytes.
+        """
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.fmt = fmt
+        self.part_size = part_size
+        self.part_number = part_number
+        self.columns = None
+        self.raw_file = None
+        self.gzip_file = None
+        self.text = None
+        self.csv_writer = None
+        self.rows_in_part = 0
+        self.completed_parts = []
+
+    def _part_path(self):
+        ext = "csv" if self.fmt == "csv" else "ndjson"
+        return os.path.join(self.out_dir, f"{self.prefix}-{self.part_number:05d}.{ext}.gz")
+
+    def _open_part(self):
+        self.raw_file = open(self._part_path(), "wb")
+        self.gzip_file = gzip.GzipFile(fileobj=self.raw_file, mode="wb", compresslevel=6)
+        self.text = io.TextIOWrapper(self.gzip_file, encoding="utf-8", newline="")
+        self.rows_in_part = 0
+        if self.fmt == "csv":
+            self.csv_writer = csv.writer(self.text)
+            self.csv_writer.writerow(self.columns)
+
+    def write(self, columns, row):
+        """Write one row; returns True when this row completed a part"""
+        if self.columns is None:
+            self.columns = columns
+        if self.text is None:
+            self._open_part()
+
+        values = [to_json_value(v) for v in row]
+        if self.fmt == "csv":
+            self.csv_writer.writerow(["" if v is None else v for v in values])
+        else:
+            self.text.write(json.dumps(dict(zip(self.columns, values)), separators=(",", ":")))
+            self.text.write("\n")
+        self.rows_in_part += 1
+
+        # Compressed bytes land in raw_file as gzip flushes its blocks
+        if self.raw_file.tell() >= self.part_size:
+            self.close_part()
+            return True
+        return False
+
+    def close_part(self):
+        """Finish the current part (no-op if none is open)"""
+        if self.text is None:
+            return
+        self.text.close()  # closes the gzip stream too
+        self.raw_file.close()
+        self.completed_parts.append((self._part_path(), self.rows_in_part))
+        logger.info(f"Wrote {self._part_path()} ({self.rows_in_part} rows)")
+        self.text = None
+        self.gzip_file = None
+        self.raw_file = None
+        self.part_number += 1
+
+class ExportState:
+    def __init__(self, path):
+        """Resume checkpoint: last exported id and next part number, saved per completed part"""
+        self.path = path
+        self.last_id = 0
+        self.next_part = 1
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            self.last_id = data.get("last_id", 0)
+            self.next_part = data.get("next_part", 1)
+        return self
+
+    def save(self, last_id, next_part):
+        self.last_id = last_id
+        self.next_part = next_part
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"last_id": last_id, "next_part": next_part,
+                       "saved_at": datetime.now(timezone.utc).isoformat()}, f)
+        os.replace(tmp_path, self.path)
+
+def export_statreps(db, out_dir, prefix="statrep_export", fmt="csv", part_size_mb=DEFAULT_PART_SIZE_MB,
+                    since=None, until=None, state=None, handle=None, include_archive=True,
+                    after_id=None, resume=False):
+    """
+    Stream matching STATREPs (id order) into size-bounded gzip parts.
+    Memory stays bounded by the fetch batch size, whatever the table size.
+    Returns: (success: bool, row count or error_message)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = ExportState(os.path.join(out_dir, f"{prefix}.state.json"))
+    if resume:
+        checkpoint.load()
+    if after_id is not None:
+        checkpoint.last_id = after_id
+
+    writer = PartWriter(out_dir, prefix, fmt, int(part_size_mb * 1024 * 1024), checkpoint.next_part)
+    last_id = checkpoint.last_id
+    total = 0
+    logger.info(f"Exporting STATREPs after id {last_id} starting at part {checkpoint.next_part}")
+
+    try:
+        for columns, row in db.iter_statreps(after_id=last_id, since=since, until=until, state=state,
+                                             amcon_handle=handle, include_archive=include_archive,
+                                             batch_size=FETCH_BATCH_SIZE):
+            last_id = row[0]
+            total += 1
+            if writer.write(columns, row):
+                checkpoint.save(last_id, writer.part_number)
+        writer.close_part()
+        checkpoint.save(last_id, writer.part_number)
+        logger.info(f"Export complete - {total} rows through id {last_id}")
+        return True, total
+    except Exception as e:
+        # The partial part is rewritten from the last checkpoint on --resume
+        error_msg = f"Export failed after {total} rows: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the STATREP history to gzip-compressed CSV or NDJSON parts")
+    parser.add_argument("out_dir", help="Directory for the export parts")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--prefix", default="statrep_export")
+    parser.add_argument("--part-size-mb", type=float, default=DEFAULT_PART_SIZE_MB,
+                        help="Roll over to a new part at this compressed size")
+    parser.add_argument("--since", type=parse_date_arg, help="From this date/time (US Central), inclusive")
+    parser.add_argument("--until", type=parse_date_arg, help="Up to this date/time (US Central), exclusive")
+    parser.add_argument("--state")
+    parser.add_argument("--handle")
+    parser.add_argument("--hot-only", action="store_true", help="Skip statrep_archive")
+    parser.add_argument("--after-id", type=int, help="Export only ids greater than this")
+    parser.add_argument("--resume", action="store_true", help="Continue from the saved checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    db = StatrepDatabase(role="read")
+    success, error = db.connect()
+    if not success:
+        print(f"✗ {error}")
+        return 1
+
+    try:
+        started = datetime.now(get_central_tz())
+        success, result = export_statreps(
+            db, args.out_dir, prefix=args.prefix, fmt=args.format, part_size_mb=args.part_size_mb,
+            since=args.since, until=args.until, state=args.state, handle=args.handle,
+            include_archive=not args.hot_only, after_id=args.after_id, resume=args.resume
+        )
+        elapsed = (datetime.now(get_central_tz()) - started).total_seconds()
+        if success:
+            print(f"✓ Exported {result} STATREPs in {elapsed:.1f}s")
+            return 0
+        print(f"✗ {result}")
+        return 1
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
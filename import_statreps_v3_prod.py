@@ -0,0 +1,347 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from statrep_db_v3_prod import StatrepDatabase, STATREP_CODES, parse_datetime_group
+from manage_handles_v3_prod import HandlesDatabase
+from manage_locations_v3_prod import LocationDatabase
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 500
+PARSE_CHUNK_SIZE = 5000
+
+# Header keys seen in relayed messages, mapped to insert_statrep fields
+FIELD_ALIASES = {
+    "HANDLE": "amcon_handle", "AMCON_HANDLE": "amcon_handle", "CALL": "amcon_handle", "FROM": "amcon_handle",
+    "DTG": "datetime_group", "DATETIME": "datetime_group", "DATE_TIME": "datetime_group",
+    "DATETIME_GROUP": "datetime_group", "TIME": "datetime_group",
+    "STATE": "state", "STATE_TERRITORY": "state",
+    "NEIGHBORHOOD": "neighborhood", "AREA": "neighborhood",
+    "LOCATION": "location", "LOC": "location", "GRID": "location",
+    "CONDITIONS": "conditions", "CONDITION": "conditions", "STATUS": "conditions",
+    "POSITION": "position", "POS": "position",
+    "POWER": "commercial_power", "COMMERCIAL_POWER": "commercial_power",
+    "WATER": "water",
+    "SANITATION": "sanitation", "SAN": "sanitation",
+    "GRID_COMMS": "grid_comms", "COMMS": "grid_comms",
+    "TRANSPORTATION": "transportation", "TRANSPORT": "transportation",
+    "COMMENTS": "comments", "REMARKS": "comments", "RMKS": "comments",
+}
+
+# Compact one-line form for JS8/voice logs:
+# STATREP/<handle>/<YYYY-MM-DD HH:MM>/<state>/<neighborhood>/<location>/<A|B|C>[/<PWSSGT codes>][/<comments>]
+# where the six codes are position, power, water, sanitation, grid comms, transport ("-" = none)
+COMPACT_PREFIX = "STATREP/"
+COMPACT_CODE_FIELDS = ("position", "commercial_power", "water", "sanitation", "grid_comms", "transportation")
+
+# Relays retransmit, and the same file gets imported twice: each record's
+# idempotency_key is derived from the message itself, so a repeat is
+# rejected by the unique key and counted as a duplicate, not stored again
+IMPORT_KEY_PREFIX = "import:"
+
+KEY_LINE = re.compile(r"^\s*([A-Za-z][A-Za-z _/-]{0,30}?)\s*:\s*(.*)$")
+MILITARY_DTG = re.compile(r"^(\d{2})(\d{2})(\d{2})Z\s*([A-Za-z]{3})\s*(\d{2,4})$")
+MONTHS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+
+# Reference lists for the worker processes, set by _init_worker
+_handles = {}
+_states = {}
+_neighborhoods = {}
+
+def _init_worker(handles, states, neighborhoods):
+    """Load the reference lists once per worker (case-insensitive -> canonical)"""
+    global _handles, _states, _neighborhoods
+    _handles = {h.upper(): h for h in handles}
+    _states = {s.upper(): s for s in states}
+    _neighborhoods = {n.upper(): n for n in neighborhoods}
+
+def parse_dtg(value):
+    """Parse "YYYY-MM-DD HH:MM" (US Central) or a military DTG like "041305Z JUL 25" (UTC)"""
+    match = MILITARY_DTG.match(value.strip())
+    if not match:
+        return parse_datetime_group(value)
+    day, hour, minute, month, year = match.groups()
+    year = int(year)
+    if year < 100:
+        year += 2000
+    return datetime(year, MONTHS.index(month.upper()) + 1, int(day), int(hour), int(minute),
+                    tzinfo=timezone.utc)
+
+def _split_fields(message):
+    """Turn one message into a {field: raw value} dict, or raise ValueError"""
+    text = message.strip()
+    if text.upper().startswith(COMPACT_PREFIX):
+        parts = text.split("/", 8)
+        if len(parts) < 7:
+            raise ValueError("compact message needs handle/dtg/state/neighborhood/location/conditions")
+        fields = dict(zip(("amcon_handle", "datetime_group", "state", "neighborhood", "location", "conditions"),
+                          parts[1:7]))
+        if len(parts) > 7:
+            codes = parts[7].strip()
+            if len(codes) != len(COMPACT_CODE_FIELDS):
+                raise ValueError(f"expected {len(COMPACT_CODE_FIELDS)} status codes, got '{codes}'")
+            fields.update(zip(COMPACT_CODE_FIELDS, codes))
+        if len(parts) > 8:
+            fields["comments"] = parts[8]
+        return fields
+
+    fields = {}
+    current = None
+    for line in text.splitlines():
+        match = KEY_LINE.match(line)
+        key = None
+        if match:
+            key = FIELD_ALIASES.get(re.sub(r"[ /-]+", "_", match.group(1).strip().upper()))
+        if key:
+            fields[key] = match.group(2)
+            current = key
+        elif current == "comments":
+            # Comments may wrap onto following lines
+            fields["comments"] = (fields["comments"] + "\n" + line.strip()).strip()
+    if not fields:
+        raise ValueError("no STATREP fields found")
+    return fields
+
+def _reference(value, reference, what):
+    canonical = reference.get(value.strip().upper())
+    if canonical is None:
+        raise ValueError(f"unknown {what} '{value.strip()}'")
+    return canonical
+
+def _code(fields, name):
+    raw = (fields.get(name) or "").strip()
+    if not raw or raw == "-":
+        return None
+    code = raw[0].upper()  # accepts "B" or "B - Moderate Disruptions"
+    if code not in STATREP_CODES[name]:
+        raise ValueError(f"invalid {name} code '{raw}'")
+    return code
+
+def message_key(message, amcon_handle, datetime_group):
+    """
+    idempotency_key for an imported message: a hash of its text with case
+    and whitespace normalized (relays re-wrap lines and change case), the
+    canonical handle and the DTG in UTC
+    """
+    normalized = " ".join(message.upper().split())
+    source = f"{amcon_handle}|{datetime_group.astimezone(timezone.utc).isoformat()}|{normalized}"
+    return IMPORT_KEY_PREFIX + hashlib.sha256(source.encode("utf-8")).hexdigest()[:56]
+
+def parse_message(message):
+    """
+    Parse and validate one relayed STATREP message.
+    Returns: (record dict for insert_statrep, None) or (None, reject reason)
+    """
+    try:
+        fields = _split_fields(message)
+        for required in ("amcon_handle", "datetime_group", "state", "neighborhood", "location", "conditions"):
+            if not (fields.get(required) or "").strip():
+                raise ValueError(f"missing {required}")
+
+        conditions = _code(fields, "conditions")
+        record = {
+            "amcon_handle": _reference(fields["amcon_handle"], _handles, "handle"),
+            "datetime_group": parse_dtg(fields["datetime_group"]),
+            "state": _reference(fields["state"], _states, "state"),
+            "neighborhood": _reference(fields["neighborhood"], _neighborhoods, "neighborhood"),
+            "location": fields["location"].strip(),
+            "conditions": conditions,
+            "comments": (fields.get("comments") or "").strip() or None,
+        }
+        # Same rule as the form: status details only for non-"A" reports
+        for name in COMPACT_CODE_FIELDS:
+            record[name] = _code(fields, name) if conditions != "A" else None
+        record["idempotency_key"] = message_key(message, record["amcon_handle"], record["datetime_group"])
+        return record, None
+    except Exception as e:
+        return None, str(e)
+
+def read_messages(paths):
+    """
+    Yield messages from text files. Messages are separated by blank lines;
+    a block of compact STATREP/ lines yields one message per line.
+    """
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            block = []
+            for line in f:
+                if line.strip():
+                    block.append(line.rstrip("\n"))
+                    continue
+                if block:
+                    yield from _block_messages(block)
+                    block = []
+            if block:
+                yield from _block_messages(block)
+
+def _block_messages(block):
+    if all(line.strip().upper().startswith(COMPACT_PREFIX) for line in block):
+        yield from block
+    else:
+        yield "\n".join(block)
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_import(messages, handles, states, neighborhoods, db=None, reject_path=None,
+               workers=None, batch_size=INSERT_BATCH_SIZE):
+    """
+    Parse messages across a process pool and insert valid records in batches.
+    db=None parses and validates only (dry run).
+    Messages already stored (same idempotency_key, earlier in this run or
+    in an earlier import) are counted as duplicates, not rejects.
+    Returns: dict of counts (parsed, inserted, duplicates, rejected, failed_batches, seconds)
+    """
+    stats = {"parsed": 0, "inserted": 0, "duplicates": 0, "rejected": 0, "failed_batches": 0}
+    started = time.perf_counter()
+    pending = []
+    reject_file = open(reject_path, "w", encoding="utf-8") if reject_path else None
+
+    def reject(message, reason):
+        stats["rejected"] += 1
+        if reject_file:
+            reject_file.write(json.dumps({"reason": reason, "message": message}) + "\n")
+
+    def flush():
+        if db is None or not pending:
+            pending.clear()
+            return
+        success, result = db.insert_statreps_batch(pending)
+        if success:
+            inserted, errors = result
+            stats["inserted"] += inserted
+            for index, error in errors:
+                if "ORA-00001" in error:   # the unique idempotency_key: already imported
+                    stats["duplicates"] += 1
+                else:
+                    reject(pending[index]["_message"], f"database: {error}")
+        else:
+            stats["failed_batches"] += 1
+            for record in pending:
+                reject(record["_message"], result)
+        pending.clear()
+
+    workers = workers or os.cpu_count() or 1
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(handles, states, neighborhoods)) as pool:
+            for chunk in _chunks(messages, PARSE_CHUNK_SIZE):
+                chunksize = max(1, len(chunk) // (workers * 4))
+                for message, (record, error) in zip(chunk, pool.map(parse_message, chunk, chunksize=chunksize)):
+                    if record is None:
+                        reject(message, error)
+                        continue
+                    stats["parsed"] += 1
+                    record["_message"] = message
+                    pending.append(record)
+                    if len(pending) >= batch_size:
+                        flush()
+            flush()
+    finally:
+        if reject_file:
+            reject_file.close()
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+def generate_corpus(count, handles, states, neighborhoods, invalid_ratio=0.02):
+    """Synthetic mix of key/value and compact messages for benchmarking"""
+    rng = random.Random(42)
+    for i in range(count):
+        handle = rng.choice(handles)
+        state = rng.choice(states)
+        neighborhood = rng.choice(neighborhoods)
+        conditions = rng.choice("AABC")
+        dtg = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"
+        if rng.random() < invalid_ratio:
+            handle = "UNKNOWN" + str(i)
+        if i % 2:
+            codes = "".join(rng.choice(STATREP_CODES[f]) for f in COMPACT_CODE_FIELDS)
+            yield f"STATREP/{handle}/{dtg}/{state}/{neighborhood}/EM12ab/{conditions}/{codes}/msg {i}"
+        else:
+            yield (f"HANDLE: {handle}\nDTG: {dtg}\nSTATE: {state}\nNEIGHBORHOOD: {neighborhood}\n"
+                   f"LOCATION: EM12ab\nCONDITIONS: {conditions}\nPOWER: N\nWATER: Y\n"
+                   f"COMMENTS: bridge on CR {i % 100} out\n  boil water notice")
+
+def load_reference_lists():
+    """Read handles, states and neighborhoods from the database"""
+    handles_db = HandlesDatabase()
+    locations_db = LocationDatabase()
+    for db in (handles_db, locations_db):
+        success, error = db.connect()
+        if not success:
+            raise RuntimeError(error)
+    try:
+        _, handles = handles_db.get_all_handles()
+        _, states = locations_db.get_all_states()
+        _, neighborhoods = locations_db.get_all_neighborhoods()
+        return handles, states, neighborhoods
+    finally:
+        handles_db.close()
+        locations_db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Import relayed STATREP messages (Winlink, JS8, voice logs)")
+    parser.add_argument("files", nargs="*", help="Text files of messages separated by blank lines")
+    parser.add_argument("--rejects", default="statrep_rejects.jsonl", help="Where unparseable messages go")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=INSERT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Parse and validate without inserting")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="Parse N synthetic messages (no database needed) and report throughput")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        handles = [f"N{i}CALL" for i in range(5000)]
+        states = [f"State {i}" for i in range(56)]
+        neighborhoods = [f"Neighborhood {i}" for i in range(500)]
+        corpus = generate_corpus(args.benchmark, handles, states, neighborhoods)
+        stats = run_import(corpus, handles, states, neighborhoods, reject_path=None, workers=args.workers)
+        rate = (stats["parsed"] + stats["rejected"]) / stats["seconds"]
+        print(f"Parsed {stats['parsed']}, rejected {stats['rejected']} in {stats['seconds']:.2f}s "
+              f"({rate:,.0f} messages/s)")
+        return 0
+
+    if not args.files:
+        parser.error("no input files")
+
+    handles, states, neighborhoods = load_reference_lists()
+    db = None
+    if not args.dry_run:
+        db = StatrepDatabase()
+        success, error = db.connect()
+        if not success:
+            print(f"✗ {error}")
+            return 1
+
+    try:
+        stats = run_import(read_messages(args.files), handles, states, neighborhoods, db=db,
+                           reject_path=args.rejects, workers=args.workers, batch_size=args.batch_size)
+    finally:
+        if db:
+            db.close()
+
+    print(f"✓ Parsed {stats['parsed']}, inserted {stats['inserted']}, duplicates {stats['duplicates']}, "
+          f"rejected {stats['rejected']} in {stats['seconds']:.1f}s")
+    if stats["rejected"] and os.path.exists(args.rejects):
+        print(f"  Rejects written to {args.rejects}")
+    return 0 if stats["failed_batches"] == 0 else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+import math
+import re
+
+# Field (A-R), square (0-9), subsquare (a-x), extended square (0-9)
+GRID_PATTERN = re.compile(r"(?<![A-Za-z0-9])([A-Ra-r]{2}[0-9]{2}(?:[A-Xa-x]{2}(?:[0-9]{2})?)?)(?![A-Za-z0-9])")
+EARTH_RADIUS_KM = 6371.0
+
+def normalize_grid(text):
+    """
+    Normalize a Maidenhead locator to canonical case ("fn20XB" -> "FN20xb").
+    Returns None if text is not a 4, 6 or 8 character locator.
+    """
+    if not text:
+        return None
+    text = text.strip()
+    match = GRID_PATTERN.fullmatch(text)
+    if not match:
+        return None
+    return text[:2].upper() + text[2:4] + text[4:6].lower() + text[6:8]
+
+def find_grid(text):
+    """Find the first grid square in free text ("FN20xb, 2nd floor") and normalize it"""
+    if not text:
+        return None
+    match = GRID_PATTERN.search(text)
+    return normalize_grid(match.group(1)) if match else None
+
+def grid_to_latlon(grid):
+    """Return the (latitude, longitude) of the center of a normalized grid square"""
+    grid = normalize_grid(grid)
+    if grid is None:
+        raise ValueError("not a Maidenhead grid square")
+
+    lon = (ord(grid[0]) - ord("A")) * 20.0 - 180.0
+    lat = (ord(grid[1]) - ord("A")) * 10.0 - 90.0
+    lon += int(grid[2]) * 2.0
+    lat += int(grid[3]) * 1.0
+    lon_size, lat_size = 2.0, 1.0
+
+    if len(grid) >= 6:
+        lon_size, lat_size = 2.0 / 24, 1.0 / 24
+        lon += (ord(grid[4]) - ord("a")) * lon_size
+        lat += (ord(grid[5]) - ord("a")) * lat_size
+    if len(grid) == 8:
+        lon_size, lat_size = lon_size / 10, lat_size / 10
+        lon += int(grid[6]) * lon_size
+        lat += int(grid[7]) * lat_size
+
+    return lat + lat_size / 2, lon + lon_size / 2
+
+def latlon_to_grid(lat, lon, precision=6):
+    """Return the grid square (4, 6 or 8 characters) containing a point"""
+    lon = min(max(lon + 180.0, 0.0), 359.999999)
+    lat = min(max(lat + 90.0, 0.0), 179.999999)
+    grid = chr(ord("A") + int(lon // 20)) + chr(ord("A") + int(lat // 10))
+    grid += str(int((lon % 20) // 2)) + str(int(lat % 10))
+    if precision >= 6:
+        grid += chr(ord("a") + int((lon % 2) * 12)) + chr(ord("a") + int((lat % 1) * 24))
+    if precision >= 8:
+        grid += str(int(((lon % 2) * 120) % 10)) + str(int(((lat % 1) * 240) % 10))
+    return grid
+
+def grid_key(grid):
+    """
+    Hierarchical key for rollups: (field, square, subsquare), e.g.
+    ("FN", "FN20", "FN20xb"). Missing levels are None.
+    """
+    grid = normalize_grid(grid)
+    if grid is None:
+        return None, None, None
+    return grid[:2], grid[:4], grid[:6] if len(grid) >= 6 else None
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance in km"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
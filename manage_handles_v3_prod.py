@@ -1,29 +1,64 @@
-import oracledb
 import hashlib
 import logging
+import threading
+from db_resilience_v3_prod import ResilientConnectionMixin
+from db_config_v3_prod import get_settings, acquire_connection
+from statrep_hub_v3_prod import subscribe, publish, TOPIC_HANDLES_CHANGED
+from statrep_logging_v3_prod import log_fields
 
 logger = logging.getLogger(__name__)
 
-class HandlesDatabase:
-    def __init__(self):
-        """Initialize the Oracle database connection for handles"""
-        # Oracle connection details (hardcoded for now - will refactor later)
-        self.connection_string = '''(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1521)(host=adb.us-phoenix-1.oraclecloud.com))(connect_data=(service_name=g5cdaf2f9aabdbb_yeiublpmhgwxw343_low.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))'''
-        self.user = "MAILMAN"
-        self.password = "$Tms320c52password!"
+# Process-wide copy of the handle list - every session needs it for autocomplete.
+# Held as (version, handles) and served only while handles_version() still
+# matches, so handles provisioned or synced by another process show up too
+_handles_cache = None
+_handles_cache_lock = threading.Lock()
+
+def _drop_handles_cache():
+    global _handles_cache
+    with _handles_cache_lock:
+        _handles_cache = None
+
+_handles_listeners = [_drop_handles_cache]
+
+def on_handles_changed(callback):
+    """Call callback() whenever handles or PINs change - in this process or, via the hub, another worker"""
+    _handles_listeners.append(callback)
+
+def _handles_changed():
+    for listener in list(_handles_listeners):
+        listener()
+
+def invalidate_handles_cache():
+    """Drop the cached handle list (in every worker) so the next get_all_handles() reloads it"""
+    _handles_changed()
+    publish(TOPIC_HANDLES_CHANGED)
+
+subscribe(TOPIC_HANDLES_CHANGED, lambda _: _handles_changed())
+
+def hash_pin(pin):
+    """Hash a PIN using SHA-256"""
+    return hashlib.sha256(pin.encode()).hexdigest()
+
+class HandlesDatabase(ResilientConnectionMixin):
+    def __init__(self, role="write"):
+        """Initialize the Oracle database connection for handles ("write" = primary, "read" = read-only service)"""
+        # Connection details come from db_config_v3_prod (environment, with the
+        # original production values as defaults)
+        self.role = role
+        settings = get_settings(role)
+        self.connection_string = settings.dsn
+        self.user = settings.user
+        self.password = settings.password
         self.connection = None
         self.cursor = None
         
     def connect(self):
         """Connect to the Oracle database"""
         try:
-            self.connection = oracledb.connect(
-                user=self.user,
-                password=self.password,
-                dsn=self.connection_string
-            )
+            self.connection = acquire_connection(self.role)
             self.cursor = self.connection.cursor()
-            logger.info("Connected to Oracle database (Handles)")
+            logger.info("Connected to Oracle database", extra=log_fields(database="Handles"))
             return True, None
         except Exception as e:
             error_msg = f"Connection failed: {str(e)}"
@@ -32,7 +67,7 @@ class HandlesDatabase:
     
     def hash_pin(self, pin):
         """Hash a PIN using SHA-256"""
-        return hashlib.sha256(pin.encode()).hexdigest()
+        return hash_pin(pin)
     
     def add_handle(self, handle, pin):
         """
@@ -42,11 +77,13 @@ class HandlesDatabase:
         try:
             pin_hash = self.hash_pin(pin)
             self.cursor.execute(
-                "INSERT INTO handles (handle, pin_hash) VALUES (:1, :2)",
+                """INSERT INTO handles (handle, pin_hash, pin_changed_at, modified_at)
+                   VALUES (:1, :2, SYS_EXTRACT_UTC(SYSTIMESTAMP), SYS_EXTRACT_UTC(SYSTIMESTAMP))""",
                 (handle, pin_hash)
             )
             self.connection.commit()
-            logger.info(f"Added handle: {handle}")
+            invalidate_handles_cache()
+            logger.info("Added handle", extra=log_fields(handle=handle))
             return True, None
         except Exception as e:
             error_msg = f"Failed to add handle: {str(e)}"
@@ -70,9 +107,9 @@ class HandlesDatabase:
             
             is_valid = result[0] == pin_hash
             if is_valid:
-                logger.info(f"PIN verified for handle: {handle}")
+                logger.info("PIN verified", extra=log_fields(handle=handle))
             else:
-                logger.warning(f"PIN verification failed for handle: {handle}")
+                logger.warning("PIN verification failed", extra=log_fields(handle=handle))
             
             return is_valid
             
@@ -92,11 +129,14 @@ class HandlesDatabase:
         try:
             new_pin_hash = self.hash_pin(new_pin)
             self.cursor.execute(
-                "UPDATE handles SET pin_hash = :1 WHERE handle = :2",
+                """UPDATE handles SET pin_hash = :1,
+                       pin_changed_at = SYS_EXTRACT_UTC(SYSTIMESTAMP), modified_at = SYS_EXTRACT_UTC(SYSTIMESTAMP)
+                   WHERE handle = :2""",
                 (new_pin_hash, handle)
             )
             self.connection.commit()
-            logger.info(f"PIN changed for handle: {handle}")
+            invalidate_handles_cache()   # so no cached credential outlives the old PIN
+            logger.info("PIN changed", extra=log_fields(handle=handle))
             return True, None
         except Exception as e:
             error_msg = f"Failed to change PIN: {str(e)}"
@@ -112,23 +152,91 @@ class HandlesDatabase:
                 (handle,)
             )
             self.connection.commit()
-            logger.info(f"Updated last_used for handle: {handle}")
+            logger.info("Updated last_used", extra=log_fields(handle=handle))
             return True
         except Exception as e:
             logger.error(f"Failed to update last_used: {str(e)}")
             return False
     
-    def get_all_handles(self):
-        """Get list of all handles (for dropdown)"""
+    def handles_version(self):
+        """
+        Cheap stamp for the handle list: (row count, latest modified_at), read
+        from indexes. Changes when a handle is added, removed, or re-provisioned.
+        """
+        self.cursor.execute("SELECT COUNT(*), MAX(modified_at) FROM handles")
+        return tuple(self.cursor.fetchone())
+    
+    def get_all_handles(self, refresh=False):
+        """
+        Get list of all handles (for dropdown), served from the process-wide
+        cache while the handles table's version stamp is unchanged
+        """
+        global _handles_cache
         try:
+            version = self.handles_version()
+            with _handles_cache_lock:
+                if _handles_cache is not None and _handles_cache[0] == version and not refresh:
+                    return True, list(_handles_cache[1])
+            
             self.cursor.execute("SELECT handle FROM handles ORDER BY handle")
             handles = [row[0] for row in self.cursor.fetchall()]
-            logger.info(f"Retrieved {len(handles)} handles")
-            return True, handles
+            with _handles_cache_lock:
+                _handles_cache = (version, handles)
+            logger.info("Retrieved handles", extra=log_fields(count=len(handles)))
+            return True, list(handles)
         except Exception as e:
             logger.error(f"Failed to get handles: {str(e)}")
             return False, []
     
+    def get_pin_hashes(self, handles, chunk_size=500):
+        """
+        Look up stored PIN hashes for many handles at once.
+        Returns: (success: bool, {handle: pin_hash} or error_message)
+        """
+        try:
+            hashes = {}
+            handles = list(handles)
+            for start in range(0, len(handles), chunk_size):
+                chunk = handles[start:start + chunk_size]
+                placeholders = ", ".join(f":{i + 1}" for i in range(len(chunk)))
+                self.cursor.execute(
+                    f"SELECT handle, pin_hash FROM handles WHERE handle IN ({placeholders})",
+                    chunk
+                )
+                hashes.update(self.cursor.fetchall())
+            return True, hashes
+        except Exception as e:
+            error_msg = f"Failed to look up handles: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+    
+    def upsert_handles(self, rows):
+        """
+        Insert or update many (handle, pin_hash) rows with array DML in one transaction.
+        Returns: (success: bool, error_message: str or None)
+        """
+        try:
+            self.cursor.executemany(
+                """MERGE INTO handles h
+                   USING (SELECT :1 AS handle, :2 AS pin_hash FROM dual) src
+                   ON (h.handle = src.handle)
+                   WHEN MATCHED THEN UPDATE SET h.pin_hash = src.pin_hash,
+                       h.pin_changed_at = SYS_EXTRACT_UTC(SYSTIMESTAMP), h.modified_at = SYS_EXTRACT_UTC(SYSTIMESTAMP)
+                       WHERE h.pin_hash != src.pin_hash
+                   WHEN NOT MATCHED THEN INSERT (handle, pin_hash, pin_changed_at, modified_at)
+                       VALUES (src.handle, src.pin_hash, SYS_EXTRACT_UTC(SYSTIMESTAMP), SYS_EXTRACT_UTC(SYSTIMESTAMP))""",
+                rows
+            )
+            self.connection.commit()
+            invalidate_handles_cache()
+            logger.info("Upserted handles", extra=log_fields(count=len(rows)))
+            return True, None
+        except Exception as e:
+            error_msg = f"Failed to upsert handles: {str(e)}"
+            logger.error(error_msg)
+            self.connection.rollback()
+            return False, error_msg
+    
     def close(self):
         """Close the database connection"""
         try:
@@ -136,6 +244,6 @@ class HandlesDatabase:
                 self.cursor.close()
             if self.connection:
                 self.connection.close()
-            logger.info("Database connection closed (Handles)")
+            logger.info("Database connection closed", extra=log_fields(database="Handles"))
         except Exception as e:
             logger.error(f"Error closing connection: {str(e)}")
@@ -1,28 +1,29 @@
-import oracledb
 import logging
+from db_resilience_v3_prod import ResilientConnectionMixin
+from db_config_v3_prod import get_settings, acquire_connection
+from statrep_logging_v3_prod import log_fields
 
 logger = logging.getLogger(__name__)
 
-class LocationDatabase:
-    def __init__(self):
-        """Initialize the Oracle database connection for locations"""
-        # Oracle connection details (hardcoded for now - will refactor later)
-        self.connection_string = '''(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1521)(host=adb.us-phoenix-1.oraclecloud.com))(connect_data=(service_name=g5cdaf2f9aabdbb_yeiublpmhgwxw343_low.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))'''
-        self.user = "MAILMAN"
-        self.password = "$Tms320c52password!"
+class LocationDatabase(ResilientConnectionMixin):
+    def __init__(self, role="read"):
+        """Initialize the Oracle database connection for locations ("write" = primary, "read" = read-only service)"""
+        # Connection details come from db_config_v3_prod (environment, with the
+        # original production values as defaults)
+        self.role = role
+        settings = get_settings(role)
+        self.connection_string = settings.dsn
+        self.user = settings.user
+        self.password = settings.password
         self.connection = None
         self.cursor = None
         
     def connect(self):
         """Connect to the Oracle database"""
         try:
-            self.connection = oracledb.connect(
-                user=self.user,
-                password=self.password,
-                dsn=self.connection_string
-            )
+            self.connection = acquire_connection(self.role)
             self.cursor = self.connection.cursor()
-            logger.info("Connected to Oracle database (Locations)")
+            logger.info("Connected to Oracle database", extra=log_fields(database="Locations"))
             return True, None
         except Exception as e:
             error_msg = f"Connection failed: {str(e)}"
@@ -34,7 +35,7 @@ class LocationDatabase:
         try:
             self.cursor.execute("SELECT state_name FROM states ORDER BY state_name")
             states = [row[0] for row in self.cursor.fetchall()]
-            logger.info(f"Retrieved {len(states)} states")
+            logger.info("Retrieved states", extra=log_fields(count=len(states)))
             return True, states
         except Exception as e:
             logger.error(f"Failed to get states: {str(e)}")
@@ -45,7 +46,7 @@ class LocationDatabase:
         try:
             self.cursor.execute("SELECT neighborhood_name FROM neighborhoods ORDER BY neighborhood_name")
             neighborhoods = [row[0] for row in self.cursor.fetchall()]
-            logger.info(f"Retrieved {len(neighborhoods)} neighborhoods")
+            logger.info("Retrieved neighborhoods", extra=log_fields(count=len(neighborhoods)))
             return True, neighborhoods
         except Exception as e:
             logger.error(f"Failed to get neighborhoods: {str(e)}")
@@ -58,6 +59,6 @@ class LocationDatabase:
                 self.cursor.close()
             if self.connection:
                 self.connection.close()
-            logger.info("Database connection closed (Locations)")
+            logger.info("Database connection closed", extra=log_fields(database="Locations"))
         except Exception as e:
             logger.error(f"Error closing connection: {str(e)}")
@@ -0,0 +1,293 @@
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from statrep_db_v3_prod import StatrepDatabase, STATREP_COLUMNS, to_db_timestamp
+from manage_schema_v3_prod import SchemaManager, HOT_QUERIES, to_sqlite_sql
+
+logger = logging.getLogger(__name__)
+
+# Reports older than this move from the hot statrep table to statrep_archive
+HOT_RETENTION_DAYS = 30
+ARCHIVE_BATCH_SIZE = 5000
+
+# Handles used for exercises and testing - their reports are purged outright.
+# Matched on an explicit prefix with a hyphen, which no callsign contains, so a
+# real station whose handle starts with TEST or DRILL is never touched
+EXERCISE_HANDLE_PREFIXES = ("EXERCISE-", "TEST-", "DRILL-")
+EXERCISE_RETENTION_DAYS = 7
+
+# Hot-path queries timed by the archive benchmark (names in HOT_QUERIES)
+BENCHMARK_QUERIES = ("latest_by_location", "by_handle", "last_for_handle", "location_version",
+                     "all_statreps", "recent_by_location", "recent_by_handle")
+
+def prefix_pattern(prefix):
+    """LIKE pattern matching handles that start with prefix (wildcards in it taken literally)"""
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+class RetentionManager:
+    def __init__(self, db, dialect="oracle"):
+        """
+        Move old STATREPs to the archive table and purge exercise data.
+        db is a StatrepDatabase, or anything with .cursor and .connection;
+        dialect "sqlite" runs the same statements on the local stand-in.
+        """
+        self.db = db
+        self.dialect = dialect
+        self.slowest_batch_seconds = 0.0   # longest archive transaction in the last run
+
+    def _sql(self, sql):
+        return sql if self.dialect == "oracle" else to_sqlite_sql(sql)
+
+    def _cutoff(self, days):
+        cutoff = to_db_timestamp(datetime.now(timezone.utc) - timedelta(days=days))
+        return cutoff if self.dialect == "oracle" else cutoff.isoformat(sep=" ")
+
+    def archive_older_than(self, days=HOT_RETENTION_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+        """
+        Move reports older than N days to statrep_archive in id-bounded batches,
+        one transaction per batch so the hot table is never locked for long.
+        Returns: (success: bool, moved row count or error_message)
+        """
+        cutoff = self._cutoff(days)
+        cursor = self.db.cursor
+        moved = 0
+        self.slowest_batch_seconds = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                # Id range of the oldest batch. Ids are handed out at insert but
+                # rows appear at commit, so a row inside the range can show up
+                # between the copy and the delete - only what was copied is deleted
+                cursor.execute(self._sql(
+                    """SELECT MIN(id), MAX(id) FROM (
+                           SELECT id FROM statrep
+                           WHERE datetime_group < FROM_TZ(CAST(:1 AS TIMESTAMP), '+00:00')
+                           ORDER BY id
+                           FETCH FIRST :2 ROWS ONLY
+                       )"""),
+                    (cutoff, batch_size)
+                )
+                min_id, max_id = cursor.fetchone()
+                if max_id is None:
+                    break
+
+                cursor.execute(self._sql(
+                    f"""INSERT INTO statrep_archive ({STATREP_COLUMNS})
+                       SELECT {STATREP_COLUMNS} FROM statrep
+                       WHERE datetime_group < FROM_TZ(CAST(:1 AS TIMESTAMP), '+00:00')
+                       AND id BETWEEN :2 AND :3"""),
+                    (cutoff, min_id, max_id)
+                )
+                cursor.execute(self._sql(
+                    """DELETE FROM statrep
+                       WHERE id IN (SELECT id FROM statrep_archive WHERE id BETWEEN :1 AND :2)"""),
+                    (min_id, max_id)
+                )
+                batch = cursor.rowcount
+                self.db.connection.commit()
+                moved += batch
+                self.slowest_batch_seconds = max(self.slowest_batch_seconds, time.perf_counter() - started)
+                logger.info(f"Archived {batch} STATREPs (through id {max_id})")
+
+            return True, moved
+        except Exception as e:
+            error_msg = f"Archive failed: {str(e)}"
+            logger.error(error_msg)
+            self.db.connection.rollback()
+            return False, error_msg
+
+    def purge_exercise_data(self, prefixes=EXERCISE_HANDLE_PREFIXES, days=EXERCISE_RETENTION_DAYS):
+        """
+        Delete reports from exercise/test handles (those starting with one of
+        prefixes) older than N days, from both the hot and archive tables.
+        Returns: (success: bool, deleted row count or error_message)
+        """
+        if not prefixes:
+            return True, 0
+
+        cutoff = self._cutoff(days)
+        patterns = [prefix_pattern(prefix) for prefix in prefixes]
+        handle_filter = " OR ".join(f"amcon_handle LIKE :{i + 2} ESCAPE '\\'" for i in range(len(patterns)))
+        deleted = 0
+        try:
+            for table in ("statrep", "statrep_archive"):
+                self.db.cursor.execute(self._sql(
+                    f"""DELETE FROM {table}
+                        WHERE datetime_group < FROM_TZ(CAST(:1 AS TIMESTAMP), '+00:00')
+                        AND ({handle_filter})"""),
+                    (cutoff, *patterns)
+                )
+                deleted += self.db.cursor.rowcount
+            self.db.connection.commit()
+            logger.info(f"Purged {deleted} exercise/test STATREPs")
+            return True, deleted
+        except Exception as e:
+            error_msg = f"Purge failed: {str(e)}"
+            logger.error(error_msg)
+            self.db.connection.rollback()
+            return False, error_msg
+
+    def run_once(self, days=HOT_RETENTION_DAYS, exercise_days=EXERCISE_RETENTION_DAYS,
+                 prefixes=EXERCISE_HANDLE_PREFIXES):
+        """One pass of the retention job: purge exercise data, then archive"""
+        purge_ok, purged = self.purge_exercise_data(prefixes, exercise_days)
+        archive_ok, archived = self.archive_older_than(days)
+        return purge_ok and archive_ok, (purged, archived)
+
+def build_history_db(path, rows, days=365, handles=None, locations=20, seed=29, chunk=100000):
+    """
+    SQLite stand-in at path with rows synthetic STATREPs spread evenly over the
+    last N days (oldest first, so ids follow time as they do in production).
+    Returns: SchemaManager on the new database
+    """
+    rng = random.Random(seed)
+    handles = handles or max(rows // 200, 10)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    manager = SchemaManager(connection, "sqlite")
+    manager.apply()
+    start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    step = timedelta(days=days) / rows
+    for first in range(0, rows, chunk):
+        batch = []
+        for n in range(first, min(first + chunk, rows)):
+            handle = rng.randrange(handles)
+            home = handle % locations
+            batch.append((f"H{handle:05d}", (start + step * n).isoformat(sep=" ", timespec="seconds"),
+                          f"State {home % 5}", f"Neighborhood {home}", "EM10", rng.choice("ABC")))
+        manager.cursor.executemany(
+            """INSERT INTO statrep (amcon_handle, datetime_group, state, neighborhood, location, conditions)
+               VALUES (?, ?, ?, ?, ?, ?)""", batch)
+        connection.commit()
+    manager.cursor.execute("ANALYZE")
+    return manager
+
+def _benchmark_binds(sample, state, neighborhood, handle, since):
+    """HOT_QUERIES sample binds with the stand-in's values swapped in"""
+    values = {"Texas": state, "Downtown": neighborhood, "N0CALL": handle, "2000-01-01 00:00": since}
+    return tuple(values.get(value, value) for value in sample)
+
+def busiest_targets(manager):
+    """(state, neighborhood, handle): the stand-in's busiest location and its busiest handle"""
+    state, neighborhood = manager.busiest_location()
+    manager.cursor.execute("""SELECT amcon_handle FROM statrep WHERE state = ? AND neighborhood = ?
+                              GROUP BY amcon_handle ORDER BY COUNT(*) DESC LIMIT 1""", (state, neighborhood))
+    return state, neighborhood, manager.cursor.fetchone()[0]
+
+def time_hot_queries(manager, targets, repeat=5):
+    """
+    Best-of-repeat latency of each BENCHMARK_QUERIES entry on the stand-in
+    for targets (see busiest_targets), with a 24-hour window.
+    Returns: {name: (milliseconds, rows)}
+    """
+    state, neighborhood, handle = targets
+    since = (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=24)).isoformat(sep=" ")
+    timings = {}
+    for name in BENCHMARK_QUERIES:
+        sql, sample = HOT_QUERIES[name]
+        binds = _benchmark_binds(sample, state, neighborhood, handle, since)
+        best, rows = None, 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            manager.cursor.execute(to_sqlite_sql(sql), binds)
+            rows = len(manager.cursor.fetchall())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = (round(best * 1000, 2), rows)
+    return timings
+
+def benchmark(rows, days=365, hot_days=HOT_RETENTION_DAYS, path=None):
+    """
+    Hot-path latency with rows of history all in statrep, then again after one
+    archive pass leaves only the last hot_days there. Builds a file-backed
+    SQLite stand-in (in a temp directory unless path is given).
+    Returns: {"before", "after": {name: (ms, rows)}, "archived", "archive_seconds",
+              "slowest_batch_ms", "hot_rows"}
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = build_history_db(path or os.path.join(tmp, "history.sqlite"), rows, days)
+        try:
+            targets = busiest_targets(manager)
+            before = time_hot_queries(manager, targets)
+
+            retention = RetentionManager(manager, "sqlite")
+            started = time.perf_counter()
+            success, archived = retention.archive_older_than(hot_days)
+            archive_seconds = time.perf_counter() - started
+            if not success:
+                raise RuntimeError(archived)
+
+            manager.cursor.execute("ANALYZE")
+            after = time_hot_queries(manager, targets)
+            manager.cursor.execute("SELECT COUNT(*) FROM statrep")
+            hot_rows = manager.cursor.fetchone()[0]
+        finally:
+            manager.connection.close()
+    return {"before": before, "after": after, "archived": archived, "archive_seconds": round(archive_seconds, 1),
+            "slowest_batch_ms": round(retention.slowest_batch_seconds * 1000, 1), "hot_rows": hot_rows}
+
+def print_benchmark(rows, results):
+    print(f"===== {rows:,} rows of history, {results['hot_rows']:,} left hot =====")
+    print(f"Archived {results['archived']:,} rows in {results['archive_seconds']} s "
+          f"(slowest {ARCHIVE_BATCH_SIZE}-row batch {results['slowest_batch_ms']} ms)")
+    print(f"  {'query':22s} {'all in statrep':>16s} {'after archive':>16s}")
+    for name, (before_ms, before_rows) in results["before"].items():
+        after_ms, after_rows = results["after"][name]
+        speedup = before_ms / after_ms if after_ms else float("inf")
+        print(f"  {name:22s} {before_ms:10.2f} ms {before_rows:>4d} {after_ms:10.2f} ms {after_rows:>4d}"
+              f"  {speedup:6.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old STATREPs to the archive table and purge exercise data")
+    parser.add_argument("--days", type=int, default=HOT_RETENTION_DAYS,
+                        help="Keep this many days in the hot statrep table")
+    parser.add_argument("--exercise-days", type=int, default=EXERCISE_RETENTION_DAYS,
+                        help="Purge exercise/test reports older than this many days")
+    parser.add_argument("--exercise-prefix", action="append",
+                        help="Handle prefix that marks exercise handles, e.g. EXERCISE- (repeatable, "
+                             "replaces the defaults)")
+    parser.add_argument("--every", type=float, metavar="MINUTES",
+                        help="Keep running, one pass every N minutes")
+    parser.add_argument("--benchmark", type=int, metavar="ROWS",
+                        help="Time the hot queries on a SQLite stand-in with ROWS of history, "
+                             "before and after archiving (e.g. 10000000)")
+    parser.add_argument("--history-days", type=int, default=365,
+                        help="--benchmark: days of history the rows are spread over")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="--benchmark: build the stand-in here instead of a temp directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    prefixes = tuple(args.exercise_prefix) if args.exercise_prefix else EXERCISE_HANDLE_PREFIXES
+
+    if args.benchmark:
+        logging.getLogger().setLevel(logging.WARNING)
+        print_benchmark(args.benchmark, benchmark(args.benchmark, args.history_days, args.days, args.sqlite))
+        return 0
+
+    db = StatrepDatabase()
+    success, error = db.connect()
+    if not success:
+        print(f"✗ {error}")
+        return 1
+
+    manager = RetentionManager(db)
+    try:
+        while True:
+            success, (purged, archived) = manager.run_once(args.days, args.exercise_days, prefixes)
+            print(f"{'✓' if success else '✗'} Purged: {purged}, Archived: {archived}")
+            if not args.every:
+                return 0 if success else 1
+            time.sleep(args.every * 60)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,796 @@
+import argparse
+import logging
+import random
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from statrep_db_v3_prod import StatrepDatabase, STATREP_FIELDS, latest_by_location_sql
+
+logger = logging.getLogger(__name__)
+
+# Oracle errors that mean "this object is already there" - lets the first
+# migrations run against the production schema, which predates this tool
+IGNORABLE_ORACLE_ERRORS = (
+    "ORA-00955",  # name is already used by an existing object
+    "ORA-01408",  # such column list already indexed
+    "ORA-01430",  # column being added already exists in table
+    "ORA-02260",  # table can have only one primary key
+    "ORA-02261",  # such unique or primary key already exists in the table
+    "ORA-01418",  # specified index does not exist (already dropped)
+)
+
+# Rows converted per transaction when a migration backfills a column
+BACKFILL_BATCH_SIZE = 10000
+
+def _require_local_datetime_group(manager):
+    """Migration 3 converts a plain TIMESTAMP of US Central wall-clock time - stop if it is anything else"""
+    manager.cursor.execute(
+        """SELECT data_type FROM user_tab_columns
+           WHERE table_name = 'STATREP' AND column_name = 'DATETIME_GROUP'""")
+    row = manager.cursor.fetchone()
+    data_type = row[0] if row else None
+    if data_type is None or not data_type.startswith(("TIMESTAMP", "DATE")) or "TIME ZONE" in data_type:
+        raise RuntimeError(f"statrep.datetime_group is {data_type or 'missing'}, not a local TIMESTAMP - "
+                           "not converting it (check the table by hand)")
+
+def _backfill_datetime_group_tz(manager):
+    """Fill datetime_group_tz in committed id-range batches, so a failure keeps what is done and undoes nothing"""
+    manager.cursor.execute("SELECT NVL(MIN(id), 0), NVL(MAX(id), 0) FROM statrep")
+    first_id, last_id = manager.cursor.fetchone()
+    total = 0
+    for low in range(first_id, last_id + 1, BACKFILL_BATCH_SIZE):
+        # Existing values were entered as US Central wall-clock time
+        manager.cursor.execute(
+            """UPDATE statrep SET datetime_group_tz =
+                   FROM_TZ(SYS_EXTRACT_UTC(FROM_TZ(CAST(datetime_group AS TIMESTAMP), 'America/Chicago')), '+00:00')
+               WHERE id BETWEEN :1 AND :2 AND datetime_group_tz IS NULL""",
+            (low, low + BACKFILL_BATCH_SIZE - 1))
+        total += manager.cursor.rowcount
+        manager.connection.commit()
+    logger.info(f"Backfilled datetime_group_tz on {total} rows")
+
+def _require_datetime_group_backfilled(manager):
+    """The last check before the old column goes: every row has its converted value"""
+    manager.cursor.execute("SELECT COUNT(*), COUNT(datetime_group), COUNT(datetime_group_tz) FROM statrep")
+    rows, old_values, new_values = manager.cursor.fetchone()
+    if old_values != rows or new_values != rows:
+        raise RuntimeError(f"datetime_group backfill incomplete ({rows} rows, {old_values} old values, "
+                           f"{new_values} converted) - datetime_group was not dropped; rerun apply")
+
+# Each migration has Oracle (production) and SQLite (local stand-in) DDL,
+# (a callable in the list is a checked step, run as step(manager)),
+# plus the tables and indexes it is expected to leave behind (and, optionally,
+# "dropped_indexes" it removes - verify stops expecting those from earlier versions)
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "Base tables: statrep, handles, states, neighborhoods",
+        "oracle": [
+            """CREATE TABLE statrep (
+                id               NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                amcon_handle     VARCHAR2(50)   NOT NULL,
+                datetime_group   TIMESTAMP      NOT NULL,
+                state            VARCHAR2(100)  NOT NULL,
+                neighborhood     VARCHAR2(100)  NOT NULL,
+                location         VARCHAR2(500),
+                conditions       CHAR(1)        NOT NULL,
+                position         CHAR(1),
+                commercial_power CHAR(1),
+                water            CHAR(1),
+                sanitation       CHAR(1),
+                grid_comms       CHAR(1),
+                transportation   CHAR(1),
+                comments         VARCHAR2(4000)
+            )""",
+            """CREATE TABLE handles (
+                handle    VARCHAR2(50) PRIMARY KEY,
+                pin_hash  VARCHAR2(64) NOT NULL,
+                last_used TIMESTAMP
+            )""",
+            "CREATE TABLE states (state_name VARCHAR2(100) PRIMARY KEY)",
+            "CREATE TABLE neighborhoods (neighborhood_name VARCHAR2(100) PRIMARY KEY)",
+        ],
+        "sqlite": [
+            """CREATE TABLE IF NOT EXISTS statrep (
+                id               INTEGER PRIMARY KEY AUTOINCREMENT,
+                amcon_handle     TEXT NOT NULL,
+                datetime_group   TEXT NOT NULL,
+                state            TEXT NOT NULL,
+                neighborhood     TEXT NOT NULL,
+                location         TEXT,
+                conditions       TEXT NOT NULL,
+                position         TEXT,
+                commercial_power TEXT,
+                water            TEXT,
+                sanitation       TEXT,
+                grid_comms       TEXT,
+                transportation   TEXT,
+                comments         TEXT
+            )""",
+            """CREATE TABLE IF NOT EXISTS handles (
+                handle    TEXT PRIMARY KEY,
+                pin_hash  TEXT NOT NULL,
+                last_used TEXT
+            )""",
+            "CREATE TABLE IF NOT EXISTS states (state_name TEXT PRIMARY KEY)",
+            "CREATE TABLE IF NOT EXISTS neighborhoods (neighborhood_name TEXT PRIMARY KEY)",
+        ],
+        "tables": ["statrep", "handles", "states", "neighborhoods"],
+        "indexes": [],
+    },
+    {
+        "version": 2,
+        "description": "Composite indexes for the hot STATREP queries",
+        "oracle": [
+            # Latest-per-handle for a location: filter, group and MAX() all from the index
+            "CREATE INDEX statrep_loc_handle_dtg_ix ON statrep (state, neighborhood, amcon_handle, datetime_group)",
+            # History and last report for a handle, newest first
+            "CREATE INDEX statrep_handle_dtg_ix ON statrep (amcon_handle, datetime_group)",
+            # get_all_statreps ordering
+            "CREATE INDEX statrep_dtg_ix ON statrep (datetime_group)",
+        ],
+        "sqlite": [
+            "CREATE INDEX IF NOT EXISTS statrep_loc_handle_dtg_ix ON statrep (state, neighborhood, amcon_handle, datetime_group)",
+            "CREATE INDEX IF NOT EXISTS statrep_handle_dtg_ix ON statrep (amcon_handle, datetime_group)",
+            "CREATE INDEX IF NOT EXISTS statrep_dtg_ix ON statrep (datetime_group)",
+        ],
+        "tables": [],
+        "indexes": ["statrep_loc_handle_dtg_ix", "statrep_handle_dtg_ix", "statrep_dtg_ix"],
+    },
+    {
+        "version": 3,
+        "description": "datetime_group as TIMESTAMP WITH TIME ZONE (UTC) plus time-range index",
+        "oracle": [
+            # None of this DDL is transactional. Add and backfill the new column,
+            # check every row converted, and only then swap - a failure before
+            # the swap leaves datetime_group as it was, and apply can be rerun
+            _require_local_datetime_group,
+            "ALTER TABLE statrep ADD (datetime_group_tz TIMESTAMP WITH TIME ZONE)",
+            _backfill_datetime_group_tz,
+            _require_datetime_group_backfilled,
+            # SET UNUSED is a dictionary change, not a rewrite of every row
+            # (ALTER TABLE statrep DROP UNUSED COLUMNS reclaims the space later)
+            "ALTER TABLE statrep SET UNUSED (datetime_group)",
+            "ALTER TABLE statrep RENAME COLUMN datetime_group_tz TO datetime_group",
+            "ALTER TABLE statrep MODIFY (datetime_group NOT NULL)",
+            # The renamed column landed last; cycle the columns after it through
+            # INVISIBLE/VISIBLE so SELECT * keeps the original column order
+            """ALTER TABLE statrep MODIFY (state INVISIBLE, neighborhood INVISIBLE, location INVISIBLE,
+                   conditions INVISIBLE, position INVISIBLE, commercial_power INVISIBLE, water INVISIBLE,
+                   sanitation INVISIBLE, grid_comms INVISIBLE, transportation INVISIBLE, comments INVISIBLE)""",
+            """ALTER TABLE statrep MODIFY (state VISIBLE, neighborhood VISIBLE, location VISIBLE,
+                   conditions VISIBLE, position VISIBLE, commercial_power VISIBLE, water VISIBLE,
+                   sanitation VISIBLE, grid_comms VISIBLE, transportation VISIBLE, comments VISIBLE)""",
+            # Setting the old column unused dropped its indexes - rebuild them
+            "CREATE INDEX statrep_loc_handle_dtg_ix ON statrep (state, neighborhood, amcon_handle, datetime_group)",
+            "CREATE INDEX statrep_handle_dtg_ix ON statrep (amcon_handle, datetime_group)",
+            "CREATE INDEX statrep_dtg_ix ON statrep (datetime_group)",
+            # "Last N hours" for a location
+            "CREATE INDEX statrep_loc_dtg_ix ON statrep (state, neighborhood, datetime_group)",
+        ],
+        "sqlite": [
+            "CREATE INDEX IF NOT EXISTS statrep_loc_dtg_ix ON statrep (state, neighborhood, datetime_group)",
+        ],
+        "tables": [],
+        "indexes": ["statrep_loc_dtg_ix"],
+    },
+    {
+        "version": 4,
+        "description": "statrep_archive cold table for retention tiering",
+        "oracle": [
+            # CTAS copies the column order and types (without the identity)
+            "CREATE TABLE statrep_archive AS SELECT * FROM statrep WHERE 1 = 0",
+            "ALTER TABLE statrep_archive ADD CONSTRAINT statrep_archive_pk PRIMARY KEY (id)",
+            "CREATE INDEX statrep_arch_handle_dtg_ix ON statrep_archive (amcon_handle, datetime_group)",
+            "CREATE INDEX statrep_arch_dtg_ix ON statrep_archive (datetime_group)",
+        ],
+        "sqlite": [
+            "CREATE TABLE IF NOT EXISTS statrep_archive AS SELECT * FROM statrep WHERE 0",
+            "CREATE UNIQUE INDEX IF NOT EXISTS statrep_archive_pk ON statrep_archive (id)",
+            "CREATE INDEX IF NOT EXISTS statrep_arch_handle_dtg_ix ON statrep_archive (amcon_handle, datetime_group)",
+            "CREATE INDEX IF NOT EXISTS statrep_arch_dtg_ix ON statrep_archive (datetime_group)",
+        ],
+        "tables": ["statrep_archive"],
+        "indexes": ["statrep_archive_pk", "statrep_arch_handle_dtg_ix", "statrep_arch_dtg_ix"],
+    },
+    {
+        "version": 5,
+        "description": "Index-only version stamp for the location result cache",
+        "oracle": [
+            "CREATE INDEX statrep_loc_id_ix ON statrep (state, neighborhood, id)",
+        ],
+        "sqlite": [
+            "CREATE INDEX IF NOT EXISTS statrep_loc_id_ix ON statrep (state, neighborhood, id)",
+        ],
+        "tables": [],
+        "indexes": ["statrep_loc_id_ix"],
+    },
+    {
+        "version": 6,
+        "description": "Maidenhead grid square and coordinates on statrep and statrep_archive",
+        "oracle": [
+            "ALTER TABLE statrep ADD (grid_square VARCHAR2(8), latitude NUMBER(8,5), longitude NUMBER(8,5))",
+            "ALTER TABLE statrep_archive ADD (grid_square VARCHAR2(8), latitude NUMBER(8,5), longitude NUMBER(8,5))",
+        ],
+        "sqlite": [
+            "ALTER TABLE statrep ADD COLUMN grid_square TEXT",
+            "ALTER TABLE statrep ADD COLUMN latitude REAL",
+            "ALTER TABLE statrep ADD COLUMN longitude REAL",
+            "ALTER TABLE statrep_archive ADD COLUMN grid_square TEXT",
+            "ALTER TABLE statrep_archive ADD COLUMN latitude REAL",
+            "ALTER TABLE statrep_archive ADD COLUMN longitude REAL",
+        ],
+        "tables": [],
+        "indexes": [],
+    },
+    {
+        "version": 7,
+        "description": "Idempotency key for submissions (unique on statrep; NULLs allowed)",
+        "oracle": [
+            "ALTER TABLE statrep ADD (idempotency_key VARCHAR2(64))",
+            "ALTER TABLE statrep_archive ADD (idempotency_key VARCHAR2(64))",
+            "CREATE UNIQUE INDEX statrep_idem_key_ux ON statrep (idempotency_key)",
+        ],
+        "sqlite": [
+            "ALTER TABLE statrep ADD COLUMN idempotency_key TEXT",
+            "ALTER TABLE statrep_archive ADD COLUMN idempotency_key TEXT",
+            "CREATE UNIQUE INDEX IF NOT EXISTS statrep_idem_key_ux ON statrep (idempotency_key)",
+        ],
+        "tables": [],
+        "indexes": ["statrep_idem_key_ux"],
+    },
+    {
+        "version": 8,
+        "description": "Store-and-forward replication: STATREP origin, handle change times, sync watermarks",
+        "oracle": [
+            # origin/origin_id stay NULL on rows entered at this node; a replicated
+            # row keeps the node and id it was first stored under
+            "ALTER TABLE statrep ADD (origin VARCHAR2(64), origin_id NUMBER)",
+            "ALTER TABLE statrep_archive ADD (origin VARCHAR2(64), origin_id NUMBER)",
+            "CREATE UNIQUE INDEX statrep_origin_ux ON statrep (origin, origin_id)",
+            # pin_changed_at decides PIN conflicts; modified_at drives handle sync
+            "ALTER TABLE handles ADD (pin_changed_at TIMESTAMP, modified_at TIMESTAMP)",
+            "CREATE INDEX handles_modified_ix ON handles (modified_at)",
+            """CREATE TABLE sync_watermarks (
+                peer       VARCHAR2(64),
+                name       VARCHAR2(32),
+                value      VARCHAR2(64),
+                updated_at TIMESTAMP DEFAULT SYSTIMESTAMP,
+                PRIMARY KEY (peer, name)
+            )""",
+        ],
+        "sqlite": [
+            "ALTER TABLE statrep ADD COLUMN origin TEXT",
+            "ALTER TABLE statrep ADD COLUMN origin_id INTEGER",
+            "ALTER TABLE statrep_archive ADD COLUMN origin TEXT",
+            "ALTER TABLE statrep_archive ADD COLUMN origin_id INTEGER",
+            "CREATE UNIQUE INDEX IF NOT EXISTS statrep_origin_ux ON statrep (origin, origin_id)",
+            "ALTER TABLE handles ADD COLUMN pin_changed_at TEXT",
+            "ALTER TABLE handles ADD COLUMN modified_at TEXT",
+            "CREATE INDEX IF NOT EXISTS handles_modified_ix ON handles (modified_at)",
+            """CREATE TABLE IF NOT EXISTS sync_watermarks (
+                peer       TEXT,
+                name       TEXT,
+                value      TEXT,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (peer, name)
+            )""",
+        ],
+        "tables": ["sync_watermarks"],
+        "indexes": ["statrep_origin_ux", "handles_modified_ix"],
+    },
+    {
+        "version": 9,
+        "description": "Location index with id, so latest-per-handle ranks (ties by id) from the index alone",
+        "oracle": [
+            "CREATE INDEX statrep_loc_handle_dtg_id_ix ON statrep (state, neighborhood, amcon_handle, datetime_group, id)",
+            # Its columns are a prefix of the new index - keeping both only doubles the write cost
+            "DROP INDEX statrep_loc_handle_dtg_ix",
+        ],
+        "sqlite": [
+            # id is the rowid, already in every SQLite index - kept for a like-for-like stand-in
+            "CREATE INDEX IF NOT EXISTS statrep_loc_handle_dtg_id_ix ON statrep (state, neighborhood, amcon_handle, datetime_group, id)",
+            "DROP INDEX IF EXISTS statrep_loc_handle_dtg_ix",
+        ],
+        "tables": [],
+        "indexes": ["statrep_loc_handle_dtg_id_ix"],
+        "dropped_indexes": ["statrep_loc_handle_dtg_ix"],
+    },
+]
+
+# The queries the app runs on every interaction, with sample binds for the
+# local stand-in (Oracle EXPLAIN PLAN does not need bind values)
+HOT_QUERIES = {
+    "latest_by_location": (
+        """SELECT * FROM statrep
+           WHERE id IN (
+               SELECT id FROM (
+                   SELECT id, ROW_NUMBER() OVER (PARTITION BY amcon_handle
+                                                 ORDER BY datetime_group DESC, id DESC) AS rn
+                   FROM statrep
+                   WHERE state = :1 AND neighborhood = :2
+               )
+               WHERE rn = 1
+           )
+           ORDER BY datetime_group DESC, id DESC""",
+        ("Texas", "Downtown"),
+    ),
+    "by_handle": (
+        "SELECT * FROM statrep WHERE amcon_handle = :1 ORDER BY datetime_group DESC",
+        ("N0CALL",),
+    ),
+    "last_for_handle": (
+        """SELECT * FROM statrep
+           WHERE amcon_handle = :1
+           ORDER BY datetime_group DESC, id DESC
+           FETCH FIRST 1 ROW ONLY""",
+        ("N0CALL",),
+    ),
+    "last_location_for_handle": (
+        """SELECT datetime_group, state, neighborhood, location FROM statrep
+           WHERE amcon_handle = :1
+           ORDER BY datetime_group DESC, id DESC
+           FETCH FIRST 1 ROW ONLY""",
+        ("N0CALL",),
+    ),
+    "location_version": (
+        "SELECT NVL(MAX(id), 0), COUNT(*) FROM statrep WHERE state = :1 AND neighborhood = :2",
+        ("Texas", "Downtown"),
+    ),
+    "all_statreps": (
+        "SELECT * FROM statrep ORDER BY datetime_group DESC FETCH FIRST 100 ROWS ONLY",
+        (),
+    ),
+    "since_id": (
+        "SELECT * FROM statrep WHERE id > :1 ORDER BY id FETCH FIRST :2 ROWS ONLY",
+        (0, 500),
+    ),
+    "recent_by_location": (
+        """SELECT * FROM statrep
+           WHERE state = :1 AND neighborhood = :2
+           AND datetime_group >= FROM_TZ(CAST(:3 AS TIMESTAMP), '+00:00')
+           ORDER BY datetime_group DESC""",
+        ("Texas", "Downtown", "2000-01-01 00:00"),
+    ),
+    "recent_by_handle": (
+        """SELECT * FROM statrep
+           WHERE amcon_handle = :1
+           AND datetime_group >= FROM_TZ(CAST(:2 AS TIMESTAMP), '+00:00')
+           ORDER BY datetime_group DESC""",
+        ("N0CALL", "2000-01-01 00:00"),
+    ),
+    "verify_pin": (
+        "SELECT pin_hash FROM handles WHERE handle = :1",
+        ("N0CALL",),
+    ),
+    "all_handles": ("SELECT handle FROM handles ORDER BY handle", ()),
+    "all_states": ("SELECT state_name FROM states ORDER BY state_name", ()),
+    "all_neighborhoods": ("SELECT neighborhood_name FROM neighborhoods ORDER BY neighborhood_name", ()),
+}
+
+# What production runs where it differs from the portable HOT_QUERIES form
+ORACLE_HOT_QUERIES = {
+    "latest_by_location": latest_by_location_sql("oracle", STATREP_FIELDS),
+}
+
+# Rewritten hot queries, kept next to what they replaced so the two can be
+# compared on real data: plans, timings, and whether the results agree.
+# Both take (state, neighborhood); the legacy form binds them twice.
+QUERY_REWRITES = {
+    "latest_by_location": {
+        # GROUP BY then join back: two passes, and a handle with two reports
+        # at the same datetime_group comes back twice
+        "legacy": """SELECT s.*
+                     FROM statrep s
+                     INNER JOIN (
+                         SELECT amcon_handle, MAX(datetime_group) as max_datetime
+                         FROM statrep
+                         WHERE state = :1 AND neighborhood = :2
+                         GROUP BY amcon_handle
+                     ) latest
+                     ON s.amcon_handle = latest.amcon_handle
+                     AND s.datetime_group = latest.max_datetime
+                     WHERE s.state = :3 AND s.neighborhood = :4
+                     ORDER BY s.datetime_group DESC""",
+        "rewrite": HOT_QUERIES["latest_by_location"][0],
+        # On Oracle the rewrite is the one-pass KEEP form; the ROW_NUMBER id
+        # ranking above (what the SQLite stand-in runs) is timed alongside it
+        "oracle_rewrite": ORACLE_HOT_QUERIES["latest_by_location"],
+        "legacy_binds": lambda state, neighborhood: (state, neighborhood, state, neighborhood),
+        "rewrite_binds": lambda state, neighborhood: (state, neighborhood),
+        # Timed and checked too, with the rewrite's binds. The single pass (as
+        # iter_latest_statreps does it) carries whole rows through the sort; on
+        # the SQLite stand-in that is ~3x slower than ranking ids and then
+        # fetching the winners by primary key
+        "alternatives": {
+            "single_pass": """SELECT * FROM (
+                                  SELECT statrep.*,
+                                         ROW_NUMBER() OVER (PARTITION BY amcon_handle
+                                                            ORDER BY datetime_group DESC, id DESC) AS rn
+                                  FROM statrep
+                                  WHERE state = :1 AND neighborhood = :2
+                              )
+                              WHERE rn = 1
+                              ORDER BY datetime_group DESC, id DESC""",
+        },
+    },
+}
+
+def to_sqlite_sql(sql):
+    """Translate the Oracle dialect used by the app into SQLite for the local stand-in"""
+    sql = re.sub(r"FETCH FIRST (\S+) ROWS? ONLY", r"LIMIT \1", sql)
+    sql = re.sub(r"FROM_TZ\(CAST\((:\w+) AS TIMESTAMP\), '\+00:00'\)", r"\1", sql)
+    sql = re.sub(r":(\d+)", r"?\1", sql)
+    sql = sql.replace("NVL(", "IFNULL(")
+    sql = sql.replace("SYS_EXTRACT_UTC(SYSTIMESTAMP)", "CURRENT_TIMESTAMP")
+    return sql
+
+class SchemaManager:
+    def __init__(self, connection, dialect):
+        """
+        Apply and verify schema migrations on an open DB-API connection.
+        dialect is "oracle" (production) or "sqlite" (local stand-in).
+        """
+        if dialect not in ("oracle", "sqlite"):
+            raise ValueError(f"Unknown dialect: {dialect}")
+        self.connection = connection
+        self.dialect = dialect
+        self.cursor = connection.cursor()
+
+    def _execute_ddl(self, statement):
+        if callable(statement):
+            statement(self)
+            return
+        try:
+            self.cursor.execute(statement)
+        except Exception as e:
+            if self.dialect == "oracle" and str(e).startswith(IGNORABLE_ORACLE_ERRORS):
+                logger.info(f"Skipping existing object: {str(e).splitlines()[0]}")
+                return
+            raise
+
+    def ensure_migrations_table(self):
+        """Create the schema_migrations bookkeeping table if needed"""
+        if self.dialect == "oracle":
+            self._execute_ddl(
+                """CREATE TABLE schema_migrations (
+                    version     NUMBER PRIMARY KEY,
+                    description VARCHAR2(200),
+                    applied_at  TIMESTAMP DEFAULT SYSTIMESTAMP
+                )"""
+            )
+        else:
+            self._execute_ddl(
+                """CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version     INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at  TEXT DEFAULT CURRENT_TIMESTAMP
+                )"""
+            )
+
+    def applied_versions(self):
+        """Return the set of migration versions already applied"""
+        self.ensure_migrations_table()
+        self.cursor.execute("SELECT version FROM schema_migrations")
+        return {int(row[0]) for row in self.cursor.fetchall()}
+
+    def apply(self, target=None):
+        """
+        Apply pending migrations in order, up to target (all if None).
+        Returns: (success: bool, applied versions or error_message)
+        """
+        applied = []
+        try:
+            done = self.applied_versions()
+            for migration in MIGRATIONS:
+                version = migration["version"]
+                if version in done:
+                    continue
+                if target is not None and version > target:
+                    break
+
+                logger.info(f"Applying migration {version}: {migration['description']}")
+                for statement in migration[self.dialect]:
+                    self._execute_ddl(statement)
+
+                bind = "?" if self.dialect == "sqlite" else ":1"
+                bind2 = "?" if self.dialect == "sqlite" else ":2"
+                self.cursor.execute(
+                    f"INSERT INTO schema_migrations (version, description) VALUES ({bind}, {bind2})",
+                    (version, migration["description"])
+                )
+                self.connection.commit()
+                applied.append(version)
+            return True, applied
+        except Exception as e:
+            error_msg = f"Migration failed: {str(e)}"
+            logger.error(error_msg)
+            self.connection.rollback()
+            return False, error_msg
+
+    def existing_objects(self):
+        """Return (tables, indexes) present in the schema, lowercased"""
+        if self.dialect == "oracle":
+            self.cursor.execute("SELECT table_name FROM user_tables")
+            tables = {row[0].lower() for row in self.cursor.fetchall()}
+            self.cursor.execute("SELECT index_name FROM user_indexes")
+            indexes = {row[0].lower() for row in self.cursor.fetchall()}
+        else:
+            self.cursor.execute("SELECT type, name FROM sqlite_master")
+            rows = self.cursor.fetchall()
+            tables = {name.lower() for kind, name in rows if kind == "table"}
+            indexes = {name.lower() for kind, name in rows if kind == "index"}
+        return tables, indexes
+
+    def verify(self):
+        """
+        Check that every applied migration left its tables and indexes behind.
+        Returns: (success: bool, list of problems)
+        """
+        problems = []
+        try:
+            done = self.applied_versions()
+            tables, indexes = self.existing_objects()
+            dropped = {index for migration in MIGRATIONS if migration["version"] in done
+                       for index in migration.get("dropped_indexes", [])}
+            for migration in MIGRATIONS:
+                version = migration["version"]
+                if version not in done:
+                    problems.append(f"Migration {version} not applied")
+                    continue
+                for table in migration["tables"]:
+                    if table.lower() not in tables:
+                        problems.append(f"Migration {version}: missing table {table}")
+                for index in migration["indexes"]:
+                    if index.lower() not in indexes and index not in dropped:
+                        problems.append(f"Migration {version}: missing index {index}")
+                for index in migration.get("dropped_indexes", []):
+                    if index.lower() in indexes:
+                        problems.append(f"Migration {version}: index {index} should have been dropped")
+            return len(problems) == 0, problems
+        except Exception as e:
+            error_msg = f"Verify failed: {str(e)}"
+            logger.error(error_msg)
+            return False, [error_msg]
+
+    def explain(self, sql, binds=()):
+        """Return the execution plan for a query as a list of text lines"""
+        if self.dialect == "oracle":
+            self.cursor.execute("EXPLAIN PLAN SET STATEMENT_ID = 'STATREP_HOT' FOR " + sql)
+            self.cursor.execute(
+                "SELECT plan_table_output FROM TABLE(DBMS_XPLAN.DISPLAY(NULL, 'STATREP_HOT', 'TYPICAL'))"
+            )
+            lines = [row[0] for row in self.cursor.fetchall()]
+            self.cursor.execute("DELETE FROM plan_table WHERE statement_id = 'STATREP_HOT'")
+            self.connection.commit()
+            return lines
+
+        self.cursor.execute("EXPLAIN QUERY PLAN " + to_sqlite_sql(sql), binds)
+        return [f"{row[0]}|{row[1]}| {row[3]}" for row in self.cursor.fetchall()]
+
+    def busiest_location(self):
+        """(state, neighborhood) with the most hot rows - the worst case for per-location queries"""
+        self.cursor.execute(self._sql(
+            """SELECT state, neighborhood FROM statrep GROUP BY state, neighborhood
+               ORDER BY COUNT(*) DESC FETCH FIRST 1 ROW ONLY"""))
+        return self.cursor.fetchone()
+
+    def _sql(self, sql):
+        return sql if self.dialect == "oracle" else to_sqlite_sql(sql)
+
+    def _timed_fetch(self, sql, binds, repeat):
+        best, rows = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            self.cursor.execute(self._sql(sql), binds)
+            rows = self.cursor.fetchall()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, rows
+
+    def compare_rewrites(self, state=None, neighborhood=None, repeat=5):
+        """
+        Run each QUERY_REWRITES pair on this database (default: its busiest
+        location). Results agree when the rewrite returns exactly one row per
+        handle and it is the legacy row with the highest id among that
+        handle's ties. Returns: {name: stats dict}
+        """
+        if state is None:
+            location = self.busiest_location()
+            if location is None:
+                return {}
+            state, neighborhood = location
+        results = {}
+        for name, rewrite in QUERY_REWRITES.items():
+            legacy_binds = rewrite["legacy_binds"](state, neighborhood)
+            rewrite_binds = rewrite["rewrite_binds"](state, neighborhood)
+            alternatives = dict(rewrite.get("alternatives", {}))
+            if self.dialect == "oracle" and "oracle_rewrite" in rewrite:
+                alternatives["row_number_ids"] = rewrite["rewrite"]
+                candidates = {"rewrite": rewrite["oracle_rewrite"], **alternatives}
+            else:
+                candidates = {"rewrite": rewrite["rewrite"], **alternatives}
+            seconds = {}
+            rows = {}
+            for _ in range(2):   # alternate so no form always runs on a warm cache
+                for label, sql in (("legacy", rewrite["legacy"]), *candidates.items()):
+                    elapsed, rows[label] = self._timed_fetch(sql, legacy_binds if label == "legacy" else rewrite_binds,
+                                                             repeat)
+                    seconds[label] = min(seconds.get(label, elapsed), elapsed)
+
+            # rows are full statrep rows: id, amcon_handle, ...
+            expected = {}
+            for row in rows["legacy"]:
+                expected[row[1]] = max(expected.get(row[1], row[0]), row[0])
+
+            def agrees(found):
+                handles = [row[1] for row in found]
+                return len(handles) == len(set(handles)) and {row[1]: row[0] for row in found} == expected
+
+            results[name] = {
+                "location": (state, neighborhood),
+                "legacy_ms": round(seconds["legacy"] * 1000, 2),
+                "rewrite_ms": round(seconds["rewrite"] * 1000, 2),
+                "legacy_rows": len(rows["legacy"]),
+                "rewrite_rows": len(rows["rewrite"]),
+                "tied_duplicates": len(rows["legacy"]) - len(expected),
+                "equivalent": all(agrees(rows[label]) for label in candidates),
+                "alternatives": {label: {"ms": round(seconds[label] * 1000, 2), "rows": len(rows[label]),
+                                         "equivalent": agrees(rows[label]),
+                                         "plan": self.explain(sql, rewrite_binds)}
+                                 for label, sql in alternatives.items()},
+                "legacy_plan": self.explain(rewrite["legacy"], legacy_binds),
+                "rewrite_plan": self.explain(candidates["rewrite"], rewrite_binds),
+            }
+        return results
+
+    def print_plans(self):
+        """Print the plan of every hot query"""
+        for name, (sql, binds) in HOT_QUERIES.items():
+            if self.dialect == "oracle":
+                sql = ORACLE_HOT_QUERIES.get(name, sql)
+            print(f"===== {name} =====")
+            try:
+                for line in self.explain(sql, binds):
+                    print(line)
+            except Exception as e:
+                print(f"EXPLAIN failed: {str(e)}")
+            print()
+
+def open_connection(sqlite_path=None):
+    """
+    Open a connection to the local SQLite stand-in (if a path is given)
+    or to the production Oracle database.
+    Returns: (connection, dialect, owner) - owner must be closed when done
+    """
+    if sqlite_path:
+        connection = sqlite3.connect(sqlite_path)
+        return connection, "sqlite", connection
+
+    db = StatrepDatabase()
+    success, error = db.connect()
+    if not success:
+        raise RuntimeError(error)
+    return db.connection, "oracle", db
+
+def build_benchmark_db(rows, handles=None, locations=20, tie_rate=0.02, seed=11):
+    """
+    In-memory SQLite stand-in with rows synthetic STATREPs: handles report
+    every ~10 minutes from a home location, and tie_rate of reports repeat
+    the previous report's datetime_group (a corrected resend).
+    Returns: SchemaManager on the new database
+    """
+    rng = random.Random(seed)
+    handles = handles or max(rows // 20, 10)
+    connection = sqlite3.connect(":memory:")
+    manager = SchemaManager(connection, "sqlite")
+    manager.apply()
+    start = datetime(2025, 1, 1)
+    last = {}
+    batch = []
+    for n in range(rows):
+        handle = rng.randrange(handles)
+        home = handle % locations
+        if handle in last and rng.random() < tie_rate:
+            moment = last[handle]
+        else:
+            moment = start + timedelta(minutes=10 * n // handles + rng.randint(0, 9))
+        last[handle] = moment
+        batch.append((f"H{handle:05d}", moment.strftime("%Y-%m-%d %H:%M:%S"),
+                       f"State {home % 5}", f"Neighborhood {home}", "EM10", rng.choice("ABC")))
+    manager.cursor.executemany(
+        """INSERT INTO statrep (amcon_handle, datetime_group, state, neighborhood, location, conditions)
+           VALUES (?, ?, ?, ?, ?, ?)""", batch)
+    manager.cursor.execute("ANALYZE")
+    connection.commit()
+    return manager
+
+def print_comparison(results, plans=True):
+    for name, stats in results.items():
+        mark = "✓" if stats["equivalent"] else "✗"
+        speedup = stats["legacy_ms"] / stats["rewrite_ms"] if stats["rewrite_ms"] else float("inf")
+        print(f"{mark} {name} at {stats['location'][0]}/{stats['location'][1]}: "
+              f"legacy {stats['legacy_ms']} ms ({stats['legacy_rows']} rows, {stats['tied_duplicates']} tie duplicates), "
+              f"rewrite {stats['rewrite_ms']} ms ({stats['rewrite_rows']} rows) - {speedup:.1f}x")
+        for label, alternative in stats["alternatives"].items():
+            mark = "✓" if alternative["equivalent"] else "✗"
+            print(f"  {mark} {label}: {alternative['ms']} ms ({alternative['rows']} rows)")
+        if plans:
+            for label in ("legacy", "rewrite"):
+                print(f"  --- {label} plan ---")
+                for line in stats[f"{label}_plan"]:
+                    print(f"  {line}")
+            for label, alternative in stats["alternatives"].items():
+                print(f"  --- {label} plan ---")
+                for line in alternative["plan"]:
+                    print(f"  {line}")
+
+def main():
+    parser = argparse.ArgumentParser(description="STATREP schema migrations and index management")
+    parser.add_argument("command", choices=["apply", "status", "verify", "plans", "compare"])
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="Use a local SQLite stand-in instead of the production database")
+    parser.add_argument("--target", type=int, help="Apply migrations up to this version only")
+    parser.add_argument("--sizes", metavar="ROWS",
+                        help="compare: run on synthetic SQLite stand-ins of these sizes (e.g. 1000,100000) "
+                             "instead of the database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.command == "compare" and args.sizes:
+        logging.getLogger(__name__).setLevel(logging.WARNING)   # one "Applying migration" line per size otherwise
+        ok = True
+        sizes = [int(size) for size in args.sizes.split(",")]
+        for size in sizes:
+            manager = build_benchmark_db(size)
+            print(f"===== {size:,} rows =====")
+            results = manager.compare_rewrites()
+            print_comparison(results, plans=size == sizes[-1])
+            ok = ok and all(stats["equivalent"] for stats in results.values())
+            manager.connection.close()
+        return 0 if ok else 1
+
+    connection, dialect, owner = open_connection(args.sqlite)
+    try:
+        manager = SchemaManager(connection, dialect)
+
+        if args.command == "apply":
+            success, result = manager.apply(args.target)
+            if not success:
+                print(f"✗ {result}")
+                return 1
+            print(f"✓ Applied migrations: {result or 'none (up to date)'}")
+            ok, problems = manager.verify()
+            for problem in problems:
+                print(f"✗ {problem}")
+            return 0 if ok else 1
+
+        if args.command == "status":
+            done = manager.applied_versions()
+            for migration in MIGRATIONS:
+                mark = "✓" if migration["version"] in done else " "
+                print(f"[{mark}] {migration['version']:3d}  {migration['description']}")
+            return 0
+
+        if args.command == "verify":
+            ok, problems = manager.verify()
+            for problem in problems:
+                print(f"✗ {problem}")
+            if ok:
+                print(f"✓ Schema verified ({dialect})")
+            return 0 if ok else 1
+
+        if args.command == "compare":
+            results = manager.compare_rewrites()
+            print_comparison(results)
+            return 0 if all(stats["equivalent"] for stats in results.values()) else 1
+
+        manager.print_plans()
+        return 0
+    finally:
+        owner.close()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
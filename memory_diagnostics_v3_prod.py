@@ -0,0 +1,159 @@
+import gc
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+# Opt in with STATREP_MEMORY_DIAGNOSTICS=1 - tracing makes every allocation slower
+# and the snapshots themselves take memory, so it is off in normal service
+MEMORY_DIAGNOSTICS_ENV = "STATREP_MEMORY_DIAGNOSTICS"
+# Stack depth kept per allocation. One frame already makes control-heavy
+# handlers ~7x slower (five: ~45x); raise it only to group diffs by traceback
+TRACE_FRAMES_ENV = "STATREP_MEMORY_TRACE_FRAMES"
+DEFAULT_TRACE_FRAMES = 1
+MAX_SNAPSHOTS = 5         # older snapshots are dropped
+DEFAULT_TOP = 15
+
+def memory_diagnostics_enabled():
+    return os.getenv(MEMORY_DIAGNOSTICS_ENV, "").lower() in ("1", "true", "yes")
+
+def _flet_control_class():
+    from flet.core.control import Control
+    return Control
+
+def _location(trace_key):
+    """file:line for one tracemalloc statistic (innermost frame)"""
+    frame = trace_key.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+class MemoryDiagnostics:
+    def __init__(self, max_snapshots=MAX_SNAPSHOTS, frames=None):
+        """
+        Live Flet sessions (held weakly - a session that outlives its
+        connection shows up here) and tracemalloc snapshots to diff.
+        """
+        self.frames = frames or int(os.getenv(TRACE_FRAMES_ENV, DEFAULT_TRACE_FRAMES))
+        self._pages = weakref.WeakValueDictionary()  # session_id -> page
+        self._opened = {}                            # session_id -> monotonic time tracked
+        self._snapshots = deque(maxlen=max_snapshots)  # (id, wall time, snapshot)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def track_page(self, page):
+        with self._lock:
+            self._pages[page.session_id] = page
+            self._opened[page.session_id] = time.monotonic()
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"tracemalloc started ({self.frames} frames)")
+
+    def sessions(self):
+        """
+        Per live session: controls in the page index, overlay entries, and
+        closed dialogs/snackbars still held by the overlay (page.close() only
+        hides them - each show_*_dialog call adds another)
+        """
+        with self._lock:
+            pages = list(self._pages.items())
+            opened = dict(self._opened)
+            for session_id in set(opened) - {session_id for session_id, _ in pages}:
+                del self._opened[session_id]
+        now = time.monotonic()
+        result = []
+        for session_id, page in pages:
+            overlay = list(page.overlay)
+            closed = Counter(type(control).__name__ for control in overlay if getattr(control, "open", True) is False)
+            result.append({
+                "session_id": session_id,
+                "age_seconds": round(now - opened.get(session_id, now)),
+                "controls": len(page.index),
+                "overlay": len(overlay),
+                "closed_overlay": dict(closed),
+            })
+        return sorted(result, key=lambda entry: entry["controls"], reverse=True)
+
+    def live_controls(self, top=DEFAULT_TOP):
+        """Flet controls alive anywhere in the process, by class (walks the GC heap - slow)"""
+        control = _flet_control_class()
+        counts = Counter(type(obj).__name__ for obj in gc.get_objects() if isinstance(obj, control))
+        return {"total": sum(counts.values()), "by_class": dict(counts.most_common(top))}
+
+    def take_snapshot(self, top=DEFAULT_TOP):
+        """
+        Snapshot the traced heap (starting tracemalloc if needed) and return the
+        top allocators plus the change since the previous snapshot.
+        """
+        self.start_tracing()
+        gc.collect()   # only count what is really still referenced
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            previous = self._snapshots[-1] if self._snapshots else None
+            self._snapshots.append((snapshot_id, time.time(), snapshot))
+        result = {"id": snapshot_id, "top": self._top(snapshot, top)}
+        if previous is not None:
+            result["since"] = previous[0]
+            result["diff"] = self._diff(previous[2], snapshot, top)
+        return result
+
+    def diff(self, from_id, to_id=None, top=DEFAULT_TOP, group_by="lineno"):
+        """
+        Top allocation changes between two kept snapshots (to_id defaults to the latest).
+        group_by "traceback" shows the call path of each allocator (as deep as
+        STATREP_MEMORY_TRACE_FRAMES).
+        Returns: list, or None if either snapshot is unknown
+        """
+        with self._lock:
+            kept = {snapshot_id: snapshot for snapshot_id, _, snapshot in self._snapshots}
+            if to_id is None and self._snapshots:
+                to_id = self._snapshots[-1][0]
+        if from_id not in kept or to_id not in kept:
+            return None
+        return self._diff(kept[from_id], kept[to_id], top, group_by)
+
+    def _top(self, snapshot, top):
+        return [{"where": _location(stat), "kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]]
+
+    def _diff(self, older, newer, top, group_by="lineno"):
+        entries = []
+        for stat in newer.compare_to(older, group_by)[:top]:
+            entry = {"where": _location(stat), "kb_diff": round(stat.size_diff / 1024, 1),
+                     "count_diff": stat.count_diff, "kb": round(stat.size / 1024, 1)}
+            if group_by == "traceback":
+                entry["traceback"] = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+            entries.append(entry)
+        return entries
+
+    def report(self, include_heap=False):
+        """Sessions, tracemalloc totals and kept snapshots; include_heap adds live_controls()"""
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        with self._lock:
+            snapshots = [{"id": snapshot_id, "taken": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(taken))}
+                         for snapshot_id, taken, _ in self._snapshots]
+        result = {"pid": os.getpid(), "tracing": tracing, "traced_kb": round(current / 1024),
+                  "peak_kb": round(peak / 1024), "snapshots": snapshots, "sessions": self.sessions()}
+        if include_heap:
+            result["live_controls"] = self.live_controls()
+        return result
+
+
+_diagnostics = MemoryDiagnostics()
+
+def get_memory_diagnostics():
+    """Return the process-wide memory diagnostics"""
+    return _diagnostics
@@ -0,0 +1,100 @@
+import argparse
+import csv
+import logging
+from manage_handles_v3_prod import HandlesDatabase, hash_pin, invalidate_handles_cache
+
+logger = logging.getLogger(__name__)
+
+def read_roster(path):
+    """
+    Read (handle, pin) pairs from a CSV roster. A header row with
+    "handle" and "pin" columns is optional.
+    Returns: (rows, skipped) - skipped is a list of (line number, reason)
+    """
+    rows = []
+    skipped = []
+    seen = set()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line_number, record in enumerate(csv.reader(f), start=1):
+            if not record or not any(field.strip() for field in record):
+                continue
+            if line_number == 1 and record[0].strip().lower() == "handle":
+                continue
+            if len(record) < 2 or not record[0].strip() or not record[1].strip():
+                skipped.append((line_number, "missing handle or PIN"))
+                continue
+
+            handle, pin = record[0].strip(), record[1].strip()
+            if handle in seen:
+                skipped.append((line_number, f"duplicate handle {handle}"))
+                continue
+            seen.add(handle)
+            rows.append((handle, pin))
+    return rows, skipped
+
+def provision_handles(db, roster, update_existing=True):
+    """
+    Hash roster PINs and upsert them in one transaction.
+    Returns: (success: bool, counts dict or error_message)
+    """
+    handles = [handle for handle, _ in roster]
+    # One SHA-256 of a short PIN is about a microsecond - a process pool
+    # costs far more to start and feed than it could save
+    hashes = [hash_pin(pin) for _, pin in roster]
+
+    success, existing = db.get_pin_hashes(handles)
+    if not success:
+        return False, existing
+
+    counts = {"created": 0, "updated": 0, "skipped": 0}
+    changes = []
+    for handle, pin_hash in zip(handles, hashes):
+        if handle not in existing:
+            counts["created"] += 1
+        elif existing[handle] == pin_hash or not update_existing:
+            counts["skipped"] += 1
+            continue
+        else:
+            counts["updated"] += 1
+        changes.append((handle, pin_hash))
+
+    if changes:
+        success, error = db.upsert_handles(changes)
+        if not success:
+            return False, error
+    else:
+        invalidate_handles_cache()
+    return True, counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-provision handles and PINs from a CSV roster")
+    parser.add_argument("roster", help="CSV file with handle,pin rows")
+    parser.add_argument("--no-update", action="store_true", help="Only create new handles, never change PINs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    roster, bad_rows = read_roster(args.roster)
+    for line_number, reason in bad_rows:
+        print(f"  line {line_number}: {reason}")
+
+    db = HandlesDatabase()
+    success, error = db.connect()
+    if not success:
+        print(f"✗ {error}")
+        return 1
+
+    try:
+        success, result = provision_handles(db, roster, update_existing=not args.no_update)
+    finally:
+        db.close()
+
+    if not success:
+        print(f"✗ {result}")
+        return 1
+    print(f"✓ Created: {result['created']}, Updated: {result['updated']}, "
+          f"Skipped: {result['skipped'] + len(bad_rows)}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
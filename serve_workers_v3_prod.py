@@ -0,0 +1,447 @@
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from statrep_hub_v3_prod import PubSubHub, HUB_ADDRESS_ENV, HUB_AUTHKEY_ENV
+from statrep_logging_v3_prod import configure_logging
+
+logger = logging.getLogger(__name__)
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "statrep_flet_app_v3_prod.py")
+PUBLIC_PORT = 8000
+WORKER_BASE_PORT = 8100
+RESTART_DELAY = 2.0
+CONNECT_TIMEOUT = 3.0
+
+class WorkerPool:
+    def __init__(self, count, base_port=WORKER_BASE_PORT, hub=None, script=APP_SCRIPT):
+        """
+        Runs count copies of the Flet app, each a web server on its own
+        loopback port, and restarts any that exit.
+        """
+        self.count = count
+        self.ports = [base_port + n for n in range(count)]
+        self.hub = hub
+        self.script = script
+        self._processes = [None] * count
+        self._stopping = False
+
+    def _spawn(self, n):
+        env = dict(os.environ,
+                   FLET_FORCE_WEB_SERVER="true",
+                   FLET_SERVER_IP="127.0.0.1",
+                   FLET_SERVER_PORT=str(self.ports[n]))
+        if self.hub is not None:
+            env[HUB_ADDRESS_ENV] = f"{self.hub.address[0]}:{self.hub.address[1]}"
+            env[HUB_AUTHKEY_ENV] = self.hub.authkey.hex()
+        self._processes[n] = subprocess.Popen([sys.executable, self.script], env=env)
+        logger.info(f"Worker {n} started on port {self.ports[n]} (pid {self._processes[n].pid})")
+
+    def start(self):
+        for n in range(self.count):
+            self._spawn(n)
+        threading.Thread(target=self._watch, name="statrep-worker-watch", daemon=True).start()
+
+    def _watch(self):
+        while not self._stopping:
+            time.sleep(RESTART_DELAY)
+            for n, process in enumerate(self._processes):
+                if not self._stopping and process.poll() is not None:
+                    logger.warning(f"Worker {n} exited with {process.returncode} - restarting")
+                    self._spawn(n)
+
+    def wait_ready(self, timeout=60.0):
+        """Block until every worker accepts connections"""
+        deadline = time.monotonic() + timeout
+        for port in self.ports:
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1.0).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"worker on port {port} did not start")
+                    time.sleep(0.2)
+
+    def stop(self):
+        self._stopping = True
+        for process in self._processes:
+            if process and process.poll() is None:
+                process.terminate()
+        for process in self._processes:
+            if process:
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+class AffinityBalancer:
+    def __init__(self, worker_ports, host="0.0.0.0", port=PUBLIC_PORT):
+        """
+        TCP load balancer with client-IP affinity. A Flet session is one
+        long-lived websocket, so the same client must keep reaching the
+        worker that holds its page; hashing the address gives that without
+        shared session state. A worker that is down is skipped.
+        """
+        self.worker_ports = worker_ports
+        self.host = host
+        self.port = port
+        self.connections = [0] * len(worker_ports)
+
+    def pick(self, client_ip):
+        """Worker indexes to try for a client, preferred worker first"""
+        start = zlib.crc32(client_ip.encode()) % len(self.worker_ports)
+        return [(start + k) % len(self.worker_ports) for k in range(len(self.worker_ports))]
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _handle(self, client_reader, client_writer):
+        client_ip = client_writer.get_extra_info("peername")[0]
+        for n in self.pick(client_ip):
+            try:
+                worker_reader, worker_writer = await asyncio.wait_for(
+                    asyncio.open_connection("127.0.0.1", self.worker_ports[n]), CONNECT_TIMEOUT)
+                break
+            except (OSError, asyncio.TimeoutError):
+                continue
+        else:
+            logger.error(f"No worker available for {client_ip}")
+            client_writer.close()
+            return
+
+        self.connections[n] += 1
+        try:
+            await asyncio.gather(self._pipe(client_reader, worker_writer),
+                                 self._pipe(worker_reader, client_writer))
+        finally:
+            self.connections[n] -= 1
+
+    async def serve(self, stop_event):
+        server = await asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        logger.info(f"Balancing {self.host}:{self.port} across workers on ports {self.worker_ports}")
+        async with server:
+            await stop_event.wait()
+
+
+def serve(workers, host, port, base_port):
+    hub = PubSubHub()
+    hub.start()
+    pool = WorkerPool(workers, base_port, hub)
+    pool.start()
+    balancer = AffinityBalancer(pool.ports, host, port)
+
+    async def run():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        await balancer.serve(stop_event)
+
+    try:
+        asyncio.run(run())
+    finally:
+        pool.stop()
+        hub.stop()
+
+
+class _BalancedPool:
+    def __init__(self, count, base_port, port, env=None):
+        """A hub, count workers and the balancer on 127.0.0.1:port, for the benchmarks"""
+        self.count = count
+        self.base_port = base_port
+        self.port = port
+        self.env = env or {}
+
+    def __enter__(self):
+        self._saved_env = {name: os.environ.get(name) for name in self.env}
+        os.environ.update(self.env)   # inherited by the workers
+        self.hub = PubSubHub()
+        self.hub.start()
+        self.pool = WorkerPool(self.count, self.base_port, self.hub)
+        self.pool.start()
+        try:
+            self.pool.wait_ready()
+            balancer = AffinityBalancer(self.pool.ports, "127.0.0.1", self.port)
+            self._loop = asyncio.new_event_loop()
+            self._stop_event = None
+            ready = threading.Event()
+
+            def run_balancer():
+                asyncio.set_event_loop(self._loop)
+                self._stop_event = asyncio.Event()
+                self._loop.call_soon(ready.set)
+                self._loop.run_until_complete(balancer.serve(self._stop_event))
+
+            self._thread = threading.Thread(target=run_balancer, daemon=True)
+            self._thread.start()
+            ready.wait()
+            time.sleep(0.5)
+        except BaseException:
+            self._stop_pool()
+            raise
+        return self
+
+    def _stop_pool(self):
+        self.pool.stop()
+        self.hub.stop()
+        for name, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def __exit__(self, *exc):
+        self._loop.call_soon_threadsafe(self._stop_event.set)
+        self._thread.join(5)
+        self._stop_pool()
+
+
+def benchmark(worker_counts, requests, concurrency, base_port, port):
+    """
+    Requests/second through the balancer for each worker count. Clients
+    connect from distinct loopback addresses (127.0.0.x) so IP affinity
+    spreads them the way real operators would be spread.
+    """
+    import http.client
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch(n):
+        source = f"127.0.0.{2 + n % 250}"
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30, source_address=(source, 0))
+        try:
+            conn.request("GET", "/")
+            response = conn.getresponse()
+            response.read()
+            return response.status == 200
+        finally:
+            conn.close()
+
+    results = []
+    for count in worker_counts:
+        with _BalancedPool(count, base_port, port):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                ok = sum(executor.map(fetch, range(requests)))
+            elapsed = time.perf_counter() - started
+
+        results.append((count, ok / elapsed, requests - ok))
+        print(f"{count} worker(s): {ok / elapsed:,.0f} req/s ({requests - ok} failed)")
+
+    base = results[0][1]
+    for count, rate, _ in results:
+        print(f"  {count} worker(s): {rate / base:.2f}x")
+    return results
+
+
+SESSION_TIMEOUT = 30.0
+BENCHMARK_PIN = "4321"
+BENCHMARK_HANDLES = 100
+
+class _AppSession:
+    def __init__(self, port, source):
+        """
+        One browser tab, speaking Flet's web protocol over /ws: register the
+        page, then fill in and submit the STATREP form like an operator would.
+        """
+        from websockets.sync.client import connect
+        sock = socket.create_connection(("127.0.0.1", port), timeout=SESSION_TIMEOUT, source_address=(source, 0))
+        self._stack = contextlib.ExitStack()
+        self._ws = self._stack.enter_context(
+            connect(f"ws://127.0.0.1:{port}/ws", sock=sock, open_timeout=SESSION_TIMEOUT))
+        self.by_label = {}   # label or button text -> control id (first one seen)
+        self.props = {}      # control id -> latest props sent by the server
+
+    def _send(self, action, payload):
+        import json
+        self._ws.send(json.dumps({"action": action, "payload": payload}))
+
+    def _receive(self, until):
+        """Apply server messages until until() is true; False on timeout"""
+        import json
+        deadline = time.monotonic() + SESSION_TIMEOUT
+        while not until():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                message = json.loads(self._ws.recv(timeout=remaining))
+            except TimeoutError:
+                return False
+            batch = message["payload"] if message["action"] == "pageControlsBatch" else [message]
+            for entry in batch:
+                if entry["action"] == "addPageControls":
+                    for control in entry["payload"]["controls"]:
+                        for key in ("label", "text"):
+                            if key in control:
+                                self.by_label.setdefault(control[key], control["i"])
+                elif entry["action"] == "updateControlProps":
+                    for props in entry["payload"]["props"]:
+                        self.props.setdefault(props["i"], {}).update(props)
+        return True
+
+    def open(self):
+        """Register and wait for the form; returns False if it never arrived"""
+        self._send("registerWebClient", {
+            "pageName": "", "pageRoute": "/", "pageWidth": "1280", "pageHeight": "900",
+            "windowWidth": "1280", "windowHeight": "900", "windowTop": "0", "windowLeft": "0",
+            "isPWA": "false", "isWeb": "true", "isDebug": "false", "platform": "linux",
+            "platformBrightness": "light", "media": "{}", "sessionId": ""})
+        return self._receive(lambda: "Submit STATREP" in self.by_label)
+
+    def submit(self, handle, pin):
+        """
+        Fill in the form, press Submit and wait for the outcome (the status line
+        and the button enabled again - the last update); returns the status line
+        """
+        import json
+        fields = {"Your ReadyCore Handle": handle, "PIN": pin, "State / Territory": "Texas",
+                  "Neighborhood": "Downtown", "Your Location": "Benchmark"}
+        changes = [{"i": self.by_label[label], "value": value} for label, value in fields.items()]
+        self._send("pageEventFromWeb", {"eventTarget": "page", "eventName": "change",
+                                        "eventData": json.dumps(changes)})
+        button = self.by_label["Submit STATREP"]
+        before = {control_id: props.get("value") for control_id, props in self.props.items()}
+
+        def outcome():
+            return next((props["value"] for control_id, props in self.props.items()
+                         if props.get("value") != before.get(control_id) and isinstance(props.get("value"), str)
+                         and props["value"].startswith(("✓ STATREP", "✗"))), None)
+
+        def finished():
+            return outcome() is not None and self.props.get(button, {}).get("disabled") in (False, "false")
+
+        self._send("pageEventFromWeb", {"eventTarget": button, "eventName": "click", "eventData": ""})
+        self._receive(finished)
+        return outcome()
+
+    def close(self):
+        try:
+            self._send("pageEventFromWeb", {"eventTarget": "page", "eventName": "close", "eventData": ""})
+        finally:
+            self._stack.close()
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000 if ordered else float("nan")
+
+def session_benchmark(worker_counts, sessions, concurrency, base_port, port):
+    """
+    The whole app rather than "GET /": each client opens a WebSocket session
+    through the balancer, waits for the form, fills it in, submits a STATREP
+    and waits for the confirmation, then closes the page. The workers write to
+    a SQLite stand-in (STATREP_DB_WRITE_SQLITE) seeded with BENCHMARK_HANDLES
+    handles, so the submit path - PIN check, queue, insert, hub publish - runs
+    for real. Reports sessions/second and load/submit latency per worker count.
+    """
+    import sqlite3
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from manage_handles_v3_prod import hash_pin
+    from manage_schema_v3_prod import SchemaManager
+
+    def run_session(n):
+        session = None
+        try:
+            started = time.perf_counter()
+            session = _AppSession(port, f"127.0.0.{2 + n % 250}")
+            if not session.open():
+                return None, None, "form never arrived"
+            loaded = time.perf_counter()
+            status = session.submit(f"N0B{n % BENCHMARK_HANDLES:03d}", BENCHMARK_PIN)
+            done = time.perf_counter()
+            if not status or not status.startswith("✓"):
+                return loaded - started, None, status or "no confirmation"
+            return loaded - started, done - loaded, None
+        except Exception as e:
+            return None, None, str(e)
+        finally:
+            if session is not None:
+                session.close()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "standin.sqlite")
+        sqlite = sqlite3.connect(path)
+        SchemaManager(sqlite, "sqlite").apply()
+        sqlite.executemany("INSERT INTO handles (handle, pin_hash, modified_at) VALUES (?, ?, datetime('now'))",
+                           [(f"N0B{n:03d}", hash_pin(BENCHMARK_PIN)) for n in range(BENCHMARK_HANDLES)])
+        sqlite.execute("INSERT INTO states (state_name) VALUES ('Texas')")
+        sqlite.execute("INSERT INTO neighborhoods (neighborhood_name) VALUES ('Downtown')")
+        sqlite.commit()
+        sqlite.close()
+        env = {"STATREP_DB_WRITE_SQLITE": path, "STATREP_LOG_LEVEL": "WARNING"}
+
+        for count in worker_counts:
+            with _BalancedPool(count, base_port, port, env):
+                started = time.perf_counter()
+                with ThreadPoolExecutor(concurrency) as executor:
+                    outcomes = list(executor.map(run_session, range(sessions)))
+                elapsed = time.perf_counter() - started
+            loads = [load for load, _, _ in outcomes if load is not None]
+            submits = [submit for _, submit, _ in outcomes if submit is not None]
+            errors = [error for _, _, error in outcomes if error is not None]
+            results.append((count, len(submits) / elapsed, len(errors)))
+            print(f"{count} worker(s): {len(submits) / elapsed:.1f} sessions/s; "
+                  f"load p50 {_percentile(loads, 0.5):.0f} ms p95 {_percentile(loads, 0.95):.0f} ms; "
+                  f"submit p50 {_percentile(submits, 0.5):.0f} ms p95 {_percentile(submits, 0.95):.0f} ms; "
+                  f"{len(errors)} failed")
+            for error in sorted(set(errors))[:5]:
+                print(f"    {error}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the STATREP app from several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--host", default="0.0.0.0", help="public address to listen on")
+    parser.add_argument("--port", type=int, default=PUBLIC_PORT, help="public port")
+    parser.add_argument("--base-port", type=int, default=WORKER_BASE_PORT,
+                        help="first worker port (workers use consecutive loopback ports)")
+    parser.add_argument("--benchmark", metavar="COUNTS", default=None,
+                        help="measure throughput for these worker counts (e.g. 1,2,4) and exit")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per benchmark run")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent benchmark clients")
+    parser.add_argument("--sessions", type=int, default=None, metavar="N",
+                        help="with --benchmark: run N full app sessions (open, submit a STATREP, close) "
+                             "instead of page requests")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    if args.benchmark:
+        counts = [int(n) for n in args.benchmark.split(",")]
+        if args.sessions:
+            session_benchmark(counts, args.sessions, args.concurrency, args.base_port, args.port)
+        else:
+            benchmark(counts, args.requests, args.concurrency, args.base_port, args.port)
+        return 0
+
+    serve(args.workers, args.host, args.port, args.base_port)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,724 @@
+import argparse
+import contextlib
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+import zlib
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+from statrep_db_v3_prod import StatrepDatabase, STATREP_CODES
+from statrep_submit_queue_v3_prod import get_submission_queue
+from statrep_feed_v3_prod import notify_insert
+from statrep_cache_v3_prod import get_location_cache
+from statrep_heatmap_v3_prod import get_condition_heatmap
+from statrep_sync_v3_prod import SyncStore, SyncResponder, encode_message, decode_message, get_node_id
+from manage_handles_v3_prod import HandlesDatabase, invalidate_handles_cache, on_handles_changed
+from manage_locations_v3_prod import LocationDatabase
+from import_statreps_v3_prod import parse_dtg, COMPACT_CODE_FIELDS
+from export_statreps_v3_prod import to_json_value
+from db_resilience_v3_prod import all_circuit_breakers
+from statrep_logging_v3_prod import configure_logging, correlation_context, log_fields, get_log_stats
+from memory_diagnostics_v3_prod import memory_diagnostics_enabled, get_memory_diagnostics, DEFAULT_TOP
+
+logger = logging.getLogger(__name__)
+
+# The API is opt-in: set STATREP_API_PORT to serve it next to the Flet UI.
+# STATREP_API_TOKENS holds gateway tokens as "name:token,name:token"; a token
+# may submit for any handle, a handle+PIN (HTTP Basic) only for itself.
+API_PORT_ENV = "STATREP_API_PORT"
+API_HOST_ENV = "STATREP_API_HOST"
+API_TOKENS_ENV = "STATREP_API_TOKENS"
+DEFAULT_API_PORT = 8200
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_SIZE = 500
+SUBMIT_WAIT_SECONDS = 1.0        # how long a single submit waits for its insert before answering 202
+SUBMISSION_TTL_SECONDS = 600.0   # a 202's status URL answers from memory this long (then from the table)
+MAX_PENDING_STATUS = 10000
+CREDENTIAL_TTL_SECONDS = 300.0   # verified handle+PIN pairs skip the database for this long
+REFERENCE_TTL_SECONDS = 30.0     # handles/states/neighborhoods lookup refresh
+DEFAULT_HISTORY_HOURS = 168
+MAX_HISTORY_HOURS = 24 * 90
+MAX_KEY_LENGTH = 64              # idempotency_key column width
+
+REQUIRED_FIELDS = ("amcon_handle", "datetime_group", "state", "neighborhood", "location", "conditions")
+# What a client is told when the database refuses an insert (the details are logged)
+INSERT_FAILED = "The STATREP could not be stored - retry, or quote the X-Request-ID if it keeps failing"
+
+Principal = namedtuple("Principal", "kind name")  # kind: "handle" or "token"
+
+class ApiError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+def load_api_tokens(value=None):
+    """Parse "name:token,..." into {sha256(token): name} (raw tokens aren't kept)"""
+    value = os.getenv(API_TOKENS_ENV, "") if value is None else value
+    tokens = {}
+    for entry in value.split(","):
+        name, _, token = entry.strip().partition(":")
+        if name and token:
+            tokens[hashlib.sha256(token.encode()).hexdigest()] = name
+    return tokens
+
+@contextlib.contextmanager
+def open_database(factory, role):
+    """Borrow a pooled connection for one request; 503 if the database is down"""
+    db = factory(role=role)
+    success, error = db.connect()
+    if not success:
+        raise ApiError(503, "Database unavailable", {"Retry-After": "30"})
+    try:
+        yield db
+    finally:
+        db.close()
+
+class Authenticator:
+    def __init__(self, tokens=None):
+        """
+        Checks API tokens and handle+PIN credentials. Verified PINs are
+        remembered for CREDENTIAL_TTL_SECONDS so a busy gateway doesn't
+        cost a handles lookup per request - and forgotten as soon as a
+        handles.changed event arrives (a PIN changed, a handle was
+        provisioned or synced), in this worker or any other on the hub.
+        """
+        self.tokens = load_api_tokens() if tokens is None else tokens
+        self._verified = {}  # (handle, pin hash) -> expiry
+        self._lock = threading.Lock()
+        on_handles_changed(self.forget_pins)
+
+    def forget_pins(self):
+        with self._lock:
+            self._verified = {}
+
+    def authenticate(self, headers):
+        authorization = headers.get("Authorization", "")
+        scheme, _, credentials = authorization.partition(" ")
+        if scheme.lower() == "bearer" and credentials:
+            digest = hashlib.sha256(credentials.strip().encode()).hexdigest()
+            for known, name in self.tokens.items():
+                if hmac.compare_digest(known, digest):
+                    return Principal("token", name)
+            raise ApiError(401, "Invalid API token")
+        if scheme.lower() == "basic" and credentials:
+            try:
+                handle, _, pin = b64decode(credentials.strip()).decode().partition(":")
+            except ValueError:
+                raise ApiError(401, "Malformed credentials")
+            return Principal("handle", self._verify_pin(handle, pin))
+        raise ApiError(401, "Authentication required", {"WWW-Authenticate": 'Basic realm="statrep"'})
+
+    def _verify_pin(self, handle, pin):
+        if not handle or not pin:
+            raise ApiError(401, "Invalid handle or PIN")
+        key = (handle, hashlib.sha256(pin.encode()).hexdigest())
+        now = time.monotonic()
+        with self._lock:
+            if self._verified.get(key, 0) > now:
+                return handle
+        with open_database(HandlesDatabase, "read") as handles_db:
+            if not handles_db.verify_pin(handle, pin):
+                raise ApiError(401, "Invalid handle or PIN")
+            if handles_db.pin_needs_change(handle, pin):
+                raise ApiError(403, "Temporary PIN - change it in the STATREP app first")
+        with self._lock:
+            if len(self._verified) > 10000:
+                self._verified = {k: t for k, t in self._verified.items() if t > now}
+            self._verified[key] = now + CREDENTIAL_TTL_SECONDS
+        return handle
+
+
+class ReferenceLists:
+    def __init__(self, ttl=REFERENCE_TTL_SECONDS):
+        """
+        Known handles, states and neighborhoods (case-insensitive -> canonical)
+        for validation. The lock only guards the swap: a refresh runs outside
+        it, and while one request refreshes a list the others keep using the
+        previous one rather than queueing behind the database.
+        """
+        self.ttl = ttl
+        self._lists = {}       # "handles"/"locations" -> (loaded_at, value)
+        self._loading = set()
+        self._lock = threading.Lock()
+
+    def _get(self, name, load):
+        with self._lock:
+            loaded_at, value = self._lists.get(name, (None, None))
+            if loaded_at is not None and (time.monotonic() - loaded_at <= self.ttl or name in self._loading):
+                return value
+            self._loading.add(name)
+        try:
+            value = load()
+        finally:
+            with self._lock:
+                self._loading.discard(name)
+        with self._lock:
+            self._lists[name] = (time.monotonic(), value)
+        return value
+
+    def _load_handles(self):
+        # get_all_handles is served from the process-wide handles cache
+        with open_database(HandlesDatabase, "read") as handles_db:
+            success, handles = handles_db.get_all_handles()
+        if not success:
+            raise ApiError(503, "Could not load handles", {"Retry-After": "30"})
+        return {h.upper(): h for h in handles}
+
+    def _load_locations(self):
+        with open_database(LocationDatabase, "read") as locations_db:
+            states_ok, states = locations_db.get_all_states()
+            neighborhoods_ok, neighborhoods = locations_db.get_all_neighborhoods()
+        if not (states_ok and neighborhoods_ok):
+            raise ApiError(503, "Could not load locations", {"Retry-After": "30"})
+        return {s.upper(): s for s in states}, {n.upper(): n for n in neighborhoods}
+
+    def handles(self):
+        return self._get("handles", self._load_handles)
+
+    def locations(self):
+        return self._get("locations", self._load_locations)
+
+
+def _reference(value, reference, what):
+    canonical = reference.get(str(value).strip().upper())
+    if canonical is None:
+        raise ValueError(f"unknown {what} '{value}'")
+    return canonical
+
+def _code(data, name):
+    value = data.get(name)
+    if value in (None, "", "-"):
+        return None
+    code = str(value).strip().upper()
+    if code not in STATREP_CODES[name]:
+        raise ValueError(f"invalid {name} code '{value}' (expected one of {', '.join(STATREP_CODES[name])})")
+    return code
+
+def parse_datetime_value(value):
+    """ISO 8601 with an offset, "YYYY-MM-DD HH:MM" (US Central) or a military DTG (UTC)"""
+    value = str(value).strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            return parsed
+    except ValueError:
+        pass
+    return parse_dtg(value)
+
+def parse_record(data, principal, handles, states, neighborhoods):
+    """
+    Validate one submitted STATREP object.
+    Returns the insert_statrep keyword arguments; raises ValueError with the reason.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("each STATREP must be a JSON object")
+    data = dict(data)
+    if principal.kind == "handle":
+        data.setdefault("amcon_handle", principal.name)
+    for required in REQUIRED_FIELDS:
+        if not str(data.get(required) or "").strip():
+            raise ValueError(f"missing {required}")
+
+    handle = _reference(data["amcon_handle"], handles, "handle")
+    if principal.kind == "handle" and handle != principal.name:
+        raise ValueError("a handle may only submit its own STATREPs")
+    conditions = _code(data, "conditions")
+    if conditions is None:
+        raise ValueError("missing conditions")
+    key = data.get("idempotency_key")
+    if key is not None and (not isinstance(key, str) or not 0 < len(key) <= MAX_KEY_LENGTH):
+        raise ValueError(f"idempotency_key must be a string of 1-{MAX_KEY_LENGTH} characters")
+    comments = str(data.get("comments") or "").strip()
+
+    record = {
+        "amcon_handle": handle,
+        "datetime_group": parse_datetime_value(data["datetime_group"]),
+        "state": _reference(data["state"], states, "state"),
+        "neighborhood": _reference(data["neighborhood"], neighborhoods, "neighborhood"),
+        "location": str(data["location"]).strip(),
+        "conditions": conditions,
+        "comments": comments or None,
+        # Without a client key a retry can't be recognized, but duplicates
+        # within this request (double-submitted batches) still collapse
+        "idempotency_key": key or uuid.uuid4().hex,
+    }
+    # Same rule as the form: status details only for non-"A" reports
+    for name in COMPACT_CODE_FIELDS:
+        record[name] = _code(data, name) if conditions != "A" else None
+    return record
+
+def row_to_json(row):
+    """A StatrepRow as a JSON object (datetime_group as ISO 8601 UTC)"""
+    return {field: to_json_value(value) for field, value in row._asdict().items()
+            if field != "idempotency_key"}
+
+
+class StatrepApi:
+    def __init__(self, authenticator=None, references=None):
+        """The API operations, independent of the HTTP plumbing"""
+        self.auth = authenticator or Authenticator()
+        self.references = references or ReferenceLists()
+        # A submit answers 202 after SUBMIT_WAIT_SECONDS instead of holding an
+        # HTTP thread until its insert is done; the client polls the status URL
+        self._submissions = {}   # idempotency key -> (ticket, expiry)
+        self._submissions_lock = threading.Lock()
+        self._callbacks = ThreadPoolExecutor(max_workers=2, thread_name_prefix="statrep-api-done")
+        self.routes = [
+            ("GET", re.compile(r"^/api/v1/health$"), self.health, False),
+            ("POST", re.compile(r"^/api/v1/statreps$"), self.submit, True),
+            ("GET", re.compile(r"^/api/v1/statreps/status/([^/]+)$"), self.submission_status, True),
+            ("POST", re.compile(r"^/api/v1/statreps/batch$"), self.submit_batch, True),
+            ("GET", re.compile(r"^/api/v1/locations/([^/]+)/([^/]+)/latest$"), self.latest_by_location, True),
+            ("GET", re.compile(r"^/api/v1/handles/([^/]+)/statreps$"), self.handle_history, True),
+            ("POST", re.compile(r"^/api/v1/sync$"), self.sync, True),
+            ("GET", re.compile(r"^/api/v1/heatmap$"), self.heatmap_overview, True),
+            ("GET", re.compile(r"^/api/v1/heatmap/([A-Ra-r]{2})$"), self.heatmap_tile, True),
+        ]
+        if memory_diagnostics_enabled():
+            # Per process: with several workers sharing the port, keep one
+            # connection open so the snapshots and the diff hit the same worker
+            self.routes += [
+                ("GET", re.compile(r"^/api/v1/diagnostics/memory$"), self.memory_report, True),
+                ("POST", re.compile(r"^/api/v1/diagnostics/memory/snapshots$"), self.memory_snapshot, True),
+                ("GET", re.compile(r"^/api/v1/diagnostics/memory/diff$"), self.memory_diff, True),
+            ]
+
+    def dispatch(self, method, target, headers, body):
+        """Returns: (status, payload dict, extra headers)"""
+        parts = urlsplit(target)
+        known_path = False
+        for route_method, pattern, handler, needs_auth in self.routes:
+            match = pattern.match(parts.path)
+            if not match:
+                continue
+            known_path = True
+            if route_method != method:
+                continue
+            principal = self.auth.authenticate(headers) if needs_auth else None
+            args = [unquote(group) for group in match.groups()]
+            return handler(principal, *args, query=parse_qs(parts.query), headers=headers, body=body)
+        if known_path:
+            raise ApiError(405, f"{method} not allowed here")
+        raise ApiError(404, "Not found")
+
+    def _json_body(self, body):
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            raise ApiError(400, "Request body must be JSON")
+
+    def health(self, principal, query, headers, body):
+        breakers = {breaker.name: breaker.state for breaker in all_circuit_breakers()}
+        healthy = all(state != "open" for state in breakers.values())
+        payload = {"status": "ok" if healthy else "degraded",
+                   "database": breakers, "queue": get_submission_queue().stats(), "logging": get_log_stats()}
+        return (200 if healthy else 503), payload, {}
+
+    def submit(self, principal, query, headers, body):
+        """One STATREP through the submission queue, same path as the form"""
+        data = self._json_body(body)
+        if isinstance(data, dict) and headers.get("Idempotency-Key"):
+            data.setdefault("idempotency_key", headers["Idempotency-Key"])
+        states, neighborhoods = self.references.locations()
+        try:
+            record = parse_record(data, principal, self.references.handles(), states, neighborhoods)
+        except ValueError as e:
+            raise ApiError(422, str(e))
+
+        def stored(success, result):
+            """On the callback pool once the insert is done, whether or not the client still waits"""
+            if success and principal.kind == "handle":
+                with open_database(HandlesDatabase, "write") as handles_db:
+                    handles_db.update_last_used(principal.name)
+
+        queue = get_submission_queue()
+        accepted, ticket = queue.submit(record, stored, run_callback=self._callbacks.submit)
+        if not accepted:
+            raise ApiError(503, ticket, {"Retry-After": "30"})
+        key = record["idempotency_key"]
+        if not ticket.done.wait(SUBMIT_WAIT_SECONDS):
+            now = time.monotonic()
+            with self._submissions_lock:
+                if len(self._submissions) > MAX_PENDING_STATUS:
+                    self._submissions = {k: entry for k, entry in self._submissions.items() if entry[1] > now}
+                self._submissions[key] = (ticket, now + SUBMISSION_TTL_SECONDS)
+            status_url = f"/api/v1/statreps/status/{quote(key, safe='')}"
+            return 202, {"status": "queued", "idempotency_key": key, "position": queue.position(ticket),
+                         "status_url": status_url}, {"Location": status_url, "Retry-After": "1"}
+        if not ticket.success:
+            # Database error text stays in the log, under this request's correlation id
+            logger.error("STATREP insert failed", extra=log_fields(key=key, error=str(ticket.result)))
+            raise ApiError(500, INSERT_FAILED)
+        return 201, {"status": "stored", "id": ticket.result, "idempotency_key": key}, {}
+
+    def submission_status(self, principal, key, query, headers, body):
+        """Where a 202'd submission is now: queued, stored (with its id) or failed"""
+        with self._submissions_lock:
+            ticket, _ = self._submissions.get(key, (None, None))
+        if ticket is not None:
+            if principal.kind == "handle" and ticket.amcon_handle != principal.name:
+                raise ApiError(404, "Unknown submission")
+            if not ticket.done.is_set():
+                return 200, {"status": "queued", "idempotency_key": key,
+                             "position": get_submission_queue().position(ticket)}, {"Retry-After": "1"}
+            if not ticket.success:
+                logger.error("Queued STATREP insert failed", extra=log_fields(key=key, error=str(ticket.result)))
+                return 200, {"status": "failed", "idempotency_key": key, "error": INSERT_FAILED}, {}
+            return 200, {"status": "stored", "id": ticket.result, "idempotency_key": key}, {}
+        with open_database(StatrepDatabase, "read") as db:
+            # A handle only finds its own submissions, here as on the ticket path
+            statrep_id = db.get_statrep_id_for_key(key, principal.name if principal.kind == "handle" else None)
+        if statrep_id is None:
+            raise ApiError(404, "Unknown submission")
+        return 200, {"status": "stored", "id": statrep_id, "idempotency_key": key}, {}
+
+    def submit_batch(self, principal, query, headers, body):
+        """
+        Many STATREPs in one array insert. Each item gets its own result;
+        invalid items don't stop the rest. Items whose idempotency_key was
+        already stored come back as "duplicate" with the original id.
+        """
+        data = self._json_body(body)
+        items = data.get("statreps") if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            raise ApiError(400, 'Expected a JSON array of STATREPs (or {"statreps": [...]})')
+        if len(items) > MAX_BATCH_SIZE:
+            raise ApiError(413, f"At most {MAX_BATCH_SIZE} STATREPs per batch")
+
+        handles = self.references.handles()
+        states, neighborhoods = self.references.locations()
+        results = [None] * len(items)
+        pending = []   # (item index, record)
+        seen_keys = {}
+        for index, item in enumerate(items):
+            try:
+                record = parse_record(item, principal, handles, states, neighborhoods)
+            except ValueError as e:
+                results[index] = {"status": "rejected", "error": str(e)}
+                continue
+            first = seen_keys.setdefault(record["idempotency_key"], index)
+            if first != index:
+                results[index] = {"status": "duplicate", "of": first, "idempotency_key": record["idempotency_key"]}
+                continue
+            pending.append((index, record))
+
+        if pending:
+            with open_database(StatrepDatabase, "write") as db:
+                success, result = db.insert_statreps_batch([record for _, record in pending])
+                if not success:
+                    logger.error("STATREP batch insert failed", extra=log_fields(count=len(pending), error=result))
+                    raise ApiError(500, INSERT_FAILED)
+                inserted, errors = result
+                failed = dict(errors)
+                for offset, (index, record) in enumerate(pending):
+                    key = record["idempotency_key"]
+                    error = failed.get(offset)
+                    if error is None:
+                        results[index] = {"status": "stored", "idempotency_key": key}
+                        continue
+                    original_id = db.get_statrep_id_for_key(key) if "ORA-00001" in error else None
+                    if original_id is not None:
+                        results[index] = {"status": "duplicate", "id": original_id, "idempotency_key": key}
+                    else:
+                        logger.warning("STATREP rejected by the database", extra=log_fields(key=key, error=error))
+                        results[index] = {"status": "rejected", "error": INSERT_FAILED}
+            if inserted:
+                notify_insert()
+
+        summary = {}
+        for item in results:
+            summary[item["status"]] = summary.get(item["status"], 0) + 1
+        return 200, {"summary": summary, "results": results}, {}
+
+    def latest_by_location(self, principal, state, neighborhood, query, headers, body):
+        """Most recent STATREP per handle at a location (served from the location cache)"""
+        with open_database(StatrepDatabase, "read") as db:
+            success, rows = db.get_latest_statreps_by_location(state, neighborhood)
+        if not success:
+            raise ApiError(503, "Query failed", {"Retry-After": "30"})
+        return 200, {"state": state, "neighborhood": neighborhood,
+                     "statreps": [row_to_json(row) for row in rows]}, {}
+
+    def handle_history(self, principal, handle, query, headers, body):
+        """A handle's STATREPs from the last ?hours= (default one week), newest first"""
+        try:
+            hours = int(query.get("hours", [DEFAULT_HISTORY_HOURS])[0])
+        except ValueError:
+            raise ApiError(400, "hours must be a whole number")
+        if not 0 < hours <= MAX_HISTORY_HOURS:
+            raise ApiError(400, f"hours must be between 1 and {MAX_HISTORY_HOURS}")
+        with open_database(StatrepDatabase, "read") as db:
+            success, rows = db.get_recent_statreps_by_handle(handle, hours)
+        if not success:
+            raise ApiError(503, "Query failed", {"Retry-After": "30"})
+        return 200, {"amcon_handle": handle, "hours": hours,
+                     "statreps": [row_to_json(row) for row in rows]}, {}
+
+    def sync(self, principal, query, headers, body):
+        """
+        Store-and-forward replication from a field node (statrep_sync_v3_prod).
+        Body and reply are deflated sync messages; the node's gateway token
+        name must be its node id.
+        """
+        if principal.kind != "token":
+            raise ApiError(403, "Sync needs a node token")
+        try:
+            message = decode_message(body)
+        except (ValueError, zlib.error):
+            raise ApiError(400, "Body must be a sync message")
+        if not isinstance(message, dict) or message.get("node") != principal.name:
+            raise ApiError(403, f"Token {principal.name} can't sync as {message.get('node') if isinstance(message, dict) else None}")
+        with open_database(StatrepDatabase, "write") as db:
+            try:
+                reply, effects = SyncResponder(SyncStore(db.connection, "oracle", get_node_id())).handle(message)
+            except ValueError as e:
+                raise ApiError(400, str(e))
+        if effects["locations"]:
+            cache = get_location_cache()
+            for key in effects["locations"]:
+                cache.invalidate(key)
+            notify_insert()
+        if effects["handles"]:
+            invalidate_handles_cache()
+        return 200, encode_message(reply), {}
+
+    def heatmap_overview(self, principal, query, headers, body):
+        """A/B/C counts of each handle's latest report, per Maidenhead field"""
+        heatmap = get_condition_heatmap()
+        return self._cached_tile(heatmap.etag(), heatmap.get_overview, headers)
+
+    def heatmap_tile(self, principal, field, query, headers, body):
+        """One field's counts per square and subsquare"""
+        heatmap = get_condition_heatmap()
+        return self._cached_tile(heatmap.etag(field), lambda: heatmap.get_tile(field), headers)
+
+    def _cached_tile(self, etag, render, headers):
+        """Pollers send back the ETag they have; an unchanged tile is a bodiless 304"""
+        tile_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in (tag.strip() for tag in (headers.get("If-None-Match") or "").split(",")):
+            return 304, b"", tile_headers
+        # Rendered after the ETag was read, so a tile is never older than its tag
+        return 200, render(), dict(tile_headers, **{"Content-Type": "application/json"})
+
+    def _diagnostics_principal(self, principal):
+        if principal.kind != "token":
+            raise ApiError(403, "Diagnostics need an API token")
+
+    def _int_arg(self, query, name, default=None):
+        try:
+            return int(query[name][0]) if name in query else default
+        except ValueError:
+            raise ApiError(400, f"{name} must be a whole number")
+
+    def memory_report(self, principal, query, headers, body):
+        """Live sessions with control counts, tracemalloc totals; ?heap=1 also counts every live control"""
+        self._diagnostics_principal(principal)
+        include_heap = query.get("heap", ["0"])[0] in ("1", "true", "yes")
+        return 200, get_memory_diagnostics().report(include_heap), {}
+
+    def memory_snapshot(self, principal, query, headers, body):
+        """Take a tracemalloc snapshot: top allocators and the diff against the previous one"""
+        self._diagnostics_principal(principal)
+        top = self._int_arg(query, "top", DEFAULT_TOP)
+        return 201, get_memory_diagnostics().take_snapshot(top), {}
+
+    def memory_diff(self, principal, query, headers, body):
+        """?from=<id>[&to=<id>][&top=N][&group=traceback] between two kept snapshots"""
+        self._diagnostics_principal(principal)
+        from_id = self._int_arg(query, "from")
+        if from_id is None:
+            raise ApiError(400, "from is required")
+        group_by = query.get("group", ["lineno"])[0]
+        if group_by not in ("lineno", "traceback"):
+            raise ApiError(400, "group must be lineno or traceback")
+        diff = get_memory_diagnostics().diff(from_id, self._int_arg(query, "to"),
+                                             self._int_arg(query, "top", DEFAULT_TOP), group_by)
+        if diff is None:
+            raise ApiError(404, f"Snapshot not kept in this worker (pid {os.getpid()})")
+        return 200, {"from": from_id, "diff": diff}, {}
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive - gateways reuse one connection
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't wait on delayed ACKs
+    server_version = "StatrepAPI/1"
+
+    def _respond(self, status, payload, headers):
+        headers = dict(headers)
+        if isinstance(payload, bytes):   # already encoded (sync messages, heatmap tiles)
+            body, content_type = payload, headers.pop("Content-Type", "application/octet-stream")
+        else:
+            body, content_type = json.dumps(payload, separators=(",", ":")).encode(), "application/json"
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        # One correlation id per request (the caller's X-Request-ID if it sent one)
+        with correlation_context(self.headers.get("X-Request-ID", "")[:64] or None) as request_id:
+            status, payload, headers = self._dispatch(method)
+            headers = dict(headers, **{"X-Request-ID": request_id})
+            self._respond(status, payload, headers)
+
+    def _dispatch(self, method):
+        headers = {}
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+                raise ApiError(413, "Request body too large")
+            body = self.rfile.read(length) if length else b""
+            status, payload, headers = self.server.api.dispatch(method, self.path, self.headers, body)
+        except ApiError as e:
+            status, payload, headers = e.status, {"error": e.message}, e.headers
+        except Exception as e:
+            logger.error("API request failed", extra=log_fields(method=method, path=self.path, error=str(e)))
+            status, payload = 500, {"error": "Internal error"}
+        return status, payload, headers
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def log_message(self, format, *args):
+        logger.debug("API request", extra=log_fields(client=self.address_string(), request=format % args))
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, api=None):
+        self.api = api or StatrepApi()
+        super().__init__(address, ApiRequestHandler)
+
+    def server_bind(self):
+        # Every worker under serve_workers_v3_prod.py binds the same API
+        # port and the kernel spreads connections between them
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def start_api_server(host=None, port=None, api=None):
+    """Serve the API on a background thread of this process. Returns the server."""
+    host = host or os.getenv(API_HOST_ENV, "0.0.0.0")
+    port = int(port if port is not None else os.getenv(API_PORT_ENV, DEFAULT_API_PORT))
+    server = ApiServer((host, port), api)
+    threading.Thread(target=server.serve_forever, name="statrep-api", daemon=True).start()
+    logger.info(f"STATREP API listening on {host}:{server.server_address[1]}")
+    return server
+
+
+def load_test(base_url, path, requests, concurrency, headers=None, body=None):
+    """
+    Drive the API with concurrent keep-alive clients and report throughput
+    and latency percentiles. POST when body is given, otherwise GET.
+    """
+    import http.client
+    from concurrent.futures import ThreadPoolExecutor
+
+    target = urlsplit(base_url)
+    headers = dict(headers or {})
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+    per_client = [requests // concurrency + (1 if n < requests % concurrency else 0) for n in range(concurrency)]
+
+    def client(count):
+        latencies, failures = [], 0
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    conn.request("POST" if body is not None else "GET", path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        failures += 1
+                except (OSError, http.client.HTTPException):
+                    failures += 1
+                    conn.close()
+                latencies.append(time.perf_counter() - started)
+        finally:
+            conn.close()
+        return latencies, failures
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        outcomes = list(executor.map(client, per_client))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for client_latencies, _ in outcomes for latency in client_latencies)
+    failures = sum(failed for _, failed in outcomes)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    stats = {"requests": len(latencies), "failures": failures, "seconds": elapsed,
+             "rate": len(latencies) / elapsed, "p50_ms": percentile(0.50),
+             "p95_ms": percentile(0.95), "p99_ms": percentile(0.99)}
+    print(f"{stats['requests']} requests in {elapsed:.2f}s: {stats['rate']:,.0f} req/s, "
+          f"p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms "
+          f"({failures} failed)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="STATREP JSON API (normally started by the Flet app)")
+    parser.add_argument("--host", default=None, help=f"address to listen on (default ${API_HOST_ENV} or 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=None, help=f"port (default ${API_PORT_ENV} or {DEFAULT_API_PORT})")
+    parser.add_argument("--load-test", metavar="URL", default=None,
+                        help="run a load test against a running API (e.g. http://127.0.0.1:8200) and exit")
+    parser.add_argument("--path", default="/api/v1/health", help="load test request path")
+    parser.add_argument("--body", default=None, help="load test JSON body (POSTs when given)")
+    parser.add_argument("--token", default=None, help="load test API token")
+    parser.add_argument("--handle", default=None, help="load test handle (with --pin)")
+    parser.add_argument("--pin", default=None, help="load test PIN")
+    parser.add_argument("--requests", type=int, default=5000, help="load test request count")
+    parser.add_argument("--concurrency", type=int, default=32, help="load test concurrent clients")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    if args.load_test:
+        headers = {}
+        if args.token:
+            headers["Authorization"] = f"Bearer {args.token}"
+        elif args.handle and args.pin:
+            headers["Authorization"] = "Basic " + b64encode(f"{args.handle}:{args.pin}".encode()).decode()
+        stats = load_test(args.load_test, args.path, args.requests, args.concurrency, headers, args.body)
+        return 0 if stats["failures"] == 0 else 1
+
+    server = start_api_server(args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+import threading
+import logging
+import time
+from collections import OrderedDict
+from statrep_hub_v3_prod import subscribe, publish, TOPIC_LOCATION_CHANGED, TOPIC_IDEMPOTENCY_KEY
+
+logger = logging.getLogger(__name__)
+
+# Bounds for the location result cache
+MAX_CACHED_LOCATIONS = 256
+MAX_CACHED_ROWS = 50000
+
+# How long (and how many) submission idempotency keys are remembered in-process;
+# the unique index on statrep.idempotency_key covers anything older
+IDEMPOTENCY_TTL_SECONDS = 3600
+MAX_IDEMPOTENCY_KEYS = 20000
+
+class LocationResultCache:
+    def __init__(self, max_entries=MAX_CACHED_LOCATIONS, max_rows=MAX_CACHED_ROWS):
+        """
+        Process-wide LRU cache of latest-per-handle results keyed by
+        (state, neighborhood). Each entry carries the version stamp it was
+        loaded at; callers reuse it only while the stamp still matches.
+        """
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # key -> (version, rows)
+        self._total_rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """Return cached rows if the entry exists at this version, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, rows):
+        """Store rows for key at version, evicting least recently used entries"""
+        rows = list(rows)
+        if len(rows) > self.max_rows:
+            return  # too big to be worth holding
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (version, rows)
+            self._total_rows += len(rows)
+            while len(self._entries) > self.max_entries or self._total_rows > self.max_rows:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate(self, key, broadcast=True):
+        """Drop one location (e.g. after an insert there), in every worker process"""
+        with self._lock:
+            self._remove(key)
+        if broadcast:
+            publish(TOPIC_LOCATION_CHANGED, key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_rows = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_rows -= len(entry[1])
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "rows": self._total_rows,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class IdempotencyCache:
+    def __init__(self, ttl=IDEMPOTENCY_TTL_SECONDS, max_entries=MAX_IDEMPOTENCY_KEYS):
+        """
+        Bounded, time-expiring map of submission idempotency key -> STATREP id,
+        so a retried or double-clicked submit gets the original id back
+        without touching the database.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, record_id), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the record id stored for key, or None if unknown or expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            return entry[1] if entry else None
+
+    def put(self, key, record_id, broadcast=True):
+        """Remember key -> record_id here and in every other worker process"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, record_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if broadcast:
+            publish(TOPIC_IDEMPOTENCY_KEY, (key, record_id))
+
+    def _expire(self, now):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_location_cache = LocationResultCache()
+_idempotency_cache = IdempotencyCache()
+
+# Keep this worker's caches in step with inserts made by the others
+subscribe(TOPIC_LOCATION_CHANGED, lambda key: _location_cache.invalidate(tuple(key), broadcast=False))
+subscribe(TOPIC_IDEMPOTENCY_KEY, lambda item: _idempotency_cache.put(item[0], item[1], broadcast=False))
+
+def get_location_cache():
+    """Return the process-wide location result cache"""
+    return _location_cache
+
+def get_idempotency_cache():
+    """Return the process-wide submission dedupe cache"""
+    return _idempotency_cache
@@ -0,0 +1,398 @@
+import argparse
+import base64
+import binascii
+import logging
+import random
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from statrep_db_v3_prod import STATREP_CODES, format_datetime_group
+from maidenhead_v3_prod import normalize_grid
+
+logger = logging.getLogger(__name__)
+
+# Binary batch layout (all integers are LEB128 varints unless noted):
+#   version byte | dictionary hash (4 bytes) | record count | base minute
+#   records...   | CRC-16/CCITT of everything before it (2 bytes)
+# The records section is raw-deflated when that makes it smaller (flag in the version byte).
+# Each record:
+#   flags byte | handle | minute delta (zigzag) | state | neighborhood | location
+#   | status codes (2 bytes, mixed radix) | comments (if flagged)
+# handle/state/neighborhood are dictionary indexes unless flagged as literal text;
+# a location that is exactly a grid square is packed into an integer.
+CODEC_VERSION = 0xA1
+FRAME_DEFLATED = 0x08
+MAX_INFLATED_BYTES = 1024 * 1024
+ARMOR_PREFIX = "SRB/"  # base32 armor - only A-Z, 2-7 and "/", safe for JS8 and voice-grade keyboards
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+FLAG_HANDLE_LITERAL = 0x01
+FLAG_STATE_LITERAL = 0x02
+FLAG_NEIGHBORHOOD_LITERAL = 0x04
+FLAG_COMMENTS = 0x08
+LOCATION_SHIFT = 4  # bits 4-5: 0 = text, 1/2/3 = 4/6/8 character grid square
+
+CONDITION_FIELD = "conditions"
+DETAIL_FIELDS = ("position", "commercial_power", "water", "sanitation", "grid_comms", "transportation")
+RECORD_FIELDS = ("amcon_handle", "datetime_group", "state", "neighborhood", "location",
+                 CONDITION_FIELD) + DETAIL_FIELDS + ("comments",)
+
+class CodecError(ValueError):
+    pass
+
+class CodecDictionary:
+    def __init__(self, handles, states, neighborhoods):
+        """
+        The reference tables both ends index into. Sender and receiver must
+        hold the same lists; the hash in every batch catches a mismatch.
+        """
+        self.handles = sorted(set(handles))
+        self.states = sorted(set(states))
+        self.neighborhoods = sorted(set(neighborhoods))
+        self._handle_index = {value: n for n, value in enumerate(self.handles)}
+        self._state_index = {value: n for n, value in enumerate(self.states)}
+        self._neighborhood_index = {value: n for n, value in enumerate(self.neighborhoods)}
+        joined = "\x1e".join("\x1f".join(values) for values in (self.handles, self.states, self.neighborhoods))
+        self.hash = zlib.crc32(joined.encode("utf-8"))
+
+
+def load_dictionary():
+    """Build the codec dictionary from the handles, states and neighborhoods tables"""
+    # Imported here: the importer pulls in the handles/locations modules
+    from import_statreps_v3_prod import load_reference_lists
+    return CodecDictionary(*load_reference_lists())
+
+
+def _put_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _get_varint(data, pos):
+    result = shift = 0
+    while True:
+        if pos >= len(data):
+            raise CodecError("truncated batch")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise CodecError("varint too long")
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+def _put_text(out, text):
+    raw = text.encode("utf-8")
+    _put_varint(out, len(raw))
+    out += raw
+
+def _get_text(data, pos):
+    length, pos = _get_varint(data, pos)
+    if pos + length > len(data):
+        raise CodecError("truncated batch")
+    try:
+        return data[pos:pos + length].decode("utf-8"), pos + length
+    except UnicodeDecodeError:
+        raise CodecError("bad text field")
+
+
+def pack_codes(record):
+    """Conditions and the six status details as one mixed-radix integer (< 2**15)"""
+    conditions = record.get(CONDITION_FIELD)
+    if conditions not in STATREP_CODES[CONDITION_FIELD]:
+        raise CodecError(f"invalid conditions code {conditions!r}")
+    value = STATREP_CODES[CONDITION_FIELD].index(conditions)
+    for field in DETAIL_FIELDS:
+        code = record.get(field)
+        choices = STATREP_CODES[field]
+        if code is not None and code not in choices:
+            raise CodecError(f"invalid {field} code {code!r}")
+        value = value * (len(choices) + 1) + (0 if code is None else choices.index(code) + 1)
+    return value
+
+def unpack_codes(value):
+    codes = {}
+    for field in reversed(DETAIL_FIELDS):
+        choices = STATREP_CODES[field]
+        value, digit = divmod(value, len(choices) + 1)
+        codes[field] = choices[digit - 1] if digit else None
+    if value >= len(STATREP_CODES[CONDITION_FIELD]):
+        raise CodecError("bad status codes")
+    codes[CONDITION_FIELD] = STATREP_CODES[CONDITION_FIELD][value]
+    return codes
+
+def pack_grid(grid):
+    """A normalized 4/6/8 character grid square as an integer"""
+    value = (ord(grid[0]) - 65) * 18 + ord(grid[1]) - 65
+    value = value * 100 + int(grid[2:4])
+    if len(grid) >= 6:
+        value = (value * 24 + ord(grid[4]) - 97) * 24 + ord(grid[5]) - 97
+    if len(grid) == 8:
+        value = value * 100 + int(grid[6:8])
+    return value
+
+def unpack_grid(value, length):
+    if length == 8:
+        value, extended = divmod(value, 100)
+    if length >= 6:
+        value, lat_sub = divmod(value, 24)
+        value, lon_sub = divmod(value, 24)
+    value, square = divmod(value, 100)
+    if value >= 18 * 18:
+        raise CodecError("bad grid square")
+    grid = chr(65 + value // 18) + chr(65 + value % 18) + f"{square:02d}"
+    if length >= 6:
+        grid += chr(97 + lon_sub) + chr(97 + lat_sub)
+    if length == 8:
+        grid += f"{extended:02d}"
+    return grid
+
+def _minutes(value):
+    if not isinstance(value, datetime) or value.tzinfo is None:
+        raise CodecError("datetime_group must be a timezone-aware datetime")
+    return int((value - EPOCH).total_seconds() // 60)
+
+
+def encode_batch(records, dictionary):
+    """
+    Encode insert_statrep records (dicts) as one compact binary batch.
+    Times keep minute resolution; records stay in the given order.
+    """
+    header = bytearray(struct.pack(">I", dictionary.hash))
+    _put_varint(header, len(records))
+    minutes = [_minutes(record["datetime_group"]) for record in records]
+    previous = max(min(minutes) if minutes else 0, 0)
+    _put_varint(header, previous)
+
+    out = bytearray()
+    for record, minute in zip(records, minutes):
+        flags = 0
+        fields = bytearray()
+        for value, index, flag in ((record["amcon_handle"], dictionary._handle_index, FLAG_HANDLE_LITERAL),
+                                   (record["state"], dictionary._state_index, FLAG_STATE_LITERAL),
+                                   (record["neighborhood"], dictionary._neighborhood_index,
+                                    FLAG_NEIGHBORHOOD_LITERAL)):
+            position = index.get(value)
+            if position is None:
+                flags |= flag
+                _put_text(fields, value)
+            else:
+                _put_varint(fields, position)
+            if flag == FLAG_HANDLE_LITERAL:
+                # time delta sits right after the handle
+                _put_varint(fields, _zigzag(minute - previous))
+                previous = minute
+
+        location = record.get("location") or ""
+        if len(location) in (4, 6, 8) and normalize_grid(location) == location:
+            flags |= {4: 1, 6: 2, 8: 3}[len(location)] << LOCATION_SHIFT
+            _put_varint(fields, pack_grid(location))
+        else:
+            _put_text(fields, location)
+
+        fields += struct.pack(">H", pack_codes(record))
+        if record.get("comments"):
+            flags |= FLAG_COMMENTS
+            _put_text(fields, record["comments"])
+
+        out.append(flags)
+        out += fields
+
+    version = CODEC_VERSION
+    deflater = zlib.compressobj(9, zlib.DEFLATED, -15)
+    deflated = deflater.compress(bytes(out)) + deflater.flush()
+    if len(deflated) < len(out):
+        version |= FRAME_DEFLATED
+        out = deflated
+    frame = bytes([version]) + header + out
+    return frame + struct.pack(">H", binascii.crc_hqx(frame, 0xFFFF))
+
+def decode_batch(data, dictionary):
+    """
+    Decode a batch from encode_batch back into insert_statrep records.
+    Raises CodecError on a bad checksum, a dictionary mismatch or corrupt data.
+    """
+    data = bytes(data)
+    if len(data) < 9:
+        raise CodecError("truncated batch")
+    if binascii.crc_hqx(data[:-2], 0xFFFF) != struct.unpack(">H", data[-2:])[0]:
+        raise CodecError("checksum mismatch - batch damaged in transit")
+    if data[0] & ~FRAME_DEFLATED != CODEC_VERSION:
+        raise CodecError(f"unsupported codec version {data[0]:#x}")
+    if struct.unpack(">I", data[1:5])[0] != dictionary.hash:
+        raise CodecError("reference tables differ from the sender's - resync handles and locations")
+
+    count, pos = _get_varint(data, 5)
+    previous, pos = _get_varint(data, pos)
+    body = data[pos:-2]
+    pos = 0
+    if data[0] & FRAME_DEFLATED:
+        inflater = zlib.decompressobj(-15)
+        try:
+            body = inflater.decompress(body, MAX_INFLATED_BYTES)
+        except zlib.error:
+            raise CodecError("bad compressed records")
+        if inflater.unconsumed_tail or not inflater.eof:
+            raise CodecError("compressed records too large or incomplete")
+    lists = ((dictionary.handles, FLAG_HANDLE_LITERAL, "amcon_handle"),
+             (dictionary.states, FLAG_STATE_LITERAL, "state"),
+             (dictionary.neighborhoods, FLAG_NEIGHBORHOOD_LITERAL, "neighborhood"))
+    records = []
+    for _ in range(count):
+        if pos >= len(body):
+            raise CodecError("truncated batch")
+        flags = body[pos]
+        pos += 1
+        record = {}
+        for values, flag, field in lists:
+            if flags & flag:
+                record[field], pos = _get_text(body, pos)
+            else:
+                index, pos = _get_varint(body, pos)
+                if index >= len(values):
+                    raise CodecError(f"unknown {field} index {index}")
+                record[field] = values[index]
+            if flag == FLAG_HANDLE_LITERAL:
+                delta, pos = _get_varint(body, pos)
+                previous += _unzigzag(delta)
+                record["datetime_group"] = EPOCH + timedelta(minutes=previous)
+
+        grid_kind = (flags >> LOCATION_SHIFT) & 0x03
+        if grid_kind:
+            value, pos = _get_varint(body, pos)
+            record["location"] = unpack_grid(value, (0, 4, 6, 8)[grid_kind])
+        else:
+            record["location"], pos = _get_text(body, pos)
+
+        if pos + 2 > len(body):
+            raise CodecError("truncated batch")
+        record.update(unpack_codes(struct.unpack(">H", body[pos:pos + 2])[0]))
+        pos += 2
+        record["comments"] = None
+        if flags & FLAG_COMMENTS:
+            record["comments"], pos = _get_text(body, pos)
+        records.append({field: record[field] for field in RECORD_FIELDS})
+    if pos != len(body):
+        raise CodecError("trailing bytes after the last record")
+    return records
+
+def encode_record(record, dictionary):
+    return encode_batch([record], dictionary)
+
+def decode_record(data, dictionary):
+    records = decode_batch(data, dictionary)
+    if len(records) != 1:
+        raise CodecError(f"expected one record, got {len(records)}")
+    return records[0]
+
+def armor(data):
+    """Binary batch as text for text-only links (base32, no padding)"""
+    return ARMOR_PREFIX + base64.b32encode(data).decode("ascii").rstrip("=")
+
+def dearmor(text):
+    text = "".join(text.split()).upper()
+    if not text.startswith(ARMOR_PREFIX):
+        raise CodecError(f"armored batch must start with {ARMOR_PREFIX}")
+    payload = text[len(ARMOR_PREFIX):]
+    try:
+        return base64.b32decode(payload + "=" * (-len(payload) % 8))
+    except binascii.Error:
+        raise CodecError("bad armor characters")
+
+
+def to_compact_text(record):
+    """The importer's one-line "STATREP/..." form - the plain-text baseline"""
+    codes = "".join(record.get(field) or "-" for field in DETAIL_FIELDS)
+    return (f"STATREP/{record['amcon_handle']}/{format_datetime_group(record['datetime_group'])}/"
+            f"{record['state']}/{record['neighborhood']}/{record['location']}/{record['conditions']}/{codes}"
+            + (f"/{record['comments']}" if record.get("comments") else ""))
+
+def sample_records(count, dictionary, seed=42):
+    """Synthetic reports shaped like real traffic: one net's check-ins over a few hours"""
+    rng = random.Random(seed)
+    start = datetime(2025, 7, 4, 13, 0, tzinfo=timezone.utc)
+    comments = ("bridge on CR 12 out", "boil water notice", "power back 1400", "roads clear",
+                "tree down on Main St", "shelter open at school")
+    records = []
+    for n in range(count):
+        conditions = rng.choice("AABC")
+        record = {
+            "amcon_handle": rng.choice(dictionary.handles),
+            "datetime_group": start + timedelta(minutes=n // 3 + rng.randint(0, 5)),
+            "state": rng.choice(dictionary.states),
+            "neighborhood": rng.choice(dictionary.neighborhoods),
+            "location": rng.choice(("EM12ab", "EM12", "FN20xb47", "Main St shelter, EM10")),
+            "conditions": conditions,
+            "comments": rng.choice(comments) if rng.random() < 0.4 else None,
+        }
+        for field in DETAIL_FIELDS:
+            record[field] = rng.choice(STATREP_CODES[field]) if conditions != "A" else None
+        records.append(record)
+    return records
+
+def _sample_dictionary():
+    return CodecDictionary([f"N{i}CALL" for i in range(5000)], [f"State {i}" for i in range(56)],
+                           [f"Neighborhood {i}" for i in range(500)])
+
+def benchmark(count=10000, batch_size=20):
+    """Size against plain text and encode/decode speed, in batches like a net relay would send"""
+    dictionary = _sample_dictionary()
+    records = sample_records(count, dictionary)
+    batches = [records[n:n + batch_size] for n in range(0, count, batch_size)]
+
+    text = "\n".join(to_compact_text(record) for record in records).encode("utf-8")
+    text_zlib = sum(len(zlib.compress("\n".join(to_compact_text(r) for r in batch).encode(), 9))
+                    for batch in batches)
+    started = time.perf_counter()
+    encoded = [encode_batch(batch, dictionary) for batch in batches]
+    encode_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for data in encoded:
+        decode_batch(data, dictionary)
+    decode_seconds = time.perf_counter() - started
+    binary = sum(len(data) for data in encoded)
+    armored = sum(len(armor(data)) for data in encoded)
+    single = sum(len(encode_record(record, dictionary)) for record in records[:1000]) / min(count, 1000)
+
+    print(f"{count} records in batches of {batch_size}:")
+    for label, size in (("compact text", len(text)), ("compact text + zlib", text_zlib),
+                        ("binary", binary), ("binary, base32 armor", armored)):
+        print(f"  {label:22s} {size:>9,} bytes  {size / count:6.1f} B/report  {len(text) / size:5.2f}x smaller")
+    print(f"  single-report frame    {single:6.1f} B/report")
+    print(f"  encode {count / encode_seconds:,.0f} reports/s, decode {count / decode_seconds:,.0f} reports/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact STATREP codec for low-bandwidth radio links")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="size/speed comparison on N synthetic reports")
+    parser.add_argument("--batch-size", type=int, default=20, help="reports per batch for --benchmark")
+    parser.add_argument("--decode", metavar="TEXT", help="decode an armored batch using the database reference tables")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.batch_size)
+    if args.decode:
+        try:
+            records = decode_batch(dearmor(args.decode), load_dictionary())
+        except CodecError as e:
+            print(f"✗ {e}")
+            return 1
+        for record in records:
+            print(to_compact_text(record))
+    if not (args.benchmark or args.decode):
+        parser.error("nothing to do (use --benchmark N or --decode TEXT)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
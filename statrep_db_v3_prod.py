@@ -1,160 +1,727 @@
 import oracledb
+import functools
+import inspect
 import logging
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from statrep_cache_v3_prod import get_location_cache, get_idempotency_cache
+from maidenhead_v3_prod import find_grid, grid_to_latlon
+from db_resilience_v3_prod import ResilientConnectionMixin
+from db_config_v3_prod import get_settings, acquire_connection, read_replica_configured, get_recent_writes
+from statrep_logging_v3_prod import log_fields
 
-# Configure logging for server-side debugging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-class StatrepDatabase:
-    def __init__(self):
-        """Initialize the Oracle database connection"""
-        # Oracle connection details (hardcoded for now - will refactor later)
-        self.connection_string = '''(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1521)(host=adb.us-phoenix-1.oraclecloud.com))(connect_data=(service_name=g5cdaf2f9aabdbb_yeiublpmhgwxw343_low.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))'''
-        self.user = "MAILMAN"
-        self.password = "$Tms320c52password!"
+# datetime_group is TIMESTAMP WITH TIME ZONE, always stored with a +00:00 offset
+# (named regions can't be fetched in thin mode), so reads come back as naive UTC
+DATETIME_GROUP_FORMAT = "%Y-%m-%d %H:%M"
+
+# Allowed single-letter codes for each STATREP field (same choices as the form)
+STATREP_CODES = {
+    "conditions": ("A", "B", "C"),
+    "position": ("H", "M", "P"),
+    "commercial_power": ("Y", "I", "N"),
+    "water": ("Y", "C", "N"),
+    "sanitation": ("Y", "N"),
+    "grid_comms": ("Y", "N"),
+    "transportation": ("Y", "N"),
+}
+
+# Named row type for STATREP reads; columns a query doesn't select are None
+STATREP_FIELDS = (
+    "id", "amcon_handle", "datetime_group", "state", "neighborhood", "location", "conditions",
+    "position", "commercial_power", "water", "sanitation", "grid_comms", "transportation", "comments",
+    "grid_square", "latitude", "longitude", "idempotency_key", "origin", "origin_id",
+)
+StatrepRow = namedtuple("StatrepRow", STATREP_FIELDS, defaults=(None,) * len(STATREP_FIELDS))
+
+# Projections for the callers that don't need every column
+PREFILL_FIELDS = ("datetime_group", "state", "neighborhood", "location")
+DISPLAY_FIELDS = STATREP_FIELDS[1:]  # the location view shows everything but the id
+
+def select_list(fields, alias=None):
+    """Build an explicit column list, e.g. "s.id, s.amcon_handle" """
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + field for field in fields)
+
+STATREP_COLUMNS = select_list(STATREP_FIELDS)
+
+def latest_by_location_sql(dialect, fields):
+    """
+    Each handle's latest report at (:1 state, :2 neighborhood) - exactly one
+    row per handle, a datetime_group tie going to the higher id - newest first.
+    Oracle reads the location's rows once: one GROUP BY, every column taken
+    from the same row with KEEP (DENSE_RANK LAST). SQLite has no KEEP; the
+    stand-in ranks ids with ROW_NUMBER and then reads the winners by id.
+    """
+    if dialect == "oracle":
+        latest = "KEEP (DENSE_RANK LAST ORDER BY datetime_group, id)"
+        columns = ", ".join(field if field == "amcon_handle" else f"MAX({field}) {latest} AS {field}"
+                            for field in fields)
+        return f"""SELECT {columns} FROM statrep
+                   WHERE state = :1 AND neighborhood = :2
+                   GROUP BY amcon_handle
+                   ORDER BY MAX(datetime_group) DESC, MAX(id) {latest} DESC"""
+    return f"""SELECT {select_list(fields)} FROM statrep
+               WHERE id IN (
+                   SELECT id FROM (
+                       SELECT id, ROW_NUMBER() OVER (PARTITION BY amcon_handle
+                                                     ORDER BY datetime_group DESC, id DESC) AS rn
+                       FROM statrep
+                       WHERE state = :1 AND neighborhood = :2
+                   )
+                   WHERE rn = 1
+               )
+               ORDER BY datetime_group DESC, id DESC"""
+
+def locate_grid(location):
+    """
+    Pull a Maidenhead grid square out of the free-text location field.
+    Returns: (grid_square, latitude, longitude) - all None if there is no grid
+    """
+    grid = find_grid(location)
+    if grid is None:
+        return None, None, None
+    lat, lon = grid_to_latlon(grid)
+    return grid, round(lat, 5), round(lon, 5)
+
+def get_central_tz():
+    """Get the US Central timezone (falls back to a fixed UTC-6 without tzdata)"""
+    try:
+        return ZoneInfo("America/Chicago")
+    except Exception as e:
+        logger.warning(f"Could not use zoneinfo, falling back to UTC-6: {e}")
+        return timezone(timedelta(hours=-6))
+
+def parse_datetime_group(value):
+    """
+    Parse a "YYYY-MM-DD HH:MM" string entered in US Central time
+    into an aware datetime. Raises ValueError on bad input.
+    """
+    naive = datetime.strptime(value.strip(), DATETIME_GROUP_FORMAT)
+    return naive.replace(tzinfo=get_central_tz())
+
+def to_db_timestamp(value):
+    """Convert an aware datetime to the naive UTC value bound into FROM_TZ(..., '+00:00')"""
+    if not isinstance(value, datetime) or value.tzinfo is None:
+        raise ValueError("datetime_group must be a timezone-aware datetime")
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def format_datetime_group(value):
+    """Render a fetched datetime_group (naive UTC) as US Central "YYYY-MM-DD HH:MM" """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(get_central_tz()).strftime(DATETIME_GROUP_FORMAT)
+    return str(value) if value is not None else ""
+
+def routed_read(method):
+    """
+    Run a read-only method on the read replica when one is configured,
+    except for reads about a handle or location (amcon_handle, or state
+    and neighborhood arguments) written in the last few seconds - those
+    stay on the primary so a submitter always sees their own report.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        replica = self._replica_for(signature.bind(self, *args, **kwargs).arguments)
+        return method(replica if replica is not None else self, *args, **kwargs)
+    return wrapper
+
+class StatrepDatabase(ResilientConnectionMixin):
+    def __init__(self, role="write"):
+        """Initialize the Oracle database connection ("write" = primary, "read" = read-only service)"""
+        # Connection details come from db_config_v3_prod (environment, with the
+        # original production values as defaults)
+        self.role = role
+        settings = get_settings(role)
+        self.connection_string = settings.dsn
+        self.user = settings.user
+        self.password = settings.password
         self.connection = None
         self.cursor = None
+        self._replica = None
         
+    @property
+    def dialect(self):
+        """"sqlite" on a local stand-in connection, otherwise "oracle" """
+        return getattr(self.connection, "dialect", "oracle")
+    
     def connect(self):
         """Connect to the Oracle database"""
         try:
-            self.connection = oracledb.connect(
-                user=self.user,
-                password=self.password,
-                dsn=self.connection_string
-            )
+            self.connection = acquire_connection(self.role)
             self.cursor = self.connection.cursor()
-            logger.info("Connected to Oracle database (STATREP)")
+            logger.info("Connected to Oracle database", extra=log_fields(database="STATREP"))
             return True, None
         except Exception as e:
             error_msg = f"Database connection failed: {str(e)}"
             logger.error(error_msg)
             return False, error_msg
     
+    def _replica_for(self, arguments):
+        """The read-role database to send a routed read to, or None to stay here"""
+        if self.role != "write" or not read_replica_configured():
+            return None
+        keys = []
+        if arguments.get("amcon_handle"):
+            keys.append(("handle", arguments["amcon_handle"]))
+        if arguments.get("state") and arguments.get("neighborhood"):
+            keys.append(("location", arguments["state"], arguments["neighborhood"]))
+        if keys and get_recent_writes().any_recent(*keys):
+            return None
+        
+        if self._replica is None:
+            replica = StatrepDatabase(role="read")
+            success, _ = replica.connect()
+            if not success:
+                return None  # primary can still answer
+            self._replica = replica
+        if self._replica.breaker.state == "open":
+            return None
+        return self._replica
+    
+    def _fetch(self, fields=STATREP_FIELDS, one=False):
+        """Fetch the executed query's rows as StatrepRow tuples"""
+        if tuple(fields) == STATREP_FIELDS:
+            self.cursor.rowfactory = StatrepRow
+        else:
+            self.cursor.rowfactory = lambda *values: StatrepRow(**dict(zip(fields, values)))
+        try:
+            return self.cursor.fetchone() if one else self.cursor.fetchall()
+        finally:
+            self.cursor.rowfactory = None
+    
     def insert_statrep(self, amcon_handle, datetime_group, state, neighborhood, location, conditions,
                        position=None, commercial_power=None, water=None,
                        sanitation=None, grid_comms=None, transportation=None,
-                       comments=None):
+                       comments=None, idempotency_key=None):
         """
         Insert a new STATREP record
+        datetime_group must be a timezone-aware datetime (see parse_datetime_group)
+        idempotency_key (one per form submission) makes retries safe: a key that
+        was already used returns the original record id without a second row
         Returns: (success: bool, result: record_id or error_message)
         """
+        if idempotency_key:
+            record_id = get_idempotency_cache().get(idempotency_key)
+            if record_id is not None:
+                logger.info("Duplicate submission", extra=log_fields(key=idempotency_key, id=record_id))
+                return True, record_id
         
         # Use RETURNING clause to get the generated ID
         insert_sql_with_return = """
         INSERT INTO statrep (
             amcon_handle, datetime_group, state, neighborhood, location, conditions,
             position, commercial_power, water, sanitation,
-            grid_comms, transportation, comments
-        ) VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9, :10, :11, :12, :13)
-        RETURNING id INTO :14
+            grid_comms, transportation, comments,
+            grid_square, latitude, longitude, idempotency_key
+        ) VALUES (:1, FROM_TZ(CAST(:2 AS TIMESTAMP), '+00:00'), :3, :4, :5, :6, :7, :8, :9, :10, :11, :12, :13,
+                  :14, :15, :16, :17)
+        RETURNING id INTO :18
         """
         
         try:
+            # Bind the timestamp as UTC, never as a string the DB has to guess at
+            utc_datetime = to_db_timestamp(datetime_group)
+            grid_square, latitude, longitude = locate_grid(location)
+            
             # Create output variable for the returned ID
             id_var = self.cursor.var(int)
             
             self.cursor.execute(insert_sql_with_return, (
-                amcon_handle, datetime_group, state, neighborhood, location, conditions,
+                amcon_handle, utc_datetime, state, neighborhood, location, conditions,
                 position, commercial_power, water, sanitation,
                 grid_comms, transportation, comments,
+                grid_square, latitude, longitude, idempotency_key,
                 id_var
             ))
             self.connection.commit()
             
             record_id = id_var.getvalue()[0]
-            logger.info(f"STATREP inserted - ID: {record_id}, Handle: {amcon_handle}")
+            get_recent_writes().note(("handle", amcon_handle), ("location", state, neighborhood))
+            get_location_cache().invalidate((state, neighborhood))
+            if idempotency_key:
+                get_idempotency_cache().put(idempotency_key, record_id)
+            logger.info("STATREP inserted", extra=log_fields(id=record_id, handle=amcon_handle))
             return True, record_id
             
+        except oracledb.IntegrityError as e:
+            self.connection.rollback()
+            if idempotency_key and "ORA-00001" in str(e):
+                # Another worker or an earlier attempt already stored this submission
+                record_id = self.get_statrep_id_for_key(idempotency_key)
+                if record_id is not None:
+                    get_idempotency_cache().put(idempotency_key, record_id)
+                    logger.info("Duplicate submission", extra=log_fields(key=idempotency_key, id=record_id))
+                    return True, record_id
+            error_msg = f"Insert failed: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
         except Exception as e:
             error_msg = f"Insert failed: {str(e)}"
             logger.error(error_msg)
             self.connection.rollback()
             return False, error_msg
     
-    def get_all_statreps(self, limit=None):
-        """Retrieve all STATREP records, optionally limited"""
+    def get_statrep_id_for_key(self, idempotency_key, amcon_handle=None):
+        """
+        Return the id of the STATREP stored under an idempotency key, or None.
+        With amcon_handle, only a STATREP from that handle counts.
+        """
         try:
+            if amcon_handle is None:
+                self.cursor.execute(
+                    "SELECT id FROM statrep WHERE idempotency_key = :1",
+                    (idempotency_key,)
+                )
+            else:
+                self.cursor.execute(
+                    "SELECT id FROM statrep WHERE idempotency_key = :1 AND amcon_handle = :2",
+                    (idempotency_key, amcon_handle)
+                )
+            row = self.cursor.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Idempotency key lookup failed: {str(e)}")
+            return None
+    
+    def insert_statreps_batch(self, records):
+        """
+        Insert many STATREPs in one round trip and one commit.
+        records: list of dicts with the insert_statrep keyword arguments.
+        Rows the database rejects are skipped, not fatal to the batch; a
+        reused idempotency_key is rejected with ORA-00001.
+        Returns: (success: bool, result: (inserted_count, [(index, error), ...]) or error_message)
+        """
+        insert_sql = """
+        INSERT INTO statrep (
+            amcon_handle, datetime_group, state, neighborhood, location, conditions,
+            position, commercial_power, water, sanitation,
+            grid_comms, transportation, comments,
+            grid_square, latitude, longitude, idempotency_key
+        ) VALUES (
+            :amcon_handle, FROM_TZ(CAST(:datetime_group AS TIMESTAMP), '+00:00'), :state, :neighborhood,
+            :location, :conditions, :position, :commercial_power, :water, :sanitation,
+            :grid_comms, :transportation, :comments,
+            :grid_square, :latitude, :longitude, :idempotency_key
+        )
+        """
+        if not records:
+            return True, (0, [])
+        
+        fields = ("amcon_handle", "datetime_group", "state", "neighborhood", "location", "conditions",
+                  "position", "commercial_power", "water", "sanitation", "grid_comms",
+                  "transportation", "comments", "idempotency_key")
+        try:
+            rows = []
+            for record in records:
+                row = {field: record.get(field) for field in fields}
+                row["datetime_group"] = to_db_timestamp(record["datetime_group"])
+                row["grid_square"], row["latitude"], row["longitude"] = locate_grid(record.get("location"))
+                rows.append(row)
+            
+            self.cursor.executemany(insert_sql, rows, batcherrors=True)
+            errors = [(err.offset, err.message) for err in self.cursor.getbatcherrors()]
+            self.connection.commit()
+            
+            cache = get_location_cache()
+            for key in {(row["state"], row["neighborhood"]) for row in rows}:
+                get_recent_writes().note(("location", *key))
+                cache.invalidate(key)
+            get_recent_writes().note(*{("handle", row["amcon_handle"]) for row in rows})
+            
+            inserted = len(rows) - len(errors)
+            logger.info("Batch inserted STATREPs", extra=log_fields(inserted=inserted, rejected=len(errors)))
+            return True, (inserted, errors)
+        except Exception as e:
+            error_msg = f"Batch insert failed: {str(e)}"
+            logger.error(error_msg)
+            self.connection.rollback()
+            return False, error_msg
+    
+    @routed_read
+    def get_all_statreps(self, limit=None, include_archive=False):
+        """
+        Retrieve all STATREP records, optionally limited.
+        include_archive=True also reads reports moved to statrep_archive.
+        """
+        try:
+            if include_archive:
+                source = f"(SELECT {STATREP_COLUMNS} FROM statrep UNION ALL SELECT {STATREP_COLUMNS} FROM statrep_archive)"
+            else:
+                source = "statrep"
+            
             if limit:
-                query = f"SELECT * FROM statrep ORDER BY datetime_group DESC FETCH FIRST {limit} ROWS ONLY"
+                query = f"SELECT {STATREP_COLUMNS} FROM {source} ORDER BY datetime_group DESC FETCH FIRST {int(limit)} ROWS ONLY"
             else:
-                query = "SELECT * FROM statrep ORDER BY datetime_group DESC"
+                query = f"SELECT {STATREP_COLUMNS} FROM {source} ORDER BY datetime_group DESC"
             
             self.cursor.execute(query)
-            return True, self.cursor.fetchall()
+            return True, self._fetch()
         except Exception as e:
             logger.error(f"Query failed: {str(e)}")
             return False, str(e)
     
-    def get_statrep_by_handle(self, amcon_handle):
-        """Retrieve all STATREPs for a specific handle"""
+    @routed_read
+    def get_statrep_by_handle(self, amcon_handle, include_archive=False):
+        """
+        Retrieve all STATREPs for a specific handle.
+        include_archive=True also reads reports moved to statrep_archive.
+        """
         try:
-            self.cursor.execute(
-                "SELECT * FROM statrep WHERE amcon_handle = :1 ORDER BY datetime_group DESC",
-                (amcon_handle,)
-            )
-            return True, self.cursor.fetchall()
+            if include_archive:
+                self.cursor.execute(
+                    f"""SELECT {STATREP_COLUMNS} FROM (
+                           SELECT {STATREP_COLUMNS} FROM statrep WHERE amcon_handle = :1
+                           UNION ALL
+                           SELECT {STATREP_COLUMNS} FROM statrep_archive WHERE amcon_handle = :2
+                       ) ORDER BY datetime_group DESC""",
+                    (amcon_handle, amcon_handle)
+                )
+            else:
+                self.cursor.execute(
+                    f"SELECT {STATREP_COLUMNS} FROM statrep WHERE amcon_handle = :1 ORDER BY datetime_group DESC",
+                    (amcon_handle,)
+                )
+            return True, self._fetch()
         except Exception as e:
             logger.error(f"Query failed: {str(e)}")
             return False, str(e)
     
+    @routed_read
     def get_last_statrep_for_handle(self, amcon_handle):
         """Get the most recent STATREP for a handle"""
         try:
             self.cursor.execute(
-                """SELECT * FROM statrep 
+                f"""SELECT {STATREP_COLUMNS} FROM statrep 
                    WHERE amcon_handle = :1 
-                   ORDER BY datetime_group DESC 
+                   ORDER BY datetime_group DESC, id DESC
                    FETCH FIRST 1 ROW ONLY""",
                 (amcon_handle,)
             )
-            result = self.cursor.fetchone()
+            result = self._fetch(one=True)
             return True, result
         except Exception as e:
             logger.error(f"Query failed: {str(e)}")
             return False, str(e)
     
-    def get_latest_statreps_by_location(self, state, neighborhood):
+    @routed_read
+    def get_last_location_for_handle(self, amcon_handle):
+        """
+        Get datetime_group, state, neighborhood and location of a handle's
+        most recent STATREP (login pre-fill) - skips comments and the rest
+        """
+        try:
+            self.cursor.execute(
+                f"""SELECT {select_list(PREFILL_FIELDS)} FROM statrep
+                   WHERE amcon_handle = :1
+                   ORDER BY datetime_group DESC, id DESC
+                   FETCH FIRST 1 ROW ONLY""",
+                (amcon_handle,)
+            )
+            return True, self._fetch(PREFILL_FIELDS, one=True)
+        except Exception as e:
+            logger.error(f"Query failed: {str(e)}")
+            return False, str(e)
+    
+    def get_statreps_since(self, last_id, limit=500):
+        """
+        Get STATREPs with an id greater than last_id, oldest first.
+        Used by the change feed to read only new rows past its watermark.
+        """
+        try:
+            self.cursor.execute(
+                f"""SELECT {STATREP_COLUMNS} FROM statrep
+                   WHERE id > :1
+                   ORDER BY id
+                   FETCH FIRST :2 ROWS ONLY""",
+                (last_id, limit)
+            )
+            return True, self._fetch()
+        except Exception as e:
+            logger.error(f"Query failed: {str(e)}")
+            return False, str(e)
+    
+    def get_max_statrep_id(self):
+        """Get the highest STATREP id (0 if the table is empty)"""
+        try:
+            self.cursor.execute("SELECT NVL(MAX(id), 0) FROM statrep")
+            return True, self.cursor.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Query failed: {str(e)}")
+            return False, str(e)
+    
+    @routed_read
+    def iter_statreps(self, after_id=0, since=None, until=None, state=None, amcon_handle=None,
+                      include_archive=False, batch_size=1000):
+        """
+        Stream STATREPs in id order without loading them all into memory.
+        since/until are aware datetimes. Yields (column_names, row) one row at a time.
+        Raises on database errors (callers handle resume).
+        """
+        conditions = ["id > :after_id"]
+        binds = {"after_id": after_id}
+        if since is not None:
+            conditions.append("datetime_group >= FROM_TZ(CAST(:since AS TIMESTAMP), '+00:00')")
+            binds["since"] = to_db_timestamp(since)
+        if until is not None:
+            conditions.append("datetime_group < FROM_TZ(CAST(:until AS TIMESTAMP), '+00:00')")
+            binds["until"] = to_db_timestamp(until)
+        if state is not None:
+            conditions.append("state = :state")
+            binds["state"] = state
+        if amcon_handle is not None:
+            conditions.append("amcon_handle = :amcon_handle")
+            binds["amcon_handle"] = amcon_handle
+        
+        where = " AND ".join(conditions)
+        if include_archive:
+            query = f"""SELECT {STATREP_COLUMNS} FROM (
+                            SELECT {STATREP_COLUMNS} FROM statrep WHERE {where}
+                            UNION ALL
+                            SELECT {STATREP_COLUMNS} FROM statrep_archive WHERE {where}
+                        ) ORDER BY id"""
+        else:
+            query = f"SELECT {STATREP_COLUMNS} FROM statrep WHERE {where} ORDER BY id"
+        
+        # Own cursor so the stream doesn't clobber self.cursor; rows are
+        # fetched from the server batch_size at a time
+        self._ensure_ready()
+        cursor = self.connection.cursor()
+        try:
+            cursor.arraysize = batch_size
+            cursor.prefetchrows = batch_size
+            cursor.execute(query, binds)
+            columns = [d[0].lower() for d in cursor.description]
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                for row in rows:
+                    yield columns, row
+        finally:
+            cursor.close()
+    
+    @routed_read
+    def iter_latest_statreps(self, batch_size=1000):
+        """
+        Stream each handle's most recent STATREP (hot table), in handle order,
+        as StatrepRows fetched batch_size at a time.
+        Raises on database errors.
+        """
+        query = f"""SELECT {STATREP_COLUMNS} FROM (
+                        SELECT {STATREP_COLUMNS},
+                               ROW_NUMBER() OVER (PARTITION BY amcon_handle
+                                                  ORDER BY datetime_group DESC, id DESC) AS rn
+                        FROM statrep
+                    )
+                    WHERE rn = 1
+                    ORDER BY amcon_handle"""
+        self._ensure_ready()
+        cursor = self.connection.cursor()
+        try:
+            cursor.arraysize = batch_size
+            cursor.prefetchrows = batch_size
+            cursor.execute(query)
+            cursor.rowfactory = StatrepRow
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+    
+    def get_location_version(self, state, neighborhood):
+        """
+        Cheap version stamp for a location: (max id, row count), read from the
+        (state, neighborhood, id) index. Changes on any insert, archive or purge.
+        An UPDATE leaves it as is - code here that edits rows in place invalidates
+        the location itself (see backfill_grid_squares); after a manual edit, read
+        with use_cache=False or restart the workers.
+        """
+        try:
+            self.cursor.execute(
+                """SELECT NVL(MAX(id), 0), COUNT(*) FROM statrep
+                   WHERE state = :1 AND neighborhood = :2""",
+                (state, neighborhood)
+            )
+            return True, tuple(self.cursor.fetchone())
+        except Exception as e:
+            logger.error(f"Query failed: {str(e)}")
+            return False, str(e)
+    
+    @routed_read
+    def get_latest_statreps_by_location(self, state, neighborhood, use_cache=True):
         """
         Get the most recent STATREP for each handle in the given state/neighborhood.
-        Returns list of tuples with most recent report per handle.
-        """
-        try:
-            # Query to get the most recent STATREP for each handle in the location
-            query = """
-                SELECT s.*
-                FROM statrep s
-                INNER JOIN (
-                    SELECT amcon_handle, MAX(datetime_group) as max_datetime
-                    FROM statrep
-                    WHERE state = :1 AND neighborhood = :2
-                    GROUP BY amcon_handle
-                ) latest
-                ON s.amcon_handle = latest.amcon_handle 
-                AND s.datetime_group = latest.max_datetime
-                WHERE s.state = :3 AND s.neighborhood = :4
-                ORDER BY s.datetime_group DESC
-            """
+        Returns list of tuples with most recent report per handle (exactly one -
+        two reports with the same datetime_group go to the later id), newest first.
+        With use_cache, results are reused while the location's version stamp is unchanged.
+        """
+        cache = get_location_cache()
+        key = (state, neighborhood)
+        version = None
+        if use_cache:
+            success, version = self.get_location_version(state, neighborhood)
+            if success:
+                cached = cache.get(key, version)
+                if cached is not None:
+                    logger.info("Reused cached STATREPs", extra=log_fields(count=len(cached), state=state, neighborhood=neighborhood))
+                    return True, list(cached)
+            else:
+                version = None
+        
+        try:
+            query = latest_by_location_sql(self.dialect, DISPLAY_FIELDS)
             
-            self.cursor.execute(query, (state, neighborhood, state, neighborhood))
-            results = self.cursor.fetchall()
-            logger.info(f"Retrieved {len(results)} latest STATREPs for {state}/{neighborhood}")
+            self.cursor.execute(query, (state, neighborhood))
+            results = self._fetch(DISPLAY_FIELDS)
+            if version is not None:
+                cache.put(key, version, results)
+            logger.info("Retrieved latest STATREPs", extra=log_fields(count=len(results), state=state, neighborhood=neighborhood))
             return True, results
         except Exception as e:
             logger.error(f"Query failed: {str(e)}")
             return False, str(e)
     
+    @routed_read
+    def get_latest_gridded_statreps(self):
+        """
+        Get each handle's most recent STATREP, where that report has a grid square.
+        Seeds the in-process "reports near me" index.
+        """
+        try:
+            self.cursor.execute(
+                f"""SELECT {STATREP_COLUMNS} FROM (
+                       SELECT {STATREP_COLUMNS},
+                              ROW_NUMBER() OVER (PARTITION BY amcon_handle
+                                                 ORDER BY datetime_group DESC, id DESC) AS rn
+                       FROM statrep
+                   )
+                   WHERE rn = 1 AND latitude IS NOT NULL"""
+            )
+            return True, self._fetch()
+        except Exception as e:
+            logger.error(f"Query failed: {str(e)}")
+            return False, str(e)
+    
+    def backfill_grid_squares(self, batch_size=1000):
+        """
+        Fill grid_square/latitude/longitude for rows stored before grid parsing.
+        The updates don't move a location's version stamp, so the locations
+        touched are dropped from the result cache (in every worker).
+        Returns: (success: bool, updated row count or error_message)
+        """
+        updated = 0
+        cache = get_location_cache()
+        try:
+            last_id = 0
+            while True:
+                self.cursor.execute(
+                    """SELECT id, location, state, neighborhood FROM statrep
+                       WHERE id > :1 AND grid_square IS NULL AND location IS NOT NULL
+                       ORDER BY id FETCH FIRST :2 ROWS ONLY""",
+                    (last_id, batch_size)
+                )
+                rows = self.cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                changes = []
+                touched = set()
+                for row_id, location, state, neighborhood in rows:
+                    grid, latitude, longitude = locate_grid(location)
+                    if grid is not None:
+                        changes.append((grid, latitude, longitude, row_id))
+                        touched.add((state, neighborhood))
+                if changes:
+                    self.cursor.executemany(
+                        "UPDATE statrep SET grid_square = :1, latitude = :2, longitude = :3 WHERE id = :4",
+                        changes
+                    )
+                    self.connection.commit()
+                    updated += len(changes)
+                    for key in touched:
+                        cache.invalidate(key)
+            logger.info(f"Backfilled grid squares on {updated} STATREPs")
+            return True, updated
+        except Exception as e:
+            error_msg = f"Grid backfill failed: {str(e)}"
+            logger.error(error_msg)
+            self.connection.rollback()
+            return False, error_msg
+    
+    @routed_read
+    def get_recent_statreps_by_location(self, state, neighborhood, hours):
+        """
+        Get all STATREPs for a state/neighborhood from the last N hours, newest first.
+        Range scan on (state, neighborhood, datetime_group).
+        """
+        try:
+            cutoff = to_db_timestamp(datetime.now(timezone.utc) - timedelta(hours=hours))
+            self.cursor.execute(
+                f"""SELECT {STATREP_COLUMNS} FROM statrep
+                   WHERE state = :1 AND neighborhood = :2
+                   AND datetime_group >= FROM_TZ(CAST(:3 AS TIMESTAMP), '+00:00')
+                   ORDER BY datetime_group DESC""",
+                (state, neighborhood, cutoff)
+            )
+            return True, self._fetch()
+        except Exception as e:
+            logger.error(f"Query failed: {str(e)}")
+            return False, str(e)
+    
+    @routed_read
+    def get_recent_statreps_by_handle(self, amcon_handle, hours):
+        """
+        Get all STATREPs for a handle from the last N hours, newest first.
+        Range scan on (amcon_handle, datetime_group).
+        """
+        try:
+            cutoff = to_db_timestamp(datetime.now(timezone.utc) - timedelta(hours=hours))
+            self.cursor.execute(
+                f"""SELECT {STATREP_COLUMNS} FROM statrep
+                   WHERE amcon_handle = :1
+                   AND datetime_group >= FROM_TZ(CAST(:2 AS TIMESTAMP), '+00:00')
+                   ORDER BY datetime_group DESC""",
+                (amcon_handle, cutoff)
+            )
+            return True, self._fetch()
+        except Exception as e:
+            logger.error(f"Query failed: {str(e)}")
+            return False, str(e)
+
+    def search_comments(self, query, state=None, neighborhood=None, hours=None, limit=50):
+        """
+        Search STATREP comments for keywords and "quoted phrases", optionally
+        within a location and the last N hours. Served from the in-process
+        inverted index, best matches first (relevance weighted by recency).
+        """
+        # Imported here: the search module builds on this one
+        from statrep_search_v3_prod import get_search_index
+        try:
+            results = get_search_index().search(query, state=state, neighborhood=neighborhood,
+                                                hours=hours, limit=limit)
+            return True, [row for _, row in results]
+        except Exception as e:
+            logger.error(f"Comment search failed: {str(e)}")
+            return False, str(e)
+
     def close(self):
         """Close the database connection"""
+        if self._replica is not None:
+            self._replica.close()
+            self._replica = None
         try:
             if self.cursor:
                 self.cursor.close()
             if self.connection:
                 self.connection.close()
-            logger.info("Database connection closed (STATREP)")
+            logger.info("Database connection closed", extra=log_fields(database="STATREP"))
         except Exception as e:
             logger.error(f"Error closing connection: {str(e)}")
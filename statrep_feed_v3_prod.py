@@ -0,0 +1,327 @@
+import threading
+import logging
+import time
+from statrep_db_v3_prod import StatrepDatabase
+from statrep_hub_v3_prod import subscribe, publish, TOPIC_STATREP_INSERTED
+
+logger = logging.getLogger(__name__)
+
+# Polling defaults (seconds) - the interval doubles while the feed is idle,
+# up to MAX_POLL_INTERVAL, and snaps back as soon as new rows show up
+POLL_INTERVAL = 5.0
+MAX_POLL_INTERVAL = 60.0
+BACKOFF_FACTOR = 2.0
+BATCH_SIZE = 500
+# Ids are handed out at insert time but become visible at commit, so a lower
+# id can show up after a higher one (writer threads, API batches, sync
+# imports). Ids skipped past are re-read until they appear or COMMIT_LAG
+# seconds go by (rolled back inserts and identity cache jumps never do).
+COMMIT_LAG = 120.0
+MAX_OPEN_GAPS = 10000
+# How long an index loader waits for a new feed to fix its starting watermark
+READY_TIMEOUT = 30.0
+
+class StatrepChangeFeed:
+    def __init__(self, poll_interval=POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL,
+                 backoff_factor=BACKOFF_FACTOR, batch_size=BATCH_SIZE, start_id=None):
+        """
+        Background poller that reads only STATREPs newer than the last seen id
+        and hands them to in-process subscribers (caches, live views, alerting).
+        One feed per process means one query per interval, not one per session.
+        Every row is delivered once, though a late commit arrives after higher ids.
+        """
+        self.poll_interval = poll_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.batch_size = batch_size
+        self.watermark = start_id  # None = start from the current max id
+        self._gaps = {}            # id skipped past -> monotonic time noticed
+        self._ready = threading.Event()  # set once the watermark is known
+        if start_id is not None:
+            self._ready.set()
+        self.current_interval = poll_interval
+        self.db = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """
+        Register callback(rows) to receive each batch of new STATREP rows.
+        Callbacks run on the feed thread and should return quickly.
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        """Remove a previously registered callback"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def start(self):
+        """Start the poller thread (no-op if already running)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="statrep-change-feed", daemon=True
+            )
+            self._thread.start()
+        logger.info(f"Change feed started (interval {self.poll_interval}s, max {self.max_interval}s)")
+
+    def stop(self, timeout=5.0):
+        """Stop the poller thread and close its database connection"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.db:
+            self.db.close()
+            self.db = None
+        logger.info("Change feed stopped")
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        """
+        Block until the watermark is known - rows committed after this returns
+        are delivered to subscribers. Returns False on timeout.
+        """
+        return self._ready.wait(timeout)
+
+    def wake(self):
+        """Poll immediately (e.g. right after a local insert) and reset the backoff"""
+        self.current_interval = self.poll_interval
+        self._wake_event.set()
+
+    def _ensure_connected(self):
+        if self.db is not None:
+            return True
+        db = StatrepDatabase()
+        success, error = db.connect()
+        if not success:
+            logger.error(f"Change feed could not connect: {error}")
+            return False
+        self.db = db
+        return True
+
+    def _reset_connection(self):
+        if self.db:
+            self.db.close()
+        self.db = None
+
+    def poll_once(self):
+        """
+        Read every row past the watermark, or past the oldest open gap below
+        it (in batches), and dispatch the ones not delivered yet.
+        Returns the number of new rows, or None if the poll failed.
+        """
+        if not self._ensure_connected():
+            return None
+
+        if self.watermark is None:
+            success, max_id = self.db.get_max_statrep_id()
+            if not success:
+                self._reset_connection()
+                return None
+            self.watermark = max_id
+            self._ready.set()
+            logger.info(f"Change feed watermark initialized at id {max_id}")
+            return 0
+
+        self._expire_gaps()
+        after_id = min(self._gaps) - 1 if self._gaps else self.watermark
+        total = 0
+        while not self._stop_event.is_set():
+            success, rows = self.db.get_statreps_since(after_id, self.batch_size)
+            if not success:
+                self._reset_connection()
+                return None if total == 0 else total
+            if not rows:
+                break
+
+            after_id = rows[-1].id
+            fresh = self._accept(rows)
+            if fresh:
+                total += len(fresh)
+                self._dispatch(fresh)
+
+            if len(rows) < self.batch_size:
+                break
+
+        return total
+
+    def _accept(self, rows):
+        """Advance the watermark over rows (in id order); return the ones not delivered before"""
+        fresh = []
+        now = time.monotonic()
+        for row in rows:
+            if row.id > self.watermark:
+                for missing in range(self.watermark + 1, row.id):
+                    if len(self._gaps) >= MAX_OPEN_GAPS:
+                        break
+                    self._gaps[missing] = now
+                self.watermark = row.id
+                fresh.append(row)
+            elif self._gaps.pop(row.id, None) is not None:
+                fresh.append(row)
+        return fresh
+
+    def _expire_gaps(self):
+        cutoff = time.monotonic() - COMMIT_LAG
+        for gap_id in [gap_id for gap_id, noticed in self._gaps.items() if noticed < cutoff]:
+            del self._gaps[gap_id]
+
+    def _dispatch(self, rows):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(rows)
+            except Exception as e:
+                logger.error(f"Change feed subscriber {callback!r} failed: {str(e)}")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            count = self.poll_once()
+
+            if count:
+                # New data - keep polling at the base rate
+                self.current_interval = self.poll_interval
+            else:
+                # Idle feed or failed poll - back off
+                self.current_interval = min(
+                    self.current_interval * self.backoff_factor, self.max_interval
+                )
+
+            self._wake_event.wait(self.current_interval)
+            self._wake_event.clear()
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_change_feed(**kwargs):
+    """
+    Return the process-wide change feed, creating and starting it on first use.
+    kwargs are passed to StatrepChangeFeed only when the feed is first created.
+    """
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = StatrepChangeFeed(**kwargs)
+            _feed.start()
+        return _feed
+
+
+class FeedIndexLoader:
+    def __init__(self, name, factory, seed):
+        """
+        Lazily built process-wide index kept current from the change feed
+        (nearby, heatmap, comment search). seed(index, db) fills a new
+        factory() index from a read connection and returns the rows loaded.
+
+        The feed subscription comes first and its rows are buffered while the
+        seed query runs, then replayed, so a report committed between the
+        seed read and the subscription is not lost. index.update must
+        tolerate rows it already holds.
+
+        The seed reads a replica, but the feed's watermark comes from the
+        primary. Rows the replica had not applied yet are below the watermark,
+        so the feed never sends them. After the seed they are read from the
+        primary: everything past the replica's max id, up to the watermark.
+        """
+        self.name = name
+        self.factory = factory
+        self.seed = seed
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the index, loading it on first use"""
+        with self._lock:
+            if self._index is not None:
+                return self._index
+
+            index = self.factory()
+            pending = []
+            live = False
+            pending_lock = threading.Lock()
+
+            def relay(rows):
+                with pending_lock:
+                    if not live:
+                        pending.extend(rows)
+                        return
+                index.update(rows)
+
+            feed = get_change_feed()
+            feed.subscribe(relay)
+            try:
+                if not feed.wait_ready():
+                    logger.warning(f"{self.name}: change feed not ready, reports stored while loading may be missed")
+                watermark = feed.watermark
+                db = StatrepDatabase(role="read")
+                success, error = db.connect()
+                if not success:
+                    raise RuntimeError(error)
+                try:
+                    success, seen = db.get_max_statrep_id()
+                    if not success:
+                        raise RuntimeError(seen)
+                    count = self.seed(index, db)
+                finally:
+                    db.close()
+                if watermark is not None and seen < watermark:
+                    count += self._catch_up(index, seen, watermark, feed.batch_size)
+            except Exception:
+                feed.unsubscribe(relay)
+                raise
+
+            with pending_lock:
+                index.update(pending)
+                live = True
+            logger.info(f"{self.name} loaded from {count} reports ({len(pending)} arrived while loading)")
+            self._index = index
+            return index
+
+    def _catch_up(self, index, after_id, through_id, batch_size):
+        """Add rows (after_id, through_id] from the primary - the ones a lagging replica missed"""
+        db = StatrepDatabase()
+        success, error = db.connect()
+        if not success:
+            raise RuntimeError(error)
+        count = 0
+        try:
+            while after_id < through_id:
+                success, rows = db.get_statreps_since(after_id, batch_size)
+                if not success:
+                    raise RuntimeError(rows)
+                rows = [row for row in rows if row.id <= through_id]
+                if not rows:
+                    break
+                index.update(rows)
+                count += len(rows)
+                after_id = rows[-1].id
+        finally:
+            db.close()
+        if count:
+            logger.info(f"{self.name}: {count} reports read from the primary past the replica")
+        return count
+
+
+def _wake_local_feed():
+    if _feed is not None:
+        _feed.wake()
+
+def notify_insert():
+    """Wake the feed after an insert - in this process, if it runs one, and in the other workers"""
+    _wake_local_feed()
+    publish(TOPIC_STATREP_INSERTED)
+
+subscribe(TOPIC_STATREP_INSERTED, lambda _: _wake_local_feed())
@@ -1,31 +1,35 @@
 import flet as ft
 from flet import Colors
-from statrep_db_v3_prod import StatrepDatabase
+from statrep_db_v3_prod import (
+    StatrepDatabase, DATETIME_GROUP_FORMAT, get_central_tz, parse_datetime_group, format_datetime_group
+)
 from manage_handles_v3_prod import HandlesDatabase
 from manage_locations_v3_prod import LocationDatabase
+from statrep_submit_queue_v3_prod import get_submission_queue
+from statrep_nearby_v3_prod import get_nearby_index
+from maidenhead_v3_prod import find_grid, grid_to_latlon
+from statrep_hub_v3_prod import start_hub_client
+from statrep_api_v3_prod import start_api_server, API_PORT_ENV
+from ui_metrics_v3_prod import ui_metrics_enabled, instrument_page
+from statrep_logging_v3_prod import configure_logging, register_correlation_provider, log_fields
+from memory_diagnostics_v3_prod import memory_diagnostics_enabled, get_memory_diagnostics
 from datetime import datetime
-from zoneinfo import ZoneInfo
 import logging
+import os
+import threading
+import uuid
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+def flet_session_id():
+    """Correlation id for log records: the Flet session whose event this thread is handling"""
+    page = ft.context.page
+    return page.session_id if page is not None else None
+
 def get_central_time():
     """Get current time in US Central timezone (handles DST automatically)"""
-    try:
-        # Use America/Chicago which automatically handles CST/CDT
-        central_tz = ZoneInfo("America/Chicago")
-        return datetime.now(central_tz)
-    except Exception as e:
-        logger.warning(f"Could not use zoneinfo, falling back to UTC-6: {e}")
-        # Fallback: simple UTC-6 offset (doesn't handle DST)
-        from datetime import timezone, timedelta
-        central_tz = timezone(timedelta(hours=-6))
-        return datetime.now(central_tz)
+    # America/Chicago handles CST/CDT; falls back to a fixed UTC-6 offset
+    return datetime.now(get_central_tz())
 
 class StatrepApp:
     def __init__(self):
@@ -40,6 +44,12 @@ class StatrepApp:
         # Scrolling is handled by Container, not page level
         page.horizontal_alignment = ft.CrossAxisAlignment.START
         
+        # Optional: record diff payload sizes per handler (STATREP_UI_METRICS=1)
+        session_metrics = instrument_page(page) if ui_metrics_enabled() else None
+        # Optional: session/control counts for the memory diagnostics endpoint
+        if memory_diagnostics_enabled():
+            get_memory_diagnostics().track_page(page)
+        
         # Status message (for connection errors, etc.)
         connection_status = ft.Text(value="", size=14)
         
@@ -103,13 +113,17 @@ class StatrepApp:
         success, valid_neighborhoods = self.locations_db.get_all_neighborhoods()
         if not success:
             valid_neighborhoods = []
+        # The lists are all this session needs from it - give the connection back
+        self.locations_db.close()
+        self.locations_db = None
         
         # Store valid options
         self.valid_handles = valid_handles
         self.valid_states = valid_states
         self.valid_neighborhoods = valid_neighborhoods
         
-        logger.info(f"Data loaded - Handles: {len(valid_handles)}, States: {len(valid_states)}, Neighborhoods: {len(valid_neighborhoods)}")
+        logger.info("Data loaded", extra=log_fields(
+            handles=len(valid_handles), states=len(valid_states), neighborhoods=len(valid_neighborhoods)))
         
         # Status message for user feedback
         self.status_message = ft.Text(value="", color=Colors.GREEN, size=16, weight="bold")
@@ -153,8 +167,7 @@ class StatrepApp:
         
         # Change PIN button (always visible alongside Verify)
         def change_pin_button_clicked(e):
-            logger.info("Change PIN button clicked!")
-            logger.info(f"Event page: {e.page}, Control page: {e.control.page}")
+            logger.debug("Change PIN button clicked")
             self.show_voluntary_pin_change(e.control.page)
         
         change_pin_button = ft.ElevatedButton(
@@ -174,9 +187,10 @@ class StatrepApp:
         self.verify_pin_button = verify_pin_button  # Store reference
         self.change_pin_button = change_pin_button  # Store reference
         self.pin_verified = False  # Track if PIN has been verified
+        self.submission_key = uuid.uuid4().hex  # Idempotency key - one per filled-in form
         
         # ===== DATETIME FIELD =====
-        current_dt = get_central_time().strftime("%Y-%m-%d %H:%M")
+        current_dt = get_central_time().strftime(DATETIME_GROUP_FORMAT)
         self.datetime_field = ft.TextField(
             label="Report as of Date/Time",
             hint_text="YYYY-MM-DD HH:MM",
@@ -321,7 +335,7 @@ class StatrepApp:
                 self.optional_fields.visible = True
             else:
                 self.optional_fields.visible = False
-            page.update()
+            self.optional_fields.update()
         
         self.conditions_group.on_change = conditions_changed
         
@@ -331,13 +345,13 @@ class StatrepApp:
             if not self.handle_field.value:
                 self.status_message.value = "✗ Please select a handle first"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             if not self.pin_field.value:
                 self.status_message.value = "✗ Please enter your PIN"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             # Verify PIN
@@ -345,7 +359,7 @@ class StatrepApp:
                 self.status_message.value = "✗ Invalid handle or PIN"
                 self.status_message.color = Colors.RED
                 self.pin_verified = False
-                page.update()
+                self.status_message.update()
                 return
             
             # PIN is valid!
@@ -358,23 +372,23 @@ class StatrepApp:
                 return  # Don't continue until PIN is changed
             
             # Look up the last STATREP for this handle (pre-fill convenience)
-            success, last_statrep = self.db.get_last_statrep_for_handle(self.handle_field.value)
+            success, last_statrep = self.db.get_last_location_for_handle(self.handle_field.value)
             
             if success and last_statrep:
                 # Pre-populate state, neighborhood, and location from last report
-                self.state_field.value = last_statrep[3]  # state
-                self.neighborhood_field.value = last_statrep[4]  # neighborhood
-                self.location_field.value = last_statrep[5]  # location
+                self.state_field.value = last_statrep.state
+                self.neighborhood_field.value = last_statrep.neighborhood
+                self.location_field.value = last_statrep.location
                 
                 # Show success message with pre-fill info
-                self.status_message.value = f"✓ Verified! Pre-filled from your last report ({last_statrep[2]})"
+                self.status_message.value = f"✓ Verified! Pre-filled from your last report ({format_datetime_group(last_statrep.datetime_group)})"
                 self.status_message.color = Colors.GREEN
             else:
                 # First time for this handle
                 self.status_message.value = f"✓ Verified! Welcome, {self.handle_field.value}"
                 self.status_message.color = Colors.GREEN
             
-            page.update()
+            page.update(self.state_field, self.neighborhood_field, self.location_field, self.status_message)
         
         self.verify_pin_clicked = verify_pin_clicked
         
@@ -387,13 +401,13 @@ class StatrepApp:
             if not self.handle_field.value:
                 self.status_message.value = "✗ Please select your handle"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             if not self.pin_field.value:
                 self.status_message.value = "✗ Please enter your PIN"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             # Verify PIN inline (unless already verified)
@@ -401,7 +415,7 @@ class StatrepApp:
                 if not self.handles_db.verify_pin(self.handle_field.value, self.pin_field.value):
                     self.status_message.value = "✗ Invalid handle or PIN"
                     self.status_message.color = Colors.RED
-                    page.update()
+                    self.status_message.update()
                     return
                 
                 # Check if PIN needs to be changed (starts with 'z')
@@ -412,73 +426,135 @@ class StatrepApp:
             if not self.datetime_field.value:
                 self.status_message.value = "✗ Please enter date/time"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
+                return
+            
+            # Parse once here - the database gets a real Central time timestamp
+            try:
+                datetime_group = parse_datetime_group(self.datetime_field.value)
+            except ValueError:
+                self.status_message.value = "✗ Date/time must be YYYY-MM-DD HH:MM"
+                self.status_message.color = Colors.RED
+                self.status_message.update()
                 return
             
             if not self.state_field.value:
                 self.status_message.value = "✗ Please enter state"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             if not self.neighborhood_field.value:
                 self.status_message.value = "✗ Please enter neighborhood"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             if not self.location_field.value:
                 self.status_message.value = "✗ Please enter location"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
-            # Insert the STATREP
-            success, result = self.db.insert_statrep(
+            # Hand the STATREP to the writer pool - the database sees a steady
+            # stream even when the whole net submits at once
+            conditions = self.conditions_group.value
+            record = dict(
                 amcon_handle=self.handle_field.value,
-                datetime_group=self.datetime_field.value,
+                datetime_group=datetime_group,
                 state=self.state_field.value,
                 neighborhood=self.neighborhood_field.value,
                 location=self.location_field.value,
-                conditions=self.conditions_group.value,
-                position=self.position_group.value if self.conditions_group.value != "A" else None,
-                commercial_power=self.power_group.value if self.conditions_group.value != "A" else None,
-                water=self.water_group.value if self.conditions_group.value != "A" else None,
-                sanitation=self.sanitation_group.value if self.conditions_group.value != "A" else None,
-                grid_comms=self.grid_comms_group.value if self.conditions_group.value != "A" else None,
-                transportation=self.transport_group.value if self.conditions_group.value != "A" else None,
-                comments=self.comments_field.value if self.comments_field.value else None
+                conditions=conditions,
+                position=self.position_group.value if conditions != "A" else None,
+                commercial_power=self.power_group.value if conditions != "A" else None,
+                water=self.water_group.value if conditions != "A" else None,
+                sanitation=self.sanitation_group.value if conditions != "A" else None,
+                grid_comms=self.grid_comms_group.value if conditions != "A" else None,
+                transportation=self.transport_group.value if conditions != "A" else None,
+                comments=self.comments_field.value if self.comments_field.value else None,
+                # Same key until the form is cleared, so double clicks and retries
+                # after a timeout return the original record instead of a duplicate
+                idempotency_key=self.submission_key
             )
+            submitted_handle = record["amcon_handle"]
+            # The writer marks the ticket done before submission_done runs, so
+            # the position poller checks this instead - under the same lock -
+            # right before it writes, and never overwrites the final message
+            status_lock = threading.Lock()
+            finished = threading.Event()
             
-            if success:
-                # Update last_used timestamp for the handle
-                self.handles_db.update_last_used(self.handle_field.value)
-                
-                # Save handle for re-population after clear
-                submitted_handle = self.handle_field.value
-                
-                # Mark as verified (for next time)
-                self.pin_verified = True
-                
-                self.status_message.value = f"✓ STATREP submitted successfully! (ID: {result})"
-                self.status_message.color = Colors.GREEN
-                
-                # Clear form except handle (for quick re-submissions)
-                clear_form(None)
-                
-                # Re-populate handle and keep verified state for convenience
-                self.handle_field.value = submitted_handle
-                self.pin_verified = True
-            else:
-                self.status_message.value = f"✗ Error: {result}"
+            def submission_done(success, result):
+                """Runs in the page's executor once the insert finishes (not on the writer thread)"""
+                if success:
+                    # Update last_used timestamp for the handle
+                    self.handles_db.update_last_used(submitted_handle)
+                with status_lock:
+                    finished.set()
+                    show_result(success, result)
+            
+            def show_result(success, result):
+                if success:
+                    self.status_message.value = f"✓ STATREP submitted successfully! (ID: {result})"
+                    self.status_message.color = Colors.GREEN
+                    
+                    # Clear form except handle (for quick re-submissions)
+                    clear_form(None)
+                    
+                    # Re-populate handle and keep verified state for convenience
+                    self.handle_field.value = submitted_handle
+                    self.pin_verified = True
+                else:
+                    self.status_message.value = f"✗ Error: {result}"
+                    self.status_message.color = Colors.RED
+                submit_button.disabled = False
+                page.update(self.handle_field, self.status_message, submit_button)
+            
+            submission_queue = get_submission_queue()
+            submit_button.disabled = True
+            accepted, ticket = submission_queue.submit(record, submission_done, run_callback=page.run_thread)
+            if not accepted:
+                submit_button.disabled = False
+                self.status_message.value = f"✗ {ticket}"
                 self.status_message.color = Colors.RED
+                self.status_message.update()
+                return
+            
+            # Mark as verified (for next time)
+            self.pin_verified = True
+            
+            def show_progress(message, *controls):
+                """Write a progress message unless the result is already showing. Returns False once it is."""
+                with status_lock:
+                    if finished.is_set():
+                        return False
+                    self.status_message.value = message
+                    self.status_message.color = Colors.BLUE
+                    page.update(self.status_message, *controls)
+                    return True
+            
+            def show_queue_position():
+                """Keep the operator informed while the report waits for a writer"""
+                while not ticket.done.wait(1.0 if ticket.started_at is None else 0.25):
+                    position = submission_queue.position(ticket)
+                    if position:
+                        wait = submission_queue.estimated_wait(position)
+                        message = f"⏳ Queued - position {position} (about {wait:.0f}s)"
+                    else:
+                        message = "⏳ Saving..."
+                    if not show_progress(message):
+                        break
             
-            page.update()
+            # Position 0: a writer already has it
+            position = submission_queue.position(ticket)
+            message = f"⏳ Queued - position {position}" if position else "⏳ Saving..."
+            if show_progress(message, submit_button) and not ticket.done.is_set():
+                page.run_thread(show_queue_position)
         
         def clear_form(e):
             self.handle_field.value = ""
             self.pin_field.value = ""
-            self.datetime_field.value = get_central_time().strftime("%Y-%m-%d %H:%M")
+            self.datetime_field.value = get_central_time().strftime(DATETIME_GROUP_FORMAT)
             self.state_field.value = ""
             self.neighborhood_field.value = ""
             self.location_field.value = ""
@@ -499,9 +575,18 @@ class StatrepApp:
             self.neighborhood_suggestions.controls.clear()
             # Reset PIN verification state
             self.pin_verified = False
+            # A fresh form is a new submission
+            self.submission_key = uuid.uuid4().hex
             if e:  # Only clear status message if user clicked clear button
                 self.status_message.value = ""
-            page.update()
+            # One batched update for just the form controls (optional_fields
+            # carries the radio groups and comments)
+            page.update(
+                self.handle_field, self.handle_suggestions, self.pin_field, self.datetime_field,
+                self.state_field, self.state_suggestions, self.neighborhood_field,
+                self.neighborhood_suggestions, self.location_field, self.conditions_group,
+                self.optional_fields, self.status_message
+            )
         
         def show_statreps_clicked(e):
             """Show recent STATREPs for the same state/neighborhood"""
@@ -510,19 +595,19 @@ class StatrepApp:
             if not self.state_field.value:
                 self.status_message.value = "✗ Please enter a state first"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             if not self.neighborhood_field.value:
                 self.status_message.value = "✗ Please enter a neighborhood first"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             state = self.state_field.value
             neighborhood = self.neighborhood_field.value
             
-            logger.info(f"Fetching STATREPs for {state}/{neighborhood}")
+            logger.info("Fetching STATREPs", extra=log_fields(state=state, neighborhood=neighborhood))
             
             # Query the database
             success, results = self.db.get_latest_statreps_by_location(state, neighborhood)
@@ -530,20 +615,85 @@ class StatrepApp:
             if not success:
                 self.status_message.value = f"✗ Error fetching STATREPs: {results}"
                 self.status_message.color = Colors.RED
-                page.update()
+                self.status_message.update()
                 return
             
             if not results or len(results) == 0:
                 self.status_message.value = f"ℹ No STATREPs found for {state}/{neighborhood}"
                 self.status_message.color = Colors.BLUE
-                page.update()
+                self.status_message.update()
                 return
             
             # Build the table
-            show_statreps_dialog(page, results, state, neighborhood)
+            show_statreps_dialog(page, results, f"Recent STATREPs - {state} / {neighborhood}")
         
-        def show_statreps_dialog(page, results, state, neighborhood):
-            """Display STATREPs in a scrollable dialog with table"""
+        def show_nearby_clicked(e):
+            """Show the latest report of every station within the chosen radius of your grid square"""
+            grid = find_grid(self.location_field.value)
+            if grid is None:
+                self.status_message.value = "✗ Enter a grid square (e.g., FN20xb) in Your Location first"
+                self.status_message.color = Colors.RED
+                self.status_message.update()
+                return
+            
+            radius_km = int(self.radius_dropdown.value)
+            try:
+                index = get_nearby_index()
+            except Exception as ex:
+                self.status_message.value = f"✗ Error loading nearby reports: {ex}"
+                self.status_message.color = Colors.RED
+                self.status_message.update()
+                return
+            
+            lat, lon = grid_to_latlon(grid)
+            nearby = index.nearby(lat, lon, radius_km)
+            logger.info("Nearby stations", extra=log_fields(count=len(nearby), radius_km=radius_km, grid=grid))
+            
+            if not nearby:
+                self.status_message.value = f"ℹ No reports within {radius_km} km of {grid}"
+                self.status_message.color = Colors.BLUE
+                self.status_message.update()
+                return
+            
+            show_statreps_dialog(
+                page,
+                [row for _, row in nearby],
+                f"STATREPs within {radius_km} km of {grid}",
+                distances=[distance for distance, _ in nearby]
+            )
+        
+        def search_comments_clicked(e):
+            """Search report comments, within the entered state/neighborhood if any"""
+            query = (self.search_field.value or "").strip()
+            if not query:
+                self.status_message.value = "✗ Enter words or a \"quoted phrase\" to search for"
+                self.status_message.color = Colors.RED
+                self.status_message.update()
+                return
+            
+            state = (self.state_field.value or "").strip() or None
+            neighborhood = (self.neighborhood_field.value or "").strip() or None
+            hours = int(self.search_window_dropdown.value) or None
+            
+            success, results = self.db.search_comments(query, state=state, neighborhood=neighborhood, hours=hours)
+            if not success:
+                self.status_message.value = f"✗ Error searching comments: {results}"
+                self.status_message.color = Colors.RED
+                self.status_message.update()
+                return
+            
+            logger.info("Comment search", extra=log_fields(query=query, matches=len(results)))
+            if not results:
+                self.status_message.value = f"ℹ No comments match {query}"
+                self.status_message.color = Colors.BLUE
+                self.status_message.update()
+                return
+            
+            where = " / ".join(part for part in (state, neighborhood) if part)
+            show_statreps_dialog(page, results, f"Comments matching {query}" + (f" in {where}" if where else ""))
+        
+        def show_statreps_dialog(page, results, title, distances=None):
+            """Display STATREPs in a scrollable dialog with table (optionally with distance in km)"""
             
             import csv
             import io
@@ -568,29 +718,26 @@ class StatrepApp:
                     "Handle", "Date/Time", "State", "Neighborhood", "Location", 
                     "Status", "Position", "Power", "Water", "Sanitation", 
                     "Grid/Comms", "Transport", "Comments"
-                ])
+                ] + (["Distance (km)"] if distances else []))
                 
                 # Write data rows
-                for row in results:
-                    # row structure: id, amcon_handle, datetime_group, state, neighborhood, location, 
-                    #                conditions, position, commercial_power, water, sanitation, 
-                    #                grid_comms, transportation, comments
-                    condition_desc = condition_map.get(row[6], row[6])
+                for i, row in enumerate(results):
+                    condition_desc = condition_map.get(row.conditions, row.conditions)
                     csv_writer.writerow([
-                        row[1],  # handle
-                        str(row[2]),  # datetime
-                        row[3],  # state
-                        row[4],  # neighborhood
-                        row[5],  # location
-                        condition_desc,  # conditions
-                        row[7] or "",  # position
-                        row[8] or "",  # power
-                        row[9] or "",  # water
-                        row[10] or "",  # sanitation
-                        row[11] or "",  # grid_comms
-                        row[12] or "",  # transportation
-                        row[13] or "",  # comments
-                    ])
+                        row.amcon_handle,
+                        format_datetime_group(row.datetime_group),
+                        row.state,
+                        row.neighborhood,
+                        row.location,
+                        condition_desc,
+                        row.position or "",
+                        row.commercial_power or "",
+                        row.water or "",
+                        row.sanitation or "",
+                        row.grid_comms or "",
+                        row.transportation or "",
+                        row.comments or "",
+                    ] + ([f"{distances[i]:.1f}"] if distances else []))
                 
                 # Get CSV content
                 csv_content = output.getvalue()
@@ -600,25 +747,20 @@ class StatrepApp:
                 page.set_clipboard(csv_content)
                 
                 # Show success message
-                page.snack_bar = ft.SnackBar(
+                page.open(ft.SnackBar(
                     content=ft.Text("✓ CSV data copied to clipboard! Paste into Excel or text editor."),
                     bgcolor=Colors.GREEN_700,
                     duration=3000
-                )
-                page.snack_bar.open = True
-                page.update()
+                ))
             
             
             # Create table rows
             table_rows = []
             
             for row in results:
-                # row structure: id, amcon_handle, datetime_group, state, neighborhood, location, 
-                #                conditions, position, commercial_power, water, sanitation, 
-                #                grid_comms, transportation, comments
-                handle = row[1]
-                datetime_str = str(row[2])
-                conditions = row[6]
+                handle = row.amcon_handle
+                datetime_str = format_datetime_group(row.datetime_group)
+                conditions = row.conditions
                 condition_desc = condition_map.get(conditions, conditions)
                 
                 if conditions == "A":
@@ -641,13 +783,13 @@ class StatrepApp:
                     )
                 else:
                     # Moderate or Severe - show all fields
-                    position = row[7] or ""
-                    power = row[8] or ""
-                    water = row[9] or ""
-                    sanitation = row[10] or ""
-                    grid_comms = row[11] or ""
-                    transportation = row[12] or ""
-                    comments = row[13] or ""
+                    position = row.position or ""
+                    power = row.commercial_power or ""
+                    water = row.water or ""
+                    sanitation = row.sanitation or ""
+                    grid_comms = row.grid_comms or ""
+                    transportation = row.transportation or ""
+                    comments = row.comments or ""
                     
                     color = Colors.ORANGE if conditions == "B" else Colors.RED
                     
@@ -681,6 +823,11 @@ class StatrepApp:
                         )
                     )
             
+            # Distance column right after the handle for "near me" results
+            if distances:
+                for data_row, distance in zip(table_rows, distances):
+                    data_row.cells.insert(1, ft.DataCell(ft.Text(f"{distance:.0f}", size=12)))
+            
             # Create the data table
             data_table = ft.DataTable(
                 columns=[
@@ -701,6 +848,8 @@ class StatrepApp:
                 horizontal_lines=ft.border.BorderSide(1, Colors.GREY_300),
                 heading_row_color=Colors.BLUE_GREY_100,
             )
+            if distances:
+                data_table.columns.insert(1, ft.DataColumn(ft.Text("Km", weight="bold", size=13), numeric=True))
             
             def close_dialog(e):
                 page.close(statreps_dialog)
@@ -749,7 +898,7 @@ class StatrepApp:
             # Create AlertDialog
             statreps_dialog = ft.AlertDialog(
                 modal=True,
-                title=ft.Text(f"Recent STATREPs - {state} / {neighborhood}", size=20, weight="bold"),
+                title=ft.Text(title, size=20, weight="bold"),
                 content=scrollable_container,
                 actions=[
                     ft.ElevatedButton(
@@ -789,6 +938,61 @@ class StatrepApp:
             height=50
         )
         
+        self.radius_dropdown = ft.Dropdown(
+            label="Radius",
+            value="50",
+            width=120,
+            options=[ft.dropdown.Option(key=str(km), text=f"{km} km") for km in (25, 50, 100, 250, 500)],
+        )
+        
+        show_nearby_button = ft.ElevatedButton(
+            text="Reports Near Me",
+            on_click=show_nearby_clicked,
+            width=200,
+            bgcolor=Colors.TEAL_700,
+            color=Colors.WHITE,
+            height=50
+        )
+        
+        self.search_field = ft.TextField(
+            label="Search comments",
+            hint_text='e.g. water "cr 12"',
+            width=300,
+            on_submit=search_comments_clicked,
+        )
+        
+        self.search_window_dropdown = ft.Dropdown(
+            label="Within",
+            value="72",
+            width=120,
+            options=[ft.dropdown.Option(key=str(hours), text=text)
+                     for hours, text in ((24, "24 hours"), (72, "3 days"), (168, "7 days"), (0, "All"))],
+        )
+        
+        search_button = ft.ElevatedButton(
+            text="Search",
+            on_click=search_comments_clicked,
+            width=120,
+            bgcolor=Colors.INDIGO_700,
+            color=Colors.WHITE,
+            height=50
+        )
+        
+        # Database health - the circuit breaker is shared by every session
+        db_status_text = ft.Text("", size=13)
+        
+        def on_circuit_change(breaker):
+            if breaker.state == "open":
+                db_status_text.value = (f"⚠ Database unreachable - submissions and lookups are paused, "
+                                        f"retrying every {int(breaker.reset_timeout)}s")
+                db_status_text.color = Colors.ORANGE
+            else:
+                db_status_text.value = "✓ Database connection restored"
+                db_status_text.color = Colors.GREEN
+            db_status_text.update()
+        
+        self.db.breaker.add_listener(on_circuit_change)
+        
         # Build the page with improved mobile scrollability
         # Create the main content column with vertical scrolling
         main_content_column = ft.Column(
@@ -810,6 +1014,7 @@ class StatrepApp:
                     padding=ft.padding.only(left=10, bottom=10)
                 ),
                 self.status_message,
+                db_status_text,
                 ft.Divider(height=20),
                 
                 # Required fields
@@ -832,10 +1037,15 @@ class StatrepApp:
                 # Buttons
                 ft.Divider(height=20),
                 ft.Row(
-                    controls=[submit_button, show_statreps_button],
+                    controls=[submit_button, show_statreps_button, show_nearby_button, self.radius_dropdown],
                     spacing=20,
                     wrap=True  # Allow wrapping on small screens
                 ),
+                ft.Row(
+                    controls=[self.search_field, self.search_window_dropdown, search_button],
+                    spacing=20,
+                    wrap=True
+                ),
             ],
             spacing=10,
             scroll=ft.ScrollMode.ALWAYS,  # Enable vertical scrolling
@@ -865,6 +1075,9 @@ class StatrepApp:
         # Cleanup on close
         def on_close(e):
             logger.info("Application closing - cleaning up database connections")
+            self.db.breaker.remove_listener(on_circuit_change)
+            if session_metrics is not None:
+                session_metrics.log_summary(f" (session {page.session_id})")
             if self.db:
                 self.db.close()
             if self.handles_db:
@@ -877,7 +1090,7 @@ class StatrepApp:
     def show_pin_change_dialog(self, handle, page):
         """Show modal dialog to force PIN change for temporary PINs"""
         
-        logger.info(f"Showing PIN change dialog for handle: {handle}")
+        logger.info("Showing PIN change dialog", extra=log_fields(handle=handle))
         
         # Create dialog fields
         dialog_status = ft.Text(
@@ -911,22 +1124,22 @@ class StatrepApp:
             
             if not new_pin or not confirm_pin:
                 dialog_status.value = "Please enter PIN in both fields"
-                page.update()
+                dialog_status.update()
                 return
             
             if len(new_pin) < 4:
                 dialog_status.value = "PIN must be at least 4 characters"
-                page.update()
+                dialog_status.update()
                 return
             
             if new_pin != confirm_pin:
                 dialog_status.value = "New PINs do not match"
-                page.update()
+                dialog_status.update()
                 return
             
             if new_pin.lower().startswith('z'):
                 dialog_status.value = "PIN cannot start with 'z' (reserved for temporary PINs)"
-                page.update()
+                dialog_status.update()
                 return
             
             # Change the PIN
@@ -946,10 +1159,10 @@ class StatrepApp:
                 self.status_message.value = f"✓ PIN changed successfully! You can now submit."
                 self.status_message.color = Colors.GREEN
                 
-                page.update()
+                page.update(self.pin_field, self.status_message)
             else:
                 dialog_status.value = f"Error: {error}"
-                page.update()
+                dialog_status.update()
         
         # Create the dialog
         pin_change_dialog = ft.AlertDialog(
@@ -997,10 +1210,10 @@ class StatrepApp:
         if not handle:
             self.status_message.value = "✗ Please select a handle first"
             self.status_message.color = Colors.RED
-            page.update()
+            self.status_message.update()
             return
         
-        logger.info(f"Showing voluntary PIN change dialog for handle: {handle}")
+        logger.info("Showing voluntary PIN change dialog", extra=log_fields(handle=handle))
         
         # Create dialog fields
         dialog_status = ft.Text(
@@ -1040,12 +1253,12 @@ class StatrepApp:
             
             if not old_pin:
                 dialog_status.value = "Please enter your current PIN"
-                page.update()
+                dialog_status.update()
                 return
             
             if not self.handles_db.verify_pin(handle, old_pin):
                 dialog_status.value = "Current PIN is incorrect"
-                page.update()
+                dialog_status.update()
                 return
             
             # Validate new PIN inputs
@@ -1054,27 +1267,27 @@ class StatrepApp:
             
             if not new_pin or not confirm_pin:
                 dialog_status.value = "Please enter PIN in both fields"
-                page.update()
+                dialog_status.update()
                 return
             
             if len(new_pin) < 4:
                 dialog_status.value = "PIN must be at least 4 characters"
-                page.update()
+                dialog_status.update()
                 return
             
             if new_pin != confirm_pin:
                 dialog_status.value = "New PINs do not match"
-                page.update()
+                dialog_status.update()
                 return
             
             if new_pin.lower().startswith('z'):
                 dialog_status.value = "PIN cannot start with 'z' (reserved for temporary PINs)"
-                page.update()
+                dialog_status.update()
                 return
             
             if new_pin == old_pin_field.value:
                 dialog_status.value = "New PIN must be different from current PIN"
-                page.update()
+                dialog_status.update()
                 return
             
             # Change the PIN
@@ -1091,10 +1304,10 @@ class StatrepApp:
                 self.status_message.value = f"✓ PIN changed successfully!"
                 self.status_message.color = Colors.GREEN
                 
-                page.update()
+                page.update(self.pin_field, self.status_message)
             else:
                 dialog_status.value = f"Error: {error}"
-                page.update()
+                dialog_status.update()
         
         def cancel_clicked(e):
             page.close(voluntary_pin_dialog)
@@ -1138,13 +1351,9 @@ class StatrepApp:
             actions_alignment=ft.MainAxisAlignment.END,
         )
         
-        logger.info(f"Dialog object created: {voluntary_pin_dialog}")
-        logger.info(f"About to open dialog for handle: {handle}")
-        
         # Use the correct Flet API to open dialog
         page.open(voluntary_pin_dialog)
-        
-        logger.info("Dialog opened with page.open()")
+        logger.debug("Voluntary PIN change dialog opened", extra=log_fields(handle=handle))
     
     def filter_handles(self, e, page):
         """Filter handles based on user input"""
@@ -1172,7 +1381,8 @@ class StatrepApp:
                 )
                 self.handle_suggestions.visible = True
         
-        page.update()
+        # Only the suggestion list changed - the text field already has the keystroke
+        self.handle_suggestions.update()
     
     def select_handle(self, handle, page):
         """Select a handle from suggestions"""
@@ -1187,7 +1397,7 @@ class StatrepApp:
         self.status_message.value = f"Selected: {handle}. Now enter your PIN and click Verify."
         self.status_message.color = Colors.BLUE
         
-        page.update()
+        page.update(self.handle_field, self.handle_suggestions, self.status_message)
     
     def filter_states(self, e, page):
         """Filter states based on user input"""
@@ -1215,7 +1425,8 @@ class StatrepApp:
                 )
                 self.state_suggestions.visible = True
         
-        page.update()
+        # Only the suggestion list changed - the text field already has the keystroke
+        self.state_suggestions.update()
     
     def select_state(self, state, page):
         """Select a state from suggestions"""
@@ -1223,7 +1434,7 @@ class StatrepApp:
         self.state_suggestions.visible = False
         self.state_suggestions.controls.clear()
         self.neighborhood_field.focus()
-        page.update()
+        page.update(self.state_field, self.state_suggestions)
     
     def filter_neighborhoods(self, e, page):
         """Filter neighborhoods based on user input"""
@@ -1251,7 +1462,8 @@ class StatrepApp:
                 )
                 self.neighborhood_suggestions.visible = True
         
-        page.update()
+        # Only the suggestion list changed - the text field already has the keystroke
+        self.neighborhood_suggestions.update()
     
     def select_neighborhood(self, neighborhood, page):
         """Select a neighborhood from suggestions"""
@@ -1259,8 +1471,19 @@ class StatrepApp:
         self.neighborhood_suggestions.visible = False
         self.neighborhood_suggestions.controls.clear()
         self.location_field.focus()
-        page.update()
+        page.update(self.neighborhood_field, self.neighborhood_suggestions)
 
 if __name__ == "__main__":
-    app = StatrepApp()
-    ft.app(target=app.main)
+    # Queued, rate-limited logging tagged with each record's Flet session
+    configure_logging()
+    register_correlation_provider(flet_session_id)
+    # Trace from startup so the first snapshot already sees the sessions' allocations
+    if memory_diagnostics_enabled():
+        get_memory_diagnostics().start_tracing()
+    # Under serve_workers_v3_prod.py, share cache invalidations with the other workers
+    start_hub_client()
+    # Headless JSON API for gateways and dashboards, on its own port when enabled
+    if os.getenv(API_PORT_ENV):
+        start_api_server()
+    # One StatrepApp per session - its fields, controls and connections are that session's
+    ft.app(target=lambda page: StatrepApp().main(page))
@@ -0,0 +1,125 @@
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timezone
+from statrep_feed_v3_prod import FeedIndexLoader
+from maidenhead_v3_prod import grid_key
+
+logger = logging.getLogger(__name__)
+
+CONDITIONS = ("A", "B", "C")
+
+def _empty_counts():
+    return {condition: 0 for condition in CONDITIONS}
+
+class ConditionHeatmap:
+    def __init__(self):
+        """
+        Incrementally maintained A/B/C counts of each handle's latest report,
+        rolled up by Maidenhead field, square and subsquare. Each field is
+        served as a cached JSON tile that is rebuilt only after it changes,
+        so polling viewers cost a dict lookup.
+        """
+        self._latest = {}  # handle -> (datetime_group, id, condition, (field, square, subsquare))
+        self._fields = {}  # field -> {"total": counts, "squares": {..}, "subsquares": {..}}
+        self._tiles = {}   # field ("" = overview) -> JSON bytes
+        self._versions = {}  # field -> version, bumped on every change
+        self._instance = uuid.uuid4().hex[:8]  # versions restart with each process
+        self._lock = threading.Lock()
+
+    def _apply(self, keys, condition, delta):
+        field, square, subsquare = keys
+        entry = self._fields.setdefault(field, {"total": _empty_counts(), "squares": {}, "subsquares": {}})
+        entry["total"][condition] += delta
+        entry["squares"].setdefault(square, _empty_counts())[condition] += delta
+        if subsquare:
+            entry["subsquares"].setdefault(subsquare, _empty_counts())[condition] += delta
+        self._touch(field)
+
+    def _touch(self, field):
+        self._versions[field] = self._versions.get(field, 0) + 1
+        self._versions[""] = self._versions.get("", 0) + 1
+        self._tiles.pop(field, None)
+        self._tiles.pop("", None)
+
+    def update(self, rows):
+        """Apply new STATREP rows (e.g. from the change feed)"""
+        with self._lock:
+            for row in rows:
+                current = self._latest.get(row.amcon_handle)
+                if current is not None:
+                    if (row.datetime_group, row.id) < current[:2]:
+                        continue
+                    if current[3][0] is not None:
+                        self._apply(current[3], current[2], -1)
+                    del self._latest[row.amcon_handle]
+
+                keys = grid_key(row.grid_square)
+                if keys[0] is None or row.conditions not in CONDITIONS:
+                    continue
+                self._latest[row.amcon_handle] = (row.datetime_group, row.id, row.conditions, keys)
+                self._apply(keys, row.conditions, +1)
+
+    def version(self, field=""):
+        """Current version of a tile ("" = overview), usable as an ETag"""
+        with self._lock:
+            return self._versions.get(field, 0)
+
+    def etag(self, field=""):
+        """
+        HTTP ETag for a tile ("" = overview). Carries this heatmap's instance
+        too, since every worker process counts its own versions.
+        """
+        return f'"{self._instance}-{self.version(field.upper())}"'
+
+    def get_tile(self, field):
+        """
+        JSON tile for one Maidenhead field (e.g. "EM"): totals plus counts
+        for every square and subsquare with reports.
+        """
+        field = field.upper()
+        with self._lock:
+            tile = self._tiles.get(field)
+            if tile is None:
+                entry = self._fields.get(field, {"total": _empty_counts(), "squares": {}, "subsquares": {}})
+                tile = json.dumps({
+                    "field": field,
+                    "version": self._versions.get(field, 0),
+                    "generated_at": datetime.now(timezone.utc).isoformat(),
+                    "total": entry["total"],
+                    "squares": {k: v for k, v in entry["squares"].items() if any(v.values())},
+                    "subsquares": {k: v for k, v in entry["subsquares"].items() if any(v.values())},
+                }, separators=(",", ":")).encode()
+                self._tiles[field] = tile
+            return tile
+
+    def get_overview(self):
+        """JSON overview: totals for every field with reports"""
+        with self._lock:
+            tile = self._tiles.get("")
+            if tile is None:
+                tile = json.dumps({
+                    "version": self._versions.get("", 0),
+                    "generated_at": datetime.now(timezone.utc).isoformat(),
+                    "fields": {k: v["total"] for k, v in self._fields.items() if any(v["total"].values())},
+                }, separators=(",", ":")).encode()
+                self._tiles[""] = tile
+            return tile
+
+
+def _seed(heatmap, db):
+    success, rows = db.get_latest_gridded_statreps()
+    if not success:
+        raise RuntimeError(rows)
+    heatmap.update(rows)
+    return len(rows)
+
+_loader = FeedIndexLoader("Condition heatmap", ConditionHeatmap, _seed)
+
+def get_condition_heatmap():
+    """
+    Return the process-wide heatmap, loading it on first use and keeping
+    it current from the change feed.
+    """
+    return _loader.get()
@@ -0,0 +1,148 @@
+import os
+import threading
+import logging
+import time
+from multiprocessing.connection import Listener, Client
+
+logger = logging.getLogger(__name__)
+
+# Set by serve_workers_v3_prod.py for each worker; without them every
+# publish() is a no-op and the process only sees its own events
+HUB_ADDRESS_ENV = "STATREP_HUB_ADDRESS"   # host:port
+HUB_AUTHKEY_ENV = "STATREP_HUB_AUTHKEY"   # hex
+RECONNECT_DELAY = 2.0
+
+# Topics shared between worker processes
+TOPIC_HANDLES_CHANGED = "handles.changed"          # payload: None
+TOPIC_LOCATION_CHANGED = "location.changed"        # payload: (state, neighborhood)
+TOPIC_STATREP_INSERTED = "statrep.inserted"        # payload: None
+TOPIC_IDEMPOTENCY_KEY = "idempotency.key"          # payload: (key, record_id)
+
+def parse_address(value):
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+class PubSubHub:
+    def __init__(self, address=("127.0.0.1", 0), authkey=None):
+        """
+        Tiny local fan-out server: every message a worker sends is relayed to
+        every other connected worker. Runs inside the serving supervisor.
+        """
+        self.authkey = authkey or os.urandom(16)
+        self._listener = Listener(address, authkey=self.authkey)
+        self.address = self._listener.address
+        self._clients = {}   # conn -> lock held while sending to it
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def start(self):
+        threading.Thread(target=self._accept, name="statrep-hub-accept", daemon=True).start()
+        logger.info(f"Pub/sub hub listening on {self.address[0]}:{self.address[1]}")
+
+    def stop(self):
+        self._stopped = True
+        self._listener.close()
+        with self._lock:
+            for conn in self._clients:
+                conn.close()
+            self._clients = {}
+
+    def _accept(self):
+        while not self._stopped:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if not self._stopped:
+                    logger.error(f"Hub accept failed: {str(e)}")
+                continue
+            with self._lock:
+                self._clients[conn] = threading.Lock()
+            threading.Thread(target=self._relay, args=(conn,), daemon=True).start()
+
+    def _relay(self, conn):
+        try:
+            while True:
+                message = conn.recv()
+                with self._lock:
+                    others = [(c, send_lock) for c, send_lock in self._clients.items() if c is not conn]
+                for other, send_lock in others:
+                    # Every relay thread sends to every other worker; without the
+                    # lock two messages to one worker can interleave on the socket
+                    try:
+                        with send_lock:
+                            other.send(message)
+                    except Exception:
+                        pass  # its own relay thread drops it
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._clients.pop(conn, None)
+            conn.close()
+
+
+_subscribers = {}  # topic -> [callback(payload)]
+_subscribers_lock = threading.Lock()
+_client = None
+_client_lock = threading.Lock()
+
+def subscribe(topic, callback):
+    """Register callback(payload) for messages published by other processes"""
+    with _subscribers_lock:
+        _subscribers.setdefault(topic, []).append(callback)
+    return callback
+
+def publish(topic, payload=None):
+    """Send an event to the other worker processes (no-op when not running under the hub)"""
+    client = _client
+    if client is None:
+        return
+    try:
+        with _client_lock:
+            client.send((topic, payload))
+    except Exception as e:
+        logger.warning(f"Hub publish {topic} failed: {str(e)}")
+
+def _deliver(topic, payload):
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(topic, ()))
+    for callback in callbacks:
+        try:
+            callback(payload)
+        except Exception as e:
+            logger.error(f"Hub subscriber {callback!r} for {topic} failed: {str(e)}")
+
+def _listen(address, authkey):
+    global _client
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+        except Exception as e:
+            logger.warning(f"Hub connect failed: {str(e)}")
+            time.sleep(RECONNECT_DELAY)
+            continue
+        _client = conn
+        logger.info(f"Connected to pub/sub hub at {address[0]}:{address[1]}")
+        try:
+            while True:
+                topic, payload = conn.recv()
+                _deliver(topic, payload)
+        except (EOFError, OSError):
+            logger.warning("Lost pub/sub hub connection - reconnecting")
+        finally:
+            _client = None
+            conn.close()
+        time.sleep(RECONNECT_DELAY)
+
+def start_hub_client():
+    """
+    Join the hub named in the environment, if any. Returns True if this
+    process is running as one of several workers.
+    """
+    address = os.getenv(HUB_ADDRESS_ENV)
+    if not address:
+        return False
+    authkey = bytes.fromhex(os.getenv(HUB_AUTHKEY_ENV, ""))
+    threading.Thread(target=_listen, args=(parse_address(address), authkey),
+                     name="statrep-hub-client", daemon=True).start()
+    return True
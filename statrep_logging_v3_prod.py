@@ -0,0 +1,302 @@
+import argparse
+import atexit
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+# Log setup for the long-running processes (the Flet app, its workers, the API).
+# Callers only enqueue; a listener thread formats and writes, so a slow disk or
+# console never stalls a handler. Hot-path messages are constant strings with
+# the variable parts in extra=log_fields(...), which keeps them cheap when the
+# level is off, lets the rate limiter group them, and gives JSON output real
+# fields. Every record carries the session's correlation id.
+LOG_LEVEL_ENV = "STATREP_LOG_LEVEL"
+LOG_FORMAT_ENV = "STATREP_LOG_FORMAT"    # "text" (default) or "json"
+LOG_RATE_ENV = "STATREP_LOG_RATE"        # INFO/DEBUG records per second per message, 0 = unlimited
+DEFAULT_LOG_RATE = 5.0
+LOG_BURST = 20                           # records a message may log back to back before the rate applies
+LOG_QUEUE_SIZE = 10000                   # records waiting for the writer; more are dropped, not blocked on
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+
+_correlation_id = ContextVar("statrep_correlation_id", default=None)
+_correlation_providers = []
+
+def log_fields(**fields):
+    """Structured fields for a log call: logger.info("PIN verified", extra=log_fields(handle=h))"""
+    return {"fields": fields}
+
+def new_correlation_id():
+    return uuid.uuid4().hex[:12]
+
+def get_correlation_id():
+    """This context's correlation id, else the first provider's answer, else "-" """
+    value = _correlation_id.get()
+    if value is not None:
+        return value
+    for provider in _correlation_providers:
+        value = provider()
+        if value is not None:
+            return value
+    return "-"
+
+@contextlib.contextmanager
+def correlation_context(value=None):
+    """Tag every record logged inside the block (API requests, background jobs)"""
+    token = _correlation_id.set(value or new_correlation_id())
+    try:
+        yield _correlation_id.get()
+    finally:
+        _correlation_id.reset(token)
+
+def register_correlation_provider(provider):
+    """
+    provider() returns an id for the current context or None - the Flet app
+    uses the session of the page handling the event, which Flet tracks per thread
+    """
+    if provider not in _correlation_providers:
+        _correlation_providers.append(provider)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        """Stamp the correlation id in the caller's thread, before the record is queued"""
+        record.correlation_id = get_correlation_id()
+        if not hasattr(record, "fields"):
+            record.fields = {}
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, rate=DEFAULT_LOG_RATE, burst=LOG_BURST):
+        """
+        Token bucket per (logger, message) for records below WARNING. Messages
+        over the limit are dropped and counted; the next one that gets through
+        carries suppressed=N. Warnings and errors always pass.
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}   # (name, msg) -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) > 10000:   # f-string messages would each get a bucket
+                    self._buckets.clear()
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] -= 1
+            skipped, bucket[2] = bucket[2], 0
+        if skipped:
+            record.fields = dict(getattr(record, "fields", {}), suppressed=skipped)
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue, max_size=LOG_QUEUE_SIZE):
+        """Enqueue without ever blocking the caller; past max_size records are dropped and counted"""
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Same process, so the record goes over as is and is formatted on the
+        # writer thread (the stock prepare formats and copies it in the caller)
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "correlation_id": getattr(record, "correlation_id", "-"), "message": record.getMessage()}
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _build_queue_handler(rate):
+    rate_filter = RateLimitFilter(rate)
+    handler = DroppingQueueHandler(queue.SimpleQueue())
+    handler.addFilter(ContextFilter())
+    handler.addFilter(rate_filter)
+    return handler, rate_filter
+
+
+_listener = None
+_queue_handler = None
+_rate_filter = None
+_listener_lock = threading.Lock()
+
+def configure_logging(level=None, fmt=None, stream=None, rate=None):
+    """
+    Route the root logger through a queue to a writer thread. Safe to call
+    more than once - the first call wins. Returns the QueueListener.
+    level/fmt/rate default to STATREP_LOG_LEVEL, STATREP_LOG_FORMAT, STATREP_LOG_RATE.
+    """
+    global _listener, _queue_handler, _rate_filter
+    with _listener_lock:
+        if _listener is not None:
+            return _listener
+        level = level or os.getenv(LOG_LEVEL_ENV, "INFO").upper()
+        fmt = fmt or os.getenv(LOG_FORMAT_ENV, "text")
+        rate = float(os.getenv(LOG_RATE_ENV, DEFAULT_LOG_RATE)) if rate is None else rate
+
+        writer = logging.StreamHandler(stream or sys.stderr)
+        writer.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+        _queue_handler, _rate_filter = _build_queue_handler(rate)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, writer)
+        _listener.start()
+        atexit.register(shutdown_logging)   # flush what's still queued on the way out
+        return _listener
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread (runs at exit; safe to call twice)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def get_log_stats():
+    """Records suppressed by the rate limit and dropped on a full queue (since start)"""
+    return {"suppressed": _rate_filter.suppressed if _rate_filter else 0,
+            "dropped": _queue_handler.dropped if _queue_handler else 0,
+            "queued": _queue_handler.queue.qsize() if _queue_handler else 0}
+
+
+class _SlowStream:
+    def __init__(self, path, delay):
+        """A console or log pipe that takes delay seconds per write"""
+        self.file = open(path, "a")
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def _time_calls(call, iterations):
+    started = time.perf_counter()
+    for n in range(iterations):
+        call(n)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+def benchmark(iterations=20000, calls_per_request=6, slow_write_seconds=0.0002):
+    """
+    Caller-side cost of one log call: the old setup (basicConfig, f-strings,
+    synchronous writes) against this one (queue, structured fields, rate
+    limit), into a temp file and into a sink that takes slow_write_seconds per
+    write. calls_per_request approximates a submission (connect, verify PIN,
+    insert, update last_used, two closes).
+    Returns: {name: microseconds per call, or a count}
+    """
+    logger = logging.getLogger("statrep.logbench")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handle = "N0CALL"
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for sink, count in (("file", iterations), ("slow sink", max(iterations // 20, 100))):
+            stream = open(os.path.join(tmp, "sync.log"), "a") if sink == "file" else \
+                _SlowStream(os.path.join(tmp, "sync.log"), slow_write_seconds)
+            sync_handler = logging.StreamHandler(stream)
+            sync_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            logger.handlers = [sync_handler]
+            results[f"sync f-string INFO, {sink}"] = _time_calls(
+                lambda n: logger.info(f"PIN verified for handle: {handle}"), count)
+            if sink == "file":
+                results["sync f-string DEBUG (off)"] = _time_calls(
+                    lambda n: logger.debug(f"Event page: {handle}, Control page: {n}"), count)
+            stream.close()
+
+            stream = open(os.path.join(tmp, "async.log"), "a") if sink == "file" else \
+                _SlowStream(os.path.join(tmp, "async.log"), slow_write_seconds)
+            writer = logging.StreamHandler(stream)
+            writer.setFormatter(TextFormatter(TEXT_FORMAT))
+            queue_handler, limiter = _build_queue_handler(rate=0)
+            logger.handlers = [queue_handler]
+            listener = logging.handlers.QueueListener(queue_handler.queue, writer)
+            listener.start()
+            with correlation_context():
+                results[f"queued structured INFO, {sink}"] = _time_calls(
+                    lambda n: logger.info("PIN verified", extra=log_fields(handle=handle)), count)
+                if sink == "file":
+                    results["queued structured DEBUG (off)"] = _time_calls(
+                        lambda n: logger.debug("Event page", extra=log_fields(handle=handle, n=n)), count)
+                    limiter.rate = DEFAULT_LOG_RATE
+                    results["queued INFO over the rate limit"] = _time_calls(
+                        lambda n: logger.info("Connected to Oracle database", extra=log_fields(pool="Handles")),
+                        count)
+            listener.stop()
+            stream.close()
+            results[f"dropped ({sink})"] = queue_handler.dropped
+    logger.handlers = []
+    for sink in ("file", "slow sink"):
+        results[f"per request, sync, {sink}"] = results[f"sync f-string INFO, {sink}"] * calls_per_request
+        results[f"per request, queued, {sink}"] = results[f"queued structured INFO, {sink}"] * calls_per_request
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logging overhead per call and per request")
+    parser.add_argument("--benchmark", type=int, default=20000, metavar="N", help="log calls per measurement")
+    args = parser.parse_args()
+    for name, value in benchmark(args.benchmark).items():
+        if isinstance(value, float):
+            print(f"  {name:40s} {value:9.2f} µs")
+        else:
+            print(f"  {name:40s} {value:9d}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
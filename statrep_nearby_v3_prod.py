@@ -0,0 +1,168 @@
+import argparse
+import logging
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from statrep_db_v3_prod import StatrepDatabase, StatrepRow
+from statrep_feed_v3_prod import FeedIndexLoader
+from maidenhead_v3_prod import distance_km
+
+logger = logging.getLogger(__name__)
+
+# Index cells are 1 degree x 1 degree (half a Maidenhead square)
+CELL_DEGREES = 1.0
+KM_PER_DEGREE_LAT = 111.32
+
+class GridSpatialIndex:
+    def __init__(self):
+        """
+        In-memory spatial index over each handle's latest gridded STATREP.
+        Reports are bucketed into lat/lon cells so a radius query only
+        measures distance to stations in the cells its circle overlaps.
+        """
+        self._latest = {}  # handle -> StatrepRow
+        self._cells = {}   # (lat cell, lon cell) -> {handle: StatrepRow}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _cell(lat, lon):
+        return int(math.floor(lat / CELL_DEGREES)), int(math.floor(lon / CELL_DEGREES))
+
+    def __len__(self):
+        return len(self._latest)
+
+    def update(self, rows):
+        """
+        Apply new STATREP rows (e.g. from the change feed). A handle's newer
+        report replaces its old position; a newer report without a grid
+        square removes the handle from the index.
+        """
+        with self._lock:
+            for row in rows:
+                current = self._latest.get(row.amcon_handle)
+                if current is not None:
+                    if (row.datetime_group, row.id) < (current.datetime_group, current.id):
+                        continue
+                    cell = self._cells.get(self._cell(float(current.latitude), float(current.longitude)))
+                    if cell is not None:
+                        cell.pop(row.amcon_handle, None)
+                    del self._latest[row.amcon_handle]
+
+                if row.latitude is None or row.longitude is None:
+                    continue
+                self._latest[row.amcon_handle] = row
+                key = self._cell(float(row.latitude), float(row.longitude))
+                self._cells.setdefault(key, {})[row.amcon_handle] = row
+
+    def nearby(self, lat, lon, radius_km, limit=None):
+        """
+        Return [(distance_km, StatrepRow), ...] within radius_km of a point,
+        nearest first.
+        """
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + lat_span, 89.9))), 0.01)
+        lon_span = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+
+        lat_lo, lon_lo = self._cell(lat - lat_span, lon - lon_span)
+        lat_hi, lon_hi = self._cell(lat + lat_span, lon + lon_span)
+
+        results = []
+        with self._lock:
+            for lat_cell in range(lat_lo, lat_hi + 1):
+                for lon_cell in range(lon_lo, lon_hi + 1):
+                    # Wrap longitude cells across the antimeridian
+                    wrapped = (lon_cell + 180) % 360 - 180
+                    cell = self._cells.get((lat_cell, wrapped))
+                    if not cell:
+                        continue
+                    for row in cell.values():
+                        distance = distance_km(lat, lon, float(row.latitude), float(row.longitude))
+                        if distance <= radius_km:
+                            results.append((distance, row))
+
+        results.sort(key=lambda item: item[0])
+        return results[:limit] if limit else results
+
+
+def _seed(index, db):
+    success, rows = db.get_latest_gridded_statreps()
+    if not success:
+        raise RuntimeError(rows)
+    index.update(rows)
+    return len(rows)
+
+_loader = FeedIndexLoader("Nearby index", GridSpatialIndex, _seed)
+
+def get_nearby_index():
+    """
+    Return the process-wide spatial index, loading it on first use and
+    keeping it current from the change feed.
+    """
+    return _loader.get()
+
+def benchmark(stations=50000, radius_km=100.0, queries=200, seed=35):
+    """
+    Radius queries against the cell index and against a scan of every
+    station, over synthetic stations spread across the continental US.
+    Returns: {"index_ms", "scan_ms", "matches"} - per query averages
+    """
+    rng = random.Random(seed)
+    started = datetime(2025, 1, 1)
+    rows = [StatrepRow(id=n, amcon_handle=f"BENCH{n}", datetime_group=started + timedelta(seconds=n),
+                       latitude=rng.uniform(25.0, 49.0), longitude=rng.uniform(-124.0, -67.0))
+            for n in range(1, stations + 1)]
+    index = GridSpatialIndex()
+    index.update(rows)
+    points = [(rng.uniform(25.0, 49.0), rng.uniform(-124.0, -67.0)) for _ in range(queries)]
+
+    clock = time.perf_counter()
+    found = [index.nearby(lat, lon, radius_km) for lat, lon in points]
+    index_ms = (time.perf_counter() - clock) * 1000 / queries
+
+    clock = time.perf_counter()
+    scanned = []
+    for lat, lon in points:
+        hits = [(distance_km(lat, lon, row.latitude, row.longitude), row) for row in rows]
+        scanned.append(sorted((hit for hit in hits if hit[0] <= radius_km), key=lambda hit: hit[0]))
+    scan_ms = (time.perf_counter() - clock) * 1000 / queries
+
+    if [[row.id for _, row in hits] for hits in found] != [[row.id for _, row in hits] for hits in scanned]:
+        raise AssertionError("index and scan disagree")
+    return {"index_ms": index_ms, "scan_ms": scan_ms,
+            "matches": sum(len(hits) for hits in found) / queries}
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid square maintenance for STATREPs")
+    parser.add_argument("command", choices=["backfill", "benchmark"],
+                        help="backfill: parse grid squares on existing rows; "
+                             "benchmark: time radius queries on synthetic stations")
+    parser.add_argument("--stations", type=int, default=50000, help="benchmark: synthetic station count")
+    parser.add_argument("--radius", type=float, default=100.0, help="benchmark: query radius in km")
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        result = benchmark(args.stations, args.radius)
+        print(f"✓ {args.stations} stations, {args.radius:g} km radius, {result['matches']:.1f} matches per query")
+        print(f"  cell index  {result['index_ms']:8.3f} ms/query")
+        print(f"  full scan   {result['scan_ms']:8.3f} ms/query "
+              f"({result['scan_ms'] / result['index_ms']:.0f}x slower)")
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    db = StatrepDatabase()
+    success, error = db.connect()
+    if not success:
+        print(f"✗ {error}")
+        return 1
+    try:
+        success, result = db.backfill_grid_squares()
+    finally:
+        db.close()
+    print(f"✓ Backfilled {result} STATREPs" if success else f"✗ {result}")
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
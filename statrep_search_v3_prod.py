@@ -0,0 +1,196 @@
+import logging
+import math
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from statrep_db_v3_prod import StatrepRow
+from statrep_feed_v3_prod import FeedIndexLoader
+
+logger = logging.getLogger(__name__)
+
+# How much history the in-process index holds - loaded at startup, and older
+# reports (which retention moves to the archive) are pruned every PRUNE_INTERVAL
+INDEX_HISTORY_DAYS = 30
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+# BM25 tuning and recency decay (a report's weight halves roughly every 2 days)
+BM25_K1 = 1.2
+BM25_B = 0.75
+RECENCY_HALF_LIFE_HOURS = 48.0
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+QUERY_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+def tokenize(text):
+    """Lowercase word/number tokens ("CR 12 out" -> ["cr", "12", "out"])"""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+def parse_query(query):
+    """
+    Split a query into keywords and quoted phrases.
+    Returns a list of token lists - one token for a keyword, several for a phrase.
+    """
+    terms = []
+    for phrase, word in QUERY_PATTERN.findall(query or ""):
+        tokens = tokenize(phrase or word)
+        if tokens:
+            terms.append(tokens)
+    return terms
+
+def _as_utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)  # fetched datetime_group is naive UTC
+    return value
+
+class CommentSearchIndex:
+    def __init__(self):
+        """
+        Inverted index over STATREP comments, with token positions for
+        phrase matching. Fed incrementally from new inserts.
+        """
+        self._postings = {}  # token -> {id: [positions]}
+        self._docs = {}      # id -> (StatrepRow, token count)
+        self._total_tokens = 0
+        self._next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def update(self, rows):
+        """Index new STATREP rows that have comments"""
+        with self._lock:
+            for row in rows:
+                if not row.comments or row.id in self._docs:
+                    continue
+                tokens = tokenize(row.comments)
+                if not tokens:
+                    continue
+                for position, token in enumerate(tokens):
+                    self._postings.setdefault(token, {}).setdefault(row.id, []).append(position)
+                self._docs[row.id] = (row, len(tokens))
+                self._total_tokens += len(tokens)
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+                self.prune(datetime.now(timezone.utc) - timedelta(days=INDEX_HISTORY_DAYS))
+
+    def prune(self, before):
+        """
+        Drop reports dated before a UTC datetime and their postings, so the
+        index stays at INDEX_HISTORY_DAYS instead of growing with every insert.
+        Returns the number of reports removed.
+        """
+        with self._lock:
+            expired = [doc_id for doc_id, (row, _) in self._docs.items() if _as_utc(row.datetime_group) < before]
+            for doc_id in expired:
+                row, length = self._docs.pop(doc_id)
+                self._total_tokens -= length
+                for token in set(tokenize(row.comments)):
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        continue
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[token]
+        if expired:
+            logger.info(f"Comment search index pruned {len(expired)} reports")
+        return len(expired)
+
+    def _phrase_positions(self, tokens, doc_id):
+        """Start positions where the phrase occurs in a document"""
+        starts = set(self._postings[tokens[0]][doc_id])
+        for offset, token in enumerate(tokens[1:], start=1):
+            starts &= {p - offset for p in self._postings[token][doc_id]}
+            if not starts:
+                break
+        return starts
+
+    def search(self, query, state=None, neighborhood=None, hours=None, limit=50):
+        """
+        Find reports whose comments contain every keyword and phrase in query.
+        Returns [(score, StatrepRow), ...], best first. BM25 relevance is
+        weighted toward recent reports.
+        """
+        terms = parse_query(query)
+        if not terms:
+            return []
+
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(hours=hours) if hours else None
+
+        with self._lock:
+            # Candidates: documents containing every token, rarest token first
+            all_tokens = {token for term in terms for token in term}
+            if any(token not in self._postings for token in all_tokens):
+                return []
+            ordered = sorted(all_tokens, key=lambda t: len(self._postings[t]))
+            candidates = set(self._postings[ordered[0]])
+            for token in ordered[1:]:
+                candidates &= self._postings[token].keys()
+                if not candidates:
+                    return []
+
+            doc_count = len(self._docs)
+            avg_length = self._total_tokens / doc_count if doc_count else 1.0
+            results = []
+            for doc_id in candidates:
+                row, length = self._docs[doc_id]
+                if state and row.state != state:
+                    continue
+                if neighborhood and row.neighborhood != neighborhood:
+                    continue
+                reported_at = _as_utc(row.datetime_group)
+                if cutoff and reported_at < cutoff:
+                    continue
+
+                score = 0.0
+                matched = True
+                for term in terms:
+                    if len(term) == 1:
+                        tf = len(self._postings[term[0]][doc_id])
+                        df = len(self._postings[term[0]])
+                    else:
+                        tf = len(self._phrase_positions(term, doc_id))
+                        if tf == 0:
+                            matched = False
+                            break
+                        df = min(len(self._postings[token]) for token in term)
+                    idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                if not matched:
+                    continue
+
+                age_hours = max((now - reported_at).total_seconds() / 3600, 0.0)
+                score *= 0.5 + 0.5 * 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+                results.append((score, row))
+
+        results.sort(key=lambda item: (item[0], item[1].id), reverse=True)
+        return results[:limit]
+
+
+def _seed(index, db):
+    since = datetime.now(timezone.utc) - timedelta(days=INDEX_HISTORY_DAYS)
+    batch = []
+    count = 0
+    # iter_statreps yields plain tuples in STATREP_FIELDS order
+    for _, values in db.iter_statreps(since=since):
+        row = StatrepRow(*values)
+        if row.comments:
+            batch.append(row)
+            count += 1
+        if len(batch) >= 1000:
+            index.update(batch)
+            batch = []
+    index.update(batch)
+    return count
+
+_loader = FeedIndexLoader("Comment search index", CommentSearchIndex, _seed)
+
+def get_search_index():
+    """
+    Return the process-wide comment index. The first call streams the last
+    INDEX_HISTORY_DAYS of reports into it; the change feed keeps it current.
+    """
+    return _loader.get()
@@ -0,0 +1,353 @@
+import argparse
+import hashlib
+import json
+import logging
+import lzma
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+from statrep_db_v3_prod import StatrepDatabase
+from manage_handles_v3_prod import HandlesDatabase
+from manage_locations_v3_prod import LocationDatabase
+from export_statreps_v3_prod import to_json_value
+
+logger = logging.getLogger(__name__)
+
+# Output directory layout:
+#   current.sqlite                          last snapshot, uncompressed (base for the next delta)
+#   statrep_snapshot_<id>.sqlite.xz         full snapshot for a station starting from nothing
+#   statrep_delta_<from>_<to>.ndjson.xz     changes between two consecutive snapshots
+#   manifest.json                           latest id and the files available, with sizes and sha256
+SNAPSHOT_PREFIX = "statrep_snapshot_"
+DELTA_PREFIX = "statrep_delta_"
+CURRENT_NAME = "current.sqlite"
+MANIFEST_NAME = "manifest.json"
+SCHEMA_VERSION = 1
+INSERT_BATCH_SIZE = 1000
+DEFAULT_KEEP = 24
+# xz rather than gzip: SQLite pages compress about 3x smaller, which is what
+# matters on an HF or satellite link; the extra CPU is seconds per scheduled run
+XZ_PRESET = 6
+
+# Field station tables: (create statement, key columns)
+SNAPSHOT_TABLES = {
+    "handles": ("CREATE TABLE handles (handle TEXT PRIMARY KEY)", ("handle",)),
+    "states": ("CREATE TABLE states (state_name TEXT PRIMARY KEY)", ("state_name",)),
+    "neighborhoods": ("CREATE TABLE neighborhoods (neighborhood_name TEXT PRIMARY KEY)", ("neighborhood_name",)),
+    "latest_statreps": ("""CREATE TABLE latest_statreps (
+                               amcon_handle TEXT PRIMARY KEY, id INTEGER, datetime_group TEXT,
+                               state TEXT, neighborhood TEXT, location TEXT, conditions TEXT,
+                               position TEXT, commercial_power TEXT, water TEXT, sanitation TEXT,
+                               grid_comms TEXT, transportation TEXT, comments TEXT,
+                               grid_square TEXT, latitude REAL, longitude REAL)""", ("amcon_handle",)),
+    "location_summary": ("""CREATE TABLE location_summary (
+                                state TEXT, neighborhood TEXT, handles INTEGER,
+                                condition_a INTEGER, condition_b INTEGER, condition_c INTEGER,
+                                power_out INTEGER, water_out INTEGER, comms_out INTEGER,
+                                latest_report TEXT, PRIMARY KEY (state, neighborhood))""",
+                         ("state", "neighborhood")),
+}
+SNAPSHOT_INDEXES = (
+    "CREATE INDEX latest_statreps_location_ix ON latest_statreps (state, neighborhood)",
+)
+LATEST_COLUMNS = ("amcon_handle", "id", "datetime_group", "state", "neighborhood", "location", "conditions",
+                  "position", "commercial_power", "water", "sanitation", "grid_comms", "transportation",
+                  "comments", "grid_square", "latitude", "longitude")
+
+def snapshot_id(when=None):
+    """Sortable UTC id, e.g. 20261019T1405Z"""
+    return (when or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%MZ")
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _snapshot_id_of(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT value FROM meta WHERE key = 'snapshot_id'").fetchone()[0]
+    finally:
+        conn.close()
+
+def _compress_file(source, target):
+    tmp_path = target + ".tmp"
+    with open(source, "rb") as src, lzma.open(tmp_path, "wb", preset=XZ_PRESET) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp_path, target)
+
+
+class LocationSummaries:
+    def __init__(self):
+        """Per-location rollup of the latest reports, built one row at a time"""
+        self._locations = {}  # (state, neighborhood) -> counters
+
+    def add(self, row, reported):
+        """Count one latest report; reported is its datetime_group as ISO 8601 text"""
+        entry = self._locations.setdefault((row.state, row.neighborhood), {
+            "handles": 0, "condition_a": 0, "condition_b": 0, "condition_c": 0,
+            "power_out": 0, "water_out": 0, "comms_out": 0, "latest_report": None})
+        entry["handles"] += 1
+        if row.conditions in ("A", "B", "C"):
+            entry[f"condition_{row.conditions.lower()}"] += 1
+        entry["power_out"] += row.commercial_power == "N"
+        entry["water_out"] += row.water == "N"
+        entry["comms_out"] += row.grid_comms == "N"
+        if reported and (entry["latest_report"] is None or reported > entry["latest_report"]):
+            entry["latest_report"] = reported
+
+    def rows(self):
+        for (state, neighborhood), entry in sorted(self._locations.items()):
+            yield (state, neighborhood, entry["handles"], entry["condition_a"], entry["condition_b"],
+                   entry["condition_c"], entry["power_out"], entry["water_out"], entry["comms_out"],
+                   entry["latest_report"])
+
+
+def build_snapshot(path, latest_rows, handles, states, neighborhoods, snapshot):
+    """
+    Write a snapshot database from an iterator of latest-per-handle
+    StatrepRows. Rows go to disk in batches, so memory holds one batch plus
+    one counter set per location.
+    Returns: number of latest reports written
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        for create, _ in SNAPSHOT_TABLES.values():
+            conn.execute(create)
+        conn.executemany("INSERT INTO handles VALUES (?)", ((h,) for h in handles))
+        conn.executemany("INSERT INTO states VALUES (?)", ((s,) for s in states))
+        conn.executemany("INSERT INTO neighborhoods VALUES (?)", ((n,) for n in neighborhoods))
+
+        summaries = LocationSummaries()
+        placeholders = ", ".join("?" for _ in LATEST_COLUMNS)
+        insert = f"INSERT INTO latest_statreps ({', '.join(LATEST_COLUMNS)}) VALUES ({placeholders})"
+        batch = []
+        count = 0
+        for row in latest_rows:
+            reported = to_json_value(row.datetime_group)
+            summaries.add(row, reported)
+            # StatrepRow order from state through longitude matches LATEST_COLUMNS
+            batch.append((row.amcon_handle, row.id, reported, *row[3:17]))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                conn.executemany(insert, batch)
+                count += len(batch)
+                batch = []
+        conn.executemany(insert, batch)
+        count += len(batch)
+
+        conn.executemany("INSERT INTO location_summary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", summaries.rows())
+        for create in SNAPSHOT_INDEXES:
+            conn.execute(create)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", (
+            ("snapshot_id", snapshot), ("schema_version", str(SCHEMA_VERSION)),
+            ("generated_at", datetime.now(timezone.utc).isoformat()), ("latest_statreps", str(count)),
+        ))
+        conn.commit()
+        conn.execute("VACUUM")
+        return count
+    finally:
+        conn.close()
+
+
+def write_delta(new_path, old_path, delta_path):
+    """
+    Diff two snapshots inside SQLite (nothing is loaded into Python memory)
+    and stream the changes as xz-compressed NDJSON: a header line, then one
+    {"table", "op": "upsert"|"delete", ...} line per changed row.
+    Returns: number of changes
+    """
+    conn = sqlite3.connect(new_path)
+    tmp_path = delta_path + ".tmp"
+    changes = 0
+    try:
+        conn.execute("ATTACH DATABASE ? AS old", (old_path,))
+        old_id = conn.execute("SELECT value FROM old.meta WHERE key = 'snapshot_id'").fetchone()[0]
+        new_id = conn.execute("SELECT value FROM main.meta WHERE key = 'snapshot_id'").fetchone()[0]
+        with lzma.open(tmp_path, "wt", encoding="utf-8", preset=XZ_PRESET) as out:
+            out.write(json.dumps({"delta": {"from": old_id, "to": new_id, "schema_version": SCHEMA_VERSION}}) + "\n")
+            for table, (_, keys) in SNAPSHOT_TABLES.items():
+                key_list = ", ".join(keys)
+                cursor = conn.execute(f"SELECT * FROM main.{table} EXCEPT SELECT * FROM old.{table}")
+                columns = [d[0] for d in cursor.description]
+                for row in cursor:
+                    out.write(json.dumps({"table": table, "op": "upsert", "row": dict(zip(columns, row))}) + "\n")
+                    changes += 1
+                cursor = conn.execute(f"SELECT {key_list} FROM old.{table} EXCEPT SELECT {key_list} FROM main.{table}")
+                for row in cursor:
+                    out.write(json.dumps({"table": table, "op": "delete", "key": dict(zip(keys, row))}) + "\n")
+                    changes += 1
+            for key, value in conn.execute("SELECT key, value FROM main.meta"):
+                out.write(json.dumps({"table": "meta", "op": "upsert", "row": {"key": key, "value": value}}) + "\n")
+        os.replace(tmp_path, delta_path)
+        return changes
+    finally:
+        conn.close()
+
+
+def apply_delta(snapshot_path, delta_path):
+    """
+    Bring a station's snapshot forward with one delta file, in one
+    transaction. The delta must start from the snapshot's current id.
+    Returns: (success: bool, new snapshot id or error_message)
+    """
+    conn = sqlite3.connect(snapshot_path)
+    try:
+        current = conn.execute("SELECT value FROM meta WHERE key = 'snapshot_id'").fetchone()[0]
+        with lzma.open(delta_path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())["delta"]
+            if header["from"] != current:
+                return False, f"Delta starts at {header['from']} but this snapshot is {current}"
+            columns = {table: {info[1] for info in conn.execute(f"PRAGMA table_info({table})")}
+                       for table in ("meta", *SNAPSHOT_TABLES)}
+            with conn:
+                for line in f:
+                    change = json.loads(line)
+                    table = change["table"]
+                    fields = change.get("row") or change.get("key") or {}
+                    if table not in columns or not set(fields) <= columns[table]:
+                        raise ValueError(f"unexpected change for table {table}")
+                    if change["op"] == "upsert":
+                        row = change["row"]
+                        conn.execute(f"INSERT OR REPLACE INTO {table} ({', '.join(row)}) "
+                                     f"VALUES ({', '.join('?' for _ in row)})", tuple(row.values()))
+                    else:
+                        key = change["key"]
+                        conn.execute(f"DELETE FROM {table} WHERE {' AND '.join(f'{k} = ?' for k in key)}",
+                                     tuple(key.values()))
+        logger.info(f"Applied delta {header['from']} -> {header['to']}")
+        return True, header["to"]
+    except Exception as e:
+        error_msg = f"Delta failed: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg
+    finally:
+        conn.close()
+
+
+def _write_manifest(out_dir, latest):
+    files = []
+    for name in sorted(os.listdir(out_dir)):
+        if name.startswith((SNAPSHOT_PREFIX, DELTA_PREFIX)) and name.endswith(".xz"):
+            path = os.path.join(out_dir, name)
+            files.append({"name": name, "bytes": os.path.getsize(path), "sha256": _sha256(path)})
+    tmp_path = os.path.join(out_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"latest": latest, "files": files}, f, indent=1)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_NAME))
+
+def _prune(out_dir, keep):
+    """Keep the newest keep snapshots and deltas"""
+    for prefix in (SNAPSHOT_PREFIX, DELTA_PREFIX):
+        names = sorted(name for name in os.listdir(out_dir) if name.startswith(prefix) and name.endswith(".xz"))
+        for name in names[:-keep]:
+            os.remove(os.path.join(out_dir, name))
+
+
+def load_reference_lists():
+    """Handle names (never PIN hashes), states and neighborhoods from the read service"""
+    handles_db = HandlesDatabase(role="read")
+    locations_db = LocationDatabase(role="read")
+    for db in (handles_db, locations_db):
+        success, error = db.connect()
+        if not success:
+            raise RuntimeError(error)
+    try:
+        results = (handles_db.get_all_handles(), locations_db.get_all_states(), locations_db.get_all_neighborhoods())
+        if not all(success for success, _ in results):
+            raise RuntimeError("could not read the reference lists")
+        return tuple(values for _, values in results)
+    finally:
+        handles_db.close()
+        locations_db.close()
+
+def generate_snapshot(out_dir, keep=DEFAULT_KEEP, db=None, reference_lists=None):
+    """
+    Produce the next snapshot (and the delta from the previous one) in out_dir.
+    Returns: (success: bool, stats dict or error_message)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    snapshot = snapshot_id()
+    building = os.path.join(out_dir, "building.sqlite")
+    current = os.path.join(out_dir, CURRENT_NAME)
+    own_db = db is None
+    try:
+        handles, states, neighborhoods = reference_lists or load_reference_lists()
+        if own_db:
+            db = StatrepDatabase(role="read")
+            success, error = db.connect()
+            if not success:
+                return False, error
+        count = build_snapshot(building, db.iter_latest_statreps(), handles, states, neighborhoods, snapshot)
+
+        stats = {"snapshot_id": snapshot, "latest_statreps": count, "sqlite_bytes": os.path.getsize(building)}
+        if os.path.exists(current):
+            previous = _snapshot_id_of(current)
+            if previous == snapshot:
+                return False, f"Snapshot {snapshot} already exists - wait a minute between runs"
+            delta_path = os.path.join(out_dir, f"{DELTA_PREFIX}{previous}_{snapshot}.ndjson.xz")
+            stats["delta_changes"] = write_delta(building, current, delta_path)
+            stats["delta_bytes"] = os.path.getsize(delta_path)
+
+        snapshot_path = os.path.join(out_dir, f"{SNAPSHOT_PREFIX}{snapshot}.sqlite.xz")
+        _compress_file(building, snapshot_path)
+        stats["snapshot_bytes"] = os.path.getsize(snapshot_path)
+        os.replace(building, current)
+
+        _prune(out_dir, keep)
+        _write_manifest(out_dir, snapshot)
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        logger.info(f"Snapshot {snapshot}: {count} reports, {stats['snapshot_bytes']} bytes compressed"
+                    + (f", delta {stats['delta_changes']} changes / {stats['delta_bytes']} bytes"
+                       if "delta_bytes" in stats else ""))
+        return True, stats
+    except Exception as e:
+        error_msg = f"Snapshot failed: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg
+    finally:
+        if os.path.exists(building):
+            os.remove(building)
+        if own_db and db is not None:
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline SQLite snapshots (and deltas) for disconnected field stations")
+    parser.add_argument("out_dir", help="Directory for snapshots, deltas and the manifest")
+    parser.add_argument("--every", type=float, metavar="MINUTES",
+                        help="Keep running and produce a snapshot every N minutes")
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="Snapshots and deltas to keep")
+    parser.add_argument("--apply-delta", metavar="DELTA",
+                        help="Station side: apply a delta file to the snapshot at out_dir/current.sqlite")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.apply_delta:
+        success, result = apply_delta(os.path.join(args.out_dir, CURRENT_NAME), args.apply_delta)
+        print(f"✓ Snapshot is now {result}" if success else f"✗ {result}")
+        return 0 if success else 1
+
+    while True:
+        success, result = generate_snapshot(args.out_dir, keep=args.keep)
+        if success:
+            print(f"✓ Snapshot {result['snapshot_id']}: {result['latest_statreps']} reports, "
+                  f"{result['snapshot_bytes']:,} bytes compressed in {result['seconds']}s")
+        else:
+            print(f"✗ {result}")
+        if not args.every:
+            return 0 if success else 1
+        time.sleep(args.every * 60)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
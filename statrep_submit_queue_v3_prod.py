@@ -0,0 +1,233 @@
+import threading
+import logging
+import time
+from collections import deque
+from statrep_db_v3_prod import StatrepDatabase
+from db_resilience_v3_prod import is_disconnect
+from db_config_v3_prod import WRITER_COUNT
+from statrep_feed_v3_prod import notify_insert
+from statrep_logging_v3_prod import log_fields, get_correlation_id, correlation_context
+
+logger = logging.getLogger(__name__)
+
+# Admission limits - beyond these, submissions are rejected right away
+# instead of piling up behind a saturated database
+MAX_PENDING = 500
+MAX_PENDING_PER_HANDLE = 3
+RECONNECT_DELAY = 5.0
+
+class SubmissionTicket:
+    def __init__(self, amcon_handle, record, on_done, run_callback=None, correlation_id=None):
+        """
+        One queued insert_statrep call (record holds its keyword arguments).
+        correlation_id is the submitter's, so the writer's log lines carry it.
+        """
+        self.amcon_handle = amcon_handle
+        self.record = record
+        self.on_done = on_done
+        self.run_callback = run_callback
+        self.correlation_id = correlation_id
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.done = threading.Event()
+        self.success = None
+        self.result = None
+
+def _in_correlation_context(correlation_id, callback):
+    """callback wrapped to run under correlation_id on whatever thread calls it"""
+    def run(*args):
+        with correlation_context(correlation_id):
+            return callback(*args)
+    return run
+
+
+class SubmissionQueue:
+    def __init__(self, writers=WRITER_COUNT, max_pending=MAX_PENDING,
+                 max_per_handle=MAX_PENDING_PER_HANDLE):
+        """
+        Bounded STATREP submission queue drained by a fixed pool of writer
+        threads, each with its own database connection. Handles are served
+        round-robin, so one operator resubmitting can't starve the net.
+        """
+        self.writers = writers
+        self.max_pending = max_pending
+        self.max_per_handle = max_per_handle
+        self._pending = {}        # handle -> deque of tickets
+        self._rotation = deque()  # handles with pending tickets, in serving order
+        self._keys = {}           # idempotency key -> ticket, until its insert finishes
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._service_time = 0.25  # moving average seconds per insert, for wait estimates
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Start the writer threads (no-op if already running)"""
+        with self._cond:
+            if self._threads:
+                return
+            self._stop_event.clear()
+            for n in range(self.writers):
+                thread = threading.Thread(target=self._run, name=f"statrep-writer-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Submission queue started ({self.writers} writers, {self.max_pending} max pending)")
+
+    def stop(self, timeout=5.0):
+        """Stop the writers once their current insert finishes"""
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+        logger.info("Submission queue stopped")
+
+    def submit(self, record, on_done=None, run_callback=None):
+        """
+        Queue an insert_statrep call. on_done(success, result) runs when it
+        completes - on a writer thread, unless run_callback is given: then
+        the writer calls run_callback(on_done, success, result) to hand it
+        off (the Flet app passes page.run_thread) and moves on to the next insert.
+        A record whose idempotency_key is already queued or being written
+        gets that submission's ticket back instead of a second insert.
+        Returns: (accepted: bool, ticket or rejection message)
+        """
+        handle = record["amcon_handle"]
+        key = record.get("idempotency_key")
+        with self._cond:
+            if key and key in self._keys:
+                logger.info("Duplicate submission already queued", extra=log_fields(key=key, handle=handle))
+                return True, self._keys[key]
+            if self._size >= self.max_pending:
+                self.rejected += 1
+                logger.warning("Submission queue full", extra=log_fields(size=self._size, handle=handle))
+                return False, "Server busy - too many reports waiting. Please try again in a minute."
+            queue = self._pending.get(handle)
+            if queue is not None and len(queue) >= self.max_per_handle:
+                self.rejected += 1
+                return False, "You already have reports waiting to be saved."
+
+            ticket = SubmissionTicket(handle, record, on_done, run_callback, get_correlation_id())
+            if queue is None:
+                queue = self._pending[handle] = deque()
+                self._rotation.append(handle)
+            queue.append(ticket)
+            if key:
+                self._keys[key] = ticket
+            self._size += 1
+            self._cond.notify()
+        return True, ticket
+
+    def position(self, ticket):
+        """
+        1-based place in line for a waiting ticket (0 once a writer has it),
+        following the round-robin serving order.
+        """
+        with self._cond:
+            queue = self._pending.get(ticket.amcon_handle)
+            if queue is None or ticket not in queue:
+                return 0
+            depth = queue.index(ticket)
+            ahead = depth
+            for order, handle in enumerate(self._rotation):
+                if handle == ticket.amcon_handle:
+                    mine = order
+                    break
+            for order, handle in enumerate(self._rotation):
+                if handle != ticket.amcon_handle:
+                    ahead += min(len(self._pending[handle]), depth + (1 if order < mine else 0))
+            return ahead + 1
+
+    def estimated_wait(self, position):
+        """Rough seconds until a ticket at this position is written"""
+        return position * self._service_time / max(self.writers, 1)
+
+    def _take(self):
+        with self._cond:
+            while not self._size and not self._stop_event.is_set():
+                self._cond.wait()
+            if self._stop_event.is_set():
+                return None
+            handle = self._rotation.popleft()
+            queue = self._pending[handle]
+            ticket = queue.popleft()
+            if queue:
+                self._rotation.append(handle)
+            else:
+                del self._pending[handle]
+            self._size -= 1
+            return ticket
+
+    def _run(self):
+        db = None
+        while not self._stop_event.is_set():
+            if db is None:
+                db = StatrepDatabase()
+                success, error = db.connect()
+                if not success:
+                    logger.error(f"Writer could not connect: {error}")
+                    db = None
+                    self._stop_event.wait(RECONNECT_DELAY)
+                    continue
+
+            ticket = self._take()
+            if ticket is None:
+                break
+
+            ticket.started_at = time.monotonic()
+            with correlation_context(ticket.correlation_id):
+                ticket.success, ticket.result = db.insert_statrep(**ticket.record)
+            elapsed = time.monotonic() - ticket.started_at
+            self._service_time = 0.9 * self._service_time + 0.1 * elapsed
+            if ticket.success:
+                self.completed += 1
+                notify_insert()
+            else:
+                self.failed += 1
+                if is_disconnect(ticket.result) or db.connection_lost:
+                    # Start over with a fresh session rather than reuse this one
+                    db.close()
+                    db = None
+            key = ticket.record.get("idempotency_key")
+            if key:
+                with self._cond:
+                    self._keys.pop(key, None)
+            ticket.done.set()
+
+            if ticket.on_done:
+                on_done = _in_correlation_context(ticket.correlation_id, ticket.on_done)
+                try:
+                    if ticket.run_callback:
+                        ticket.run_callback(on_done, ticket.success, ticket.result)
+                    else:
+                        on_done(ticket.success, ticket.result)
+                except Exception as e:
+                    logger.error(f"Submission callback failed: {str(e)}")
+        if db is not None:
+            db.close()
+
+    def stats(self):
+        with self._cond:
+            return {"pending": self._size, "handles": len(self._pending),
+                    "completed": self.completed, "failed": self.failed,
+                    "rejected": self.rejected, "service_time": round(self._service_time, 3)}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_submission_queue(**kwargs):
+    """
+    Return the process-wide submission queue, creating and starting it on first use.
+    kwargs are passed to SubmissionQueue only when the queue is first created.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SubmissionQueue(**kwargs)
+            _queue.start()
+        return _queue
@@ -0,0 +1,682 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+import urllib.request
+import zlib
+from datetime import datetime, timedelta, timezone
+from db_config_v3_prod import acquire_connection
+from manage_schema_v3_prod import SchemaManager, to_sqlite_sql
+from statrep_db_v3_prod import STATREP_FIELDS, to_db_timestamp
+from export_statreps_v3_prod import to_json_value
+
+logger = logging.getLogger(__name__)
+
+# Store-and-forward replication between field nodes and the central database.
+# A node runs the sync; central only answers (POST /api/v1/sync), so central
+# keeps no per-node state and a node can be offline for days.
+#
+# Every STATREP is identified everywhere by (origin, origin_id): the node it was
+# entered at and its id there. Rows entered locally keep origin NULL; a replicated
+# row is stored with its origin, and the unique index on (origin, origin_id)
+# makes replaying a batch harmless. A node remembers four watermarks:
+#   push_statreps  last local id central acknowledged
+#   pull_statreps  last central id the node stored
+#   push_handles / pull_handles  exporter's clock at the last handle exchange
+# Watermarks only move after the other side's answer arrived, so a dropped
+# request or reply just sends the same batch again.
+#
+# Ids are handed out at INSERT but become visible at COMMIT, so a pull can see
+# id 1200 while 1150 is still uncommitted (a form writer mid-insert, a node's
+# batch being imported) and move past it. So behind each STATREP watermark the
+# node keeps two ranges, each with the number of rows the exporter had in it
+# when the node read them (summed from the batches, so no race):
+#   (settled, pending]     pending was the watermark at the end of an earlier
+#                          complete pass; it settles once a complete pass that
+#                          starts COMMIT_LAG later has checked it
+#   (pending, watermark]   read since
+# as name_window = "settled pending rows rows" (and name_pending_at). Each pass
+# asks for the current counts of both in one small exchange and reads again
+# only a range whose count moved - a late commit landed there; the rows it has
+# are duplicates to the (origin, origin_id) index. Central stays stateless.
+
+NODE_ID_ENV = "STATREP_NODE_ID"
+CENTRAL_NODE_ID = "central"
+SYNC_BATCH_SIZE = 500
+HANDLE_OVERLAP = timedelta(seconds=60)   # re-read handle changes from in-flight transactions
+COMMIT_LAG = timedelta(minutes=5)        # longer than any STATREP insert transaction
+SYNC_TIMEOUT_SECONDS = 30
+COMPRESS_LEVEL = 6
+
+SYNC_FIELDS = STATREP_FIELDS[1:]   # everything but the local id; origin/origin_id last
+ORIGIN_INDEX = SYNC_FIELDS.index("origin")
+DATETIME_INDEX = SYNC_FIELDS.index("datetime_group")
+
+def get_node_id():
+    return os.getenv(NODE_ID_ENV, CENTRAL_NODE_ID)
+
+def encode_message(message):
+    """JSON (rows as field-ordered lists, not objects) deflated for the link"""
+    return zlib.compress(json.dumps(message, separators=(",", ":")).encode(), COMPRESS_LEVEL)
+
+def decode_message(data):
+    return json.loads(zlib.decompress(data))
+
+def _utc(value):
+    """A timestamp read from either dialect (or the wire) as an aware UTC datetime"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class SyncStore:
+    def __init__(self, connection, dialect, node_id):
+        """
+        Replication reads and writes on an open DB-API connection.
+        dialect is "oracle" (central or a node with a local Oracle) or "sqlite"
+        (local stand-in). node_id names this database to its peers.
+        """
+        if dialect not in ("oracle", "sqlite"):
+            raise ValueError(f"Unknown dialect: {dialect}")
+        self.connection = connection
+        self.dialect = dialect
+        self.node_id = node_id
+        self.cursor = connection.cursor()
+
+    def _sql(self, sql):
+        return sql if self.dialect == "oracle" else to_sqlite_sql(sql)
+
+    def _time(self, value):
+        """Bind value for a TIMESTAMP column (naive UTC; text on SQLite)"""
+        if value is None:
+            return None
+        value = to_db_timestamp(_utc(value))
+        return value if self.dialect == "oracle" else value.isoformat(sep=" ")
+
+    def now(self):
+        """The database clock, UTC - handle watermarks are in the exporter's clock"""
+        if self.dialect == "oracle":
+            self.cursor.execute("SELECT SYS_EXTRACT_UTC(SYSTIMESTAMP) FROM dual")
+        else:
+            self.cursor.execute("SELECT CURRENT_TIMESTAMP")
+        return _utc(self.cursor.fetchone()[0])
+
+    def export_statreps(self, after_id, own_only=False, exclude_origin=None, limit=SYNC_BATCH_SIZE, up_to=None):
+        """
+        STATREPs with a local id past after_id (and at most up_to), oldest
+        first, as wire rows in SYNC_FIELDS order. own_only: just rows entered
+        here; exclude_origin: leave out rows that came from that node (it
+        already has them).
+        Returns: (last_id, rows)
+        """
+        columns = ", ".join(SYNC_FIELDS[:ORIGIN_INDEX])
+        sql = f"""SELECT id, {columns}, NVL(origin, :1), NVL(origin_id, id)
+                  FROM statrep WHERE id > :2"""
+        binds = [self.node_id, after_id]
+        if up_to is not None:
+            binds.append(up_to)
+            sql += f" AND id <= :{len(binds)}"
+        if own_only:
+            sql += " AND origin IS NULL"
+        elif exclude_origin:
+            binds.append(exclude_origin)
+            sql += f" AND (origin IS NULL OR origin != :{len(binds)})"
+        sql += f" ORDER BY id FETCH FIRST :{len(binds) + 1} ROWS ONLY"
+        binds.append(limit)
+        self.cursor.execute(self._sql(sql), binds)
+        rows = self.cursor.fetchall()
+        if not rows:
+            return after_id, []
+        return rows[-1][0], [[to_json_value(value) for value in row[1:]] for row in rows]
+
+    def count_statreps(self, after_id, up_to, own_only=False, exclude_origin=None):
+        """Rows export_statreps would return with ids in (after_id, up_to]"""
+        sql = "SELECT COUNT(*) FROM statrep WHERE id > :1 AND id <= :2"
+        binds = [after_id, up_to]
+        if own_only:
+            sql += " AND origin IS NULL"
+        elif exclude_origin:
+            sql += " AND (origin IS NULL OR origin != :3)"
+            binds.append(exclude_origin)
+        self.cursor.execute(self._sql(sql), binds)
+        return self.cursor.fetchone()[0]
+
+    def import_statreps(self, rows):
+        """
+        Store wire rows from a peer in one commit. Rows already here (same
+        origin and origin_id, or same idempotency key) count as duplicates;
+        rows that originated at this node are skipped the same way.
+        Returns: {"stored", "duplicates", "rejected": [(index, error), ...], "locations"}
+        """
+        result = {"stored": 0, "duplicates": 0, "rejected": [], "locations": set()}
+        binds, positions = [], []
+        for index, row in enumerate(rows):
+            if len(row) != len(SYNC_FIELDS):
+                result["rejected"].append((index, f"expected {len(SYNC_FIELDS)} fields"))
+                continue
+            if row[ORIGIN_INDEX] == self.node_id:
+                result["duplicates"] += 1
+                continue
+            row = list(row)
+            row[DATETIME_INDEX] = self._time(row[DATETIME_INDEX])
+            binds.append(row)
+            positions.append(index)
+        if not binds:
+            return result
+
+        placeholders = ", ".join(
+            "FROM_TZ(CAST(:2 AS TIMESTAMP), '+00:00')" if n == DATETIME_INDEX + 1 else f":{n}"
+            for n in range(1, len(SYNC_FIELDS) + 1))
+        sql = f"INSERT INTO statrep ({', '.join(SYNC_FIELDS)}) VALUES ({placeholders})"
+        try:
+            if self.dialect == "oracle":
+                self.cursor.executemany(sql, binds, batcherrors=True)
+                failed = {err.offset: err.message for err in self.cursor.getbatcherrors()}
+                for offset, message in failed.items():
+                    if "ORA-00001" in message:
+                        result["duplicates"] += 1
+                    else:
+                        result["rejected"].append((positions[offset], message))
+                stored = [row for offset, row in enumerate(binds) if offset not in failed]
+            else:
+                # SQLite can't say which rows it ignored; nodes keep no location cache anyway
+                before = self.connection.total_changes
+                self.cursor.executemany(to_sqlite_sql(sql).replace("INSERT INTO", "INSERT OR IGNORE INTO", 1), binds)
+                count = self.connection.total_changes - before
+                result["duplicates"] += len(binds) - count
+                stored = binds if count else []
+                result["stored"] = count
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        if self.dialect == "oracle":
+            result["stored"] = len(stored)
+        state_index, neighborhood_index = SYNC_FIELDS.index("state"), SYNC_FIELDS.index("neighborhood")
+        result["locations"] = {(row[state_index], row[neighborhood_index]) for row in stored}
+        return result
+
+    def export_handles(self, since=None):
+        """
+        Handles changed after since (exporter's clock; None = all of them).
+        Returns: (as_of, [[handle, pin_hash, pin_changed_at], ...]) - pass
+        as_of back as the next since
+        """
+        as_of = self.now()
+        if since is None:
+            self.cursor.execute("SELECT handle, pin_hash, pin_changed_at FROM handles ORDER BY handle")
+        else:
+            self.cursor.execute(
+                self._sql("SELECT handle, pin_hash, pin_changed_at FROM handles WHERE modified_at > :1 ORDER BY handle"),
+                [self._time(_utc(since) - HANDLE_OVERLAP)]
+            )
+        rows = [[handle, pin_hash, to_json_value(_utc(changed))] for handle, pin_hash, changed in self.cursor.fetchall()]
+        return as_of.isoformat(), rows
+
+    def import_handles(self, rows, peer_is_central):
+        """
+        Apply handle rows from a peer. A handle new here is added; when the PIN
+        differs, the later pin_changed_at wins and a tie goes to central.
+        modified_at only moves on a real change, so nothing echoes back and forth.
+        Returns: {"applied", "conflicts"}
+        """
+        result = {"applied": 0, "conflicts": 0}
+        select_sql = self._sql("SELECT pin_hash, pin_changed_at FROM handles WHERE handle = :1")
+        insert_sql = self._sql(
+            """INSERT INTO handles (handle, pin_hash, pin_changed_at, modified_at)
+               VALUES (:1, :2, :3, SYS_EXTRACT_UTC(SYSTIMESTAMP))""")
+        update_sql = self._sql(
+            """UPDATE handles SET pin_hash = :1, pin_changed_at = :2, modified_at = SYS_EXTRACT_UTC(SYSTIMESTAMP)
+               WHERE handle = :3""")
+        try:
+            for handle, pin_hash, changed in rows:
+                changed = _utc(changed)
+                self.cursor.execute(select_sql, [handle])
+                current = self.cursor.fetchone()
+                if current is None:
+                    self.cursor.execute(insert_sql, [handle, pin_hash, self._time(changed)])
+                    result["applied"] += 1
+                    continue
+                local_hash, local_changed = current[0], _utc(current[1])
+                if local_hash == pin_hash:
+                    continue
+                result["conflicts"] += 1
+                floor = datetime.min.replace(tzinfo=timezone.utc)
+                theirs, ours = changed or floor, local_changed or floor
+                if theirs > ours or (theirs == ours and peer_is_central):
+                    self.cursor.execute(update_sql, [pin_hash, self._time(changed), handle])
+                    result["applied"] += 1
+                    logger.info(f"Handle {handle}: PIN changed at {changed} replaces ours from {local_changed}")
+                else:
+                    logger.info(f"Handle {handle}: keeping our PIN from {local_changed} over {changed}")
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return result
+
+    def get_watermark(self, peer, name, default=None):
+        self.cursor.execute(self._sql("SELECT value FROM sync_watermarks WHERE peer = :1 AND name = :2"),
+                            [peer, name])
+        row = self.cursor.fetchone()
+        return row[0] if row else default
+
+    def set_watermark(self, peer, name, value):
+        if self.dialect == "oracle":
+            sql = """MERGE INTO sync_watermarks w
+                     USING (SELECT :1 AS peer, :2 AS name, :3 AS value FROM dual) src
+                     ON (w.peer = src.peer AND w.name = src.name)
+                     WHEN MATCHED THEN UPDATE SET w.value = src.value, w.updated_at = SYSTIMESTAMP
+                     WHEN NOT MATCHED THEN INSERT (peer, name, value) VALUES (src.peer, src.name, src.value)"""
+        else:
+            sql = """INSERT INTO sync_watermarks (peer, name, value) VALUES (?1, ?2, ?3)
+                     ON CONFLICT (peer, name) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP"""
+        self.cursor.execute(sql, [peer, name, str(value)])
+        self.connection.commit()
+
+
+class SyncResponder:
+    def __init__(self, store):
+        """Central's side of the exchange: one request message in, one reply out"""
+        self.store = store
+
+    def handle(self, message):
+        """
+        message: a decoded request from node message["node"].
+        Returns: (reply, effects) - effects has "locations" and "handles"
+        (whether any changed) so the caller can invalidate its caches
+        """
+        node = message.get("node")
+        if not node or node == self.store.node_id:
+            raise ValueError("Request needs the sending node's id")
+        op = message.get("op")
+        effects = {"locations": set(), "handles": False}
+        if op == "push_statreps":
+            result = self.store.import_statreps(message.get("rows") or [])
+            effects["locations"] = result.pop("locations")
+            return result, effects
+        if op == "pull_statreps":
+            up_to = message.get("up_to")
+            last_id, rows = self.store.export_statreps(int(message.get("after_id") or 0), exclude_origin=node,
+                                                       limit=min(int(message.get("limit") or SYNC_BATCH_SIZE),
+                                                                 SYNC_BATCH_SIZE),
+                                                       up_to=None if up_to is None else int(up_to))
+            return {"last_id": last_id, "rows": rows}, effects
+        if op == "count_statreps":
+            counts = [self.store.count_statreps(int(after_id), int(up_to), exclude_origin=node)
+                      for after_id, up_to in message.get("ranges") or []]
+            return {"counts": counts}, effects
+        if op == "push_handles":
+            result = self.store.import_handles(message.get("handles") or [], peer_is_central=False)
+            effects["handles"] = result["applied"] > 0
+            return result, effects
+        if op == "pull_handles":
+            as_of, rows = self.store.export_handles(message.get("since"))
+            return {"as_of": as_of, "handles": rows}, effects
+        raise ValueError(f"Unknown sync operation: {op}")
+
+
+class HttpLink:
+    def __init__(self, url, token, timeout=SYNC_TIMEOUT_SECONDS):
+        """POSTs sync messages to central's API (POST /api/v1/sync, bearer token named after the node)"""
+        self.url = url.rstrip("/") + "/api/v1/sync"
+        self.token = token
+        self.timeout = timeout
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def exchange(self, data):
+        request = urllib.request.Request(self.url, data=data, method="POST", headers={
+            "Authorization": f"Bearer {self.token}", "Content-Type": "application/octet-stream"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            reply = response.read()
+        self.bytes_sent += len(data)
+        self.bytes_received += len(reply)
+        return reply
+
+
+class SimulatedLink:
+    def __init__(self, responder, loss=0.0, latency=0.5, bandwidth=1200.0, seed=None):
+        """
+        An unreliable link to a SyncResponder for the simulation: each request
+        and each reply is lost with probability loss. Time is virtual - latency
+        seconds each way plus bytes / bandwidth (bytes per second).
+        """
+        self.responder = responder
+        self.loss = loss
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.rng = random.Random(seed)
+        self.seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.raw_bytes = 0
+        self.dropped = 0
+
+    def exchange(self, data):
+        self.seconds += self.latency + len(data) / self.bandwidth
+        self.bytes_sent += len(data)
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            raise ConnectionError("request lost")
+        message = decode_message(data)
+        reply, _ = self.responder.handle(message)
+        encoded = encode_message(reply)
+        self.raw_bytes += len(zlib.decompress(data)) + len(json.dumps(reply, separators=(",", ":")))
+        self.seconds += self.latency + len(encoded) / self.bandwidth
+        self.bytes_received += len(encoded)
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            raise ConnectionError("reply lost")
+        return encoded
+
+
+class SyncSession:
+    def __init__(self, store, link, peer=CENTRAL_NODE_ID, batch_size=SYNC_BATCH_SIZE, commit_lag=COMMIT_LAG):
+        """
+        One node's exchange with central: push our rows and handles, then pull
+        theirs. commit_lag: how long an id below a STATREP watermark may still
+        commit (None trusts the watermark - only right for a single writer)
+        """
+        self.store = store
+        self.link = link
+        self.peer = peer
+        self.batch_size = batch_size
+        self.commit_lag = commit_lag
+
+    def _call(self, op, **fields):
+        return decode_message(self.link.exchange(encode_message({"op": op, "node": self.store.node_id, **fields})))
+
+    def run(self):
+        """
+        Exchange until both sides are caught up or the link fails; progress up
+        to the failure is kept. Returns: (complete: bool, stats dict)
+        """
+        stats = {"pushed": 0, "pulled": 0, "duplicates": 0, "rejected": 0, "handles_sent": 0,
+                 "handles_applied": 0, "conflicts": 0}
+        try:
+            self._push_statreps(stats)
+            self._push_handles(stats)
+            self._pull_statreps(stats)
+            self._pull_handles(stats)
+            return True, stats
+        except (OSError, ValueError, zlib.error) as e:   # ConnectionError/URLError are OSErrors
+            logger.warning(f"Sync with {self.peer} interrupted: {str(e)}")
+            return False, stats
+
+    def _window(self, name, watermark):
+        """[settled, pending, rows in (settled, pending], rows in (pending, watermark]]"""
+        value = self.store.get_watermark(self.peer, f"{name}_window")
+        if value is None:   # nothing recorded yet: trust the watermark
+            return [watermark, watermark, 0, 0]
+        return [int(n) for n in value.split(" ")]
+
+    def _counts(self, name, ranges):
+        if name == "pull_statreps":
+            return self._call("count_statreps", ranges=ranges)["counts"]
+        return [self.store.count_statreps(after_id, up_to, own_only=True) for after_id, up_to in ranges]
+
+    def _transfer(self, name, after_id, up_to, stats):
+        """One batch of STATREPs with ids in (after_id, up_to]. Returns: (last_id, rows in the batch)"""
+        if name == "pull_statreps":
+            reply = self._call("pull_statreps", after_id=after_id, limit=self.batch_size, up_to=up_to)
+            if reply["rows"]:
+                result = self.store.import_statreps(reply["rows"])
+                stats["pulled"] += result["stored"]
+                stats["duplicates"] += result["duplicates"]
+                stats["rejected"] += len(result["rejected"])
+            return reply["last_id"], len(reply["rows"])
+        last_id, rows = self.store.export_statreps(after_id, own_only=True, limit=self.batch_size, up_to=up_to)
+        if rows:
+            reply = self._call("push_statreps", rows=rows)
+            stats["pushed"] += reply["stored"]
+            stats["duplicates"] += reply["duplicates"]
+            stats["rejected"] += len(reply["rejected"])
+            for index, error in reply["rejected"]:
+                logger.warning(f"Central rejected STATREP {rows[index][ORIGIN_INDEX + 1]}: {error}")
+        return last_id, len(rows)
+
+    def _replicate(self, name, stats, recheck):
+        """
+        One STATREP pass: re-check the ranges below the watermark (see the
+        module comment) if recheck, then send or fetch everything past it
+        """
+        watermark = int(self.store.get_watermark(self.peer, name, 0))
+        started = self.store.now()
+        window = self._window(name, watermark) if recheck else None
+        if window:
+            settled, pending = window[:2]
+            ranges = [(settled, pending), (pending, watermark)]
+            checks = [n for n, (after_id, up_to) in enumerate(ranges) if after_id < up_to]
+            counts = self._counts(name, [ranges[n] for n in checks]) if checks else []
+            for n, count in zip(checks, counts):
+                if count != window[2 + n]:
+                    after_id, up_to = ranges[n]
+                    rows = 0
+                    while True:
+                        last_id, batch = self._transfer(name, after_id, up_to, stats)
+                        if not batch:
+                            break
+                        rows, after_id = rows + batch, last_id
+                    window[2 + n] = rows
+                    self.store.set_watermark(self.peer, f"{name}_window", " ".join(map(str, window)))
+
+        after_id = watermark
+        while True:
+            last_id, batch = self._transfer(name, after_id, None, stats)
+            if not batch:
+                break
+            after_id = last_id
+            if window:
+                window[3] += batch
+                self.store.set_watermark(self.peer, f"{name}_window", " ".join(map(str, window)))
+            self.store.set_watermark(self.peer, name, after_id)
+
+        if window:
+            pending_at = self.store.get_watermark(self.peer, f"{name}_pending_at")
+            if pending_at is None or started - _utc(pending_at) >= self.commit_lag:
+                # (settled, pending] was checked by this pass: it settles, and the watermark becomes pending
+                window = [window[1], after_id, window[3], 0]
+                self.store.set_watermark(self.peer, f"{name}_window", " ".join(map(str, window)))
+                self.store.set_watermark(self.peer, f"{name}_pending_at", self.store.now().isoformat())
+
+    def _push_statreps(self, stats):
+        # SQLite has one writer at a time, so its ids commit in order
+        self._replicate("push_statreps", stats, self.commit_lag is not None and self.store.dialect == "oracle")
+
+    def _pull_statreps(self, stats):
+        self._replicate("pull_statreps", stats, self.commit_lag is not None)
+
+    def _push_handles(self, stats):
+        since = self.store.get_watermark(self.peer, "push_handles")
+        as_of, rows = self.store.export_handles(since)
+        if rows:
+            reply = self._call("push_handles", handles=rows)
+            stats["handles_sent"] += len(rows)
+            stats["conflicts"] += reply["conflicts"]
+        self.store.set_watermark(self.peer, "push_handles", as_of)
+
+    def _pull_handles(self, stats):
+        since = self.store.get_watermark(self.peer, "pull_handles")
+        reply = self._call("pull_handles", since=since)
+        result = self.store.import_handles(reply["handles"], peer_is_central=True)
+        stats["handles_applied"] += result["applied"]
+        stats["conflicts"] += result["conflicts"]
+        self.store.set_watermark(self.peer, "pull_handles", reply["as_of"])
+
+
+def _insert_local(store, records, first_id=None):
+    """
+    Simulation: reports entered at a node (origin NULL, like the form).
+    first_id: store them under consecutive ids from there instead of the next ones
+    """
+    fields = SYNC_FIELDS[:ORIGIN_INDEX]
+    rows = [[store._time(record["datetime_group"]) if field == "datetime_group" else record.get(field)
+             for field in fields] for record in records]
+    if first_id is not None:
+        fields = ("id",) + fields
+        rows = [[first_id + n] + row for n, row in enumerate(rows)]
+    store.cursor.executemany(
+        f"INSERT INTO statrep ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})", rows)
+    store.connection.commit()
+
+def _next_id(store):
+    store.cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM statrep")
+    return store.cursor.fetchone()[0]
+
+def _sqlite_store(node_id):
+    connection = sqlite3.connect(":memory:")
+    SchemaManager(connection, "sqlite").apply()
+    return SyncStore(connection, "sqlite", node_id)
+
+def _keys(store):
+    store.cursor.execute(to_sqlite_sql("SELECT NVL(origin, :1), NVL(origin_id, id) FROM statrep"), [store.node_id])
+    return store.cursor.fetchall()
+
+def simulate(nodes=5, reports=2000, loss=0.2, bandwidth=1200.0, latency=0.5, rounds=10, seed=7,
+             late=0.2, recheck=True):
+    """
+    Central plus field nodes on in-memory SQLite stand-ins, linked by lossy
+    simulated links. Reports arrive at every node (and central) between sync
+    rounds; PINs change on both sides. At central, the fraction late of each
+    round's reports commits out of id order: their ids come before that
+    round's other reports, but they only become visible after the nodes have
+    synced, like a slow transaction on the production database. Syncs until
+    every database converges, then checks that all hold the same reports
+    exactly once and the same PINs.
+    Returns: stats dict (raises AssertionError if they diverge)
+    """
+    from statrep_codec_v3_prod import CodecDictionary, sample_records
+    logger.setLevel(logging.ERROR)   # lost messages and PIN conflicts are the point here
+    rng = random.Random(seed)
+    dictionary = CodecDictionary([f"N{i}CALL" for i in range(200)], [f"State {i}" for i in range(10)],
+                                 [f"Neighborhood {i}" for i in range(40)])
+    central = _sqlite_store(CENTRAL_NODE_ID)
+    responder = SyncResponder(central)
+    stores = [_sqlite_store(f"node{n}") for n in range(nodes)]
+    links = [SimulatedLink(responder, loss, latency, bandwidth, seed=seed + n) for n in range(nodes)]
+    everyone = [central] + stores
+
+    central.cursor.executemany(
+        "INSERT INTO handles (handle, pin_hash, pin_changed_at, modified_at) VALUES (?, ?, ?, ?)",
+        [(handle, f"pin-{handle}", "2025-01-01 00:00:00", "2025-01-01 00:00:00") for handle in dictionary.handles])
+    central.connection.commit()
+
+    # Rounds are milliseconds apart, so no lag: a late commit lands within its round
+    lag = timedelta(0) if recheck else None
+    pending = sample_records(reports, dictionary, seed=seed)
+    per_round = -(-reports // rounds)
+    started = time.perf_counter()
+    interrupted = 0
+    for round_number in range(1, rounds + 1):
+        batch, pending = pending[:per_round], pending[per_round:]
+        at_central = []
+        for record in batch:
+            store = rng.choice(everyone)
+            if store is central:
+                at_central.append(record)
+            else:
+                _insert_local(store, [record])
+        held = at_central[:int(len(at_central) * late)]
+        reserved = _next_id(central)
+        _insert_local(central, at_central[len(held):], first_id=reserved + len(held))
+        for store in rng.sample(everyone, 2):   # the same handle re-PINned at two places
+            handle = rng.choice(dictionary.handles)
+            changed = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=round_number)
+            store.cursor.execute(
+                to_sqlite_sql("""UPDATE handles SET pin_hash = :1, pin_changed_at = :2,
+                                 modified_at = SYS_EXTRACT_UTC(SYSTIMESTAMP) WHERE handle = :3"""),
+                [f"pin-{handle}-{store.node_id}-{round_number}", store._time(changed), handle])
+            store.connection.commit()
+        for store, link in zip(stores, links):
+            interrupted += not SyncSession(store, link, commit_lag=lag).run()[0]
+        _insert_local(central, held, first_id=reserved)   # the slow transaction commits
+    # link comes back for good: one complete session per node gets everything to
+    # central, a second gets central's copy of everyone else's reports back out
+    for _ in range(2):
+        for store, link in zip(stores, links):
+            while not SyncSession(store, link, commit_lag=lag).run()[0]:
+                interrupted += 1
+    wall = time.perf_counter() - started
+
+    expected = sorted(_keys(central))
+    assert len(expected) == reports, f"central has {len(expected)} reports, expected {reports}"
+    assert len(set(expected)) == len(expected), "duplicate reports at central"
+    pins = sorted(central.cursor.execute("SELECT handle, pin_hash FROM handles").fetchall())
+    for store in stores:
+        assert sorted(_keys(store)) == expected, f"{store.node_id} diverged from central"
+        assert sorted(store.cursor.execute("SELECT handle, pin_hash FROM handles").fetchall()) == pins, \
+            f"{store.node_id} handles diverged from central"
+
+    link_seconds = max(link.seconds for link in links)
+    wire = sum(link.bytes_sent + link.bytes_received for link in links)
+    raw = sum(link.raw_bytes for link in links)
+    transferred = reports * nodes   # each report lands on every database but the one it was entered at
+    return {"nodes": nodes, "reports": reports, "rounds": rounds, "interrupted_sessions": interrupted,
+            "dropped_messages": sum(link.dropped for link in links), "wire_bytes": wire, "raw_bytes": raw,
+            "compression": round(raw / wire, 2) if wire else None, "link_seconds": round(link_seconds, 1),
+            "rows_per_link_second": round(transferred / link_seconds, 1) if link_seconds else None,
+            "wall_seconds": round(wall, 2), "rows_per_wall_second": round(transferred / wall)}
+
+
+def _node_store(sqlite_path, node_id):
+    if sqlite_path:
+        connection = sqlite3.connect(sqlite_path)
+        SchemaManager(connection, "sqlite").apply()
+        return SyncStore(connection, "sqlite", node_id)
+    return SyncStore(acquire_connection("write"), "oracle", node_id)
+
+def main():
+    parser = argparse.ArgumentParser(description="Store-and-forward STATREP replication with central")
+    parser.add_argument("--central", metavar="URL", help="Central API base URL, e.g. https://statrep.example:8200")
+    parser.add_argument("--token", default=os.getenv("STATREP_SYNC_TOKEN"),
+                        help="This node's API token (its name at central must be the node id)")
+    parser.add_argument("--sqlite", metavar="PATH", help="Node database is a SQLite file instead of Oracle")
+    parser.add_argument("--every", type=float, metavar="MINUTES", help="Keep running and sync every N minutes")
+    parser.add_argument("--simulate", action="store_true", help="Run the intermittent-link simulation")
+    parser.add_argument("--nodes", type=int, default=5)
+    parser.add_argument("--reports", type=int, default=2000)
+    parser.add_argument("--loss", type=float, default=0.2, help="Probability each message is lost")
+    parser.add_argument("--bandwidth", type=float, default=1200.0, help="Link bytes per second")
+    parser.add_argument("--late", type=float, default=0.2,
+                        help="Fraction of central's reports that commit out of id order")
+    parser.add_argument("--no-recheck", action="store_true",
+                        help="Trust the watermarks (shows what late commits do without the re-check)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.simulate:
+        stats = simulate(args.nodes, args.reports, args.loss, args.bandwidth, late=args.late, recheck=not args.no_recheck)
+        print(f"✓ {stats['nodes']} nodes converged on {stats['reports']} reports in {stats['rounds']} rounds "
+              f"({stats['interrupted_sessions']} interrupted sessions, {stats['dropped_messages']} lost messages)")
+        print(f"  {stats['wire_bytes']:,} bytes on the wire, {stats['raw_bytes']:,} uncompressed "
+              f"({stats['compression']}x); {stats['rows_per_link_second']} rows/s of link time, "
+              f"{stats['rows_per_wall_second']:,} rows/s processing")
+        return 0
+
+    if not args.central or not args.token:
+        parser.error("--central and --token are required (or --simulate)")
+    node_id = get_node_id()
+    if node_id == CENTRAL_NODE_ID:
+        parser.error(f"Set {NODE_ID_ENV} to this node's id")
+    store = _node_store(args.sqlite, node_id)
+    link = HttpLink(args.central, args.token)
+    while True:
+        complete, stats = SyncSession(store, link).run()
+        print(f"{'✓' if complete else '✗'} pushed {stats['pushed']}, pulled {stats['pulled']}, "
+              f"{stats['duplicates']} duplicates, {stats['handles_applied']} handle updates, "
+              f"{stats['conflicts']} PIN conflicts")
+        if not args.every:
+            return 0 if complete else 1
+        time.sleep(args.every * 60)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+import db_config_v3_prod as config_module
+from db_config_v3_prod import acquire_connection, read_replica_configured, default_pool_max
+from manage_schema_v3_prod import SchemaManager
+from statrep_db_v3_prod import StatrepDatabase
+
+REPORTED = datetime(2025, 3, 1, 18, 30, tzinfo=timezone.utc)
+
+
+def make_standin(path):
+    connection = sqlite3.connect(path)
+    SchemaManager(connection, "sqlite").apply()
+    connection.close()
+    return str(path)
+
+
+@pytest.fixture
+def split(tmp_path, monkeypatch):
+    """Primary and replica as two stand-in files"""
+    write_path = make_standin(tmp_path / "write.sqlite")
+    read_path = make_standin(tmp_path / "read.sqlite")
+    monkeypatch.setenv("STATREP_DB_WRITE_SQLITE", write_path)
+    monkeypatch.setenv("STATREP_DB_READ_SQLITE", read_path)
+    return write_path, read_path
+
+
+def insert(db, handle, state, neighborhood, key):
+    return db.insert_statrep(handle, REPORTED, state, neighborhood, "FN20xb", "B", idempotency_key=key)
+
+
+def test_roles_get_their_own_file(split):
+    write_path, read_path = split
+    assert read_replica_configured()
+    assert acquire_connection("write").path == write_path
+    assert acquire_connection("read").path == read_path
+
+
+def test_single_file_serves_both_roles(tmp_path, monkeypatch):
+    path = make_standin(tmp_path / "one.sqlite")
+    monkeypatch.setenv("STATREP_DB_WRITE_SQLITE", path)
+    monkeypatch.delenv("STATREP_DB_READ_SQLITE", raising=False)
+    assert not read_replica_configured()
+    assert acquire_connection("read").path == path
+
+
+def test_writes_go_to_the_primary_and_reads_to_the_replica(split):
+    db = StatrepDatabase()
+    assert db.connect() == (True, None)
+    success, record_id = insert(db, "N0SPLIT", "Split", "Primary", "split-1")
+    assert success and record_id == 1
+
+    # Just written: read-your-writes keeps this location on the primary
+    success, rows = db.get_latest_statreps_by_location("Split", "Primary", use_cache=False)
+    assert [row.amcon_handle for row in rows] == ["N0SPLIT"]
+    assert rows[0].datetime_group == datetime(2025, 3, 1, 18, 30)
+    assert rows[0].grid_square == "FN20xb"
+
+    # Anything else is read from the replica file (rows replicated there)
+    replica = sqlite3.connect(split[1])
+    replica.execute("""INSERT INTO statrep (amcon_handle, datetime_group, state, neighborhood, conditions)
+                       VALUES ('N0REPL', '2025-03-01 18:00:00', 'Split', 'Replica', 'A')""")
+    replica.commit()
+    replica.close()
+    success, rows = db.get_latest_statreps_by_location("Split", "Replica", use_cache=False)
+    assert [row.amcon_handle for row in rows] == ["N0REPL"]
+    assert db._replica is not None
+    success, rows = db.get_latest_statreps_by_location("Split", "Nowhere", use_cache=False)
+    assert rows == []
+    db.close()
+
+
+def test_batch_insert_reports_reused_keys_per_row(split):
+    db = StatrepDatabase()
+    db.connect()
+    insert(db, "N0BATCH", "Split", "Batch", "split-batch-1")
+    record = {"amcon_handle": "N0BATCH", "datetime_group": REPORTED, "state": "Split", "neighborhood": "Batch",
+              "location": "EM10", "conditions": "A"}
+    success, (inserted, errors) = db.insert_statreps_batch([
+        dict(record, idempotency_key="split-batch-2"),
+        dict(record, idempotency_key="split-batch-1"),
+        dict(record, idempotency_key="split-batch-3"),
+    ])
+    assert success and inserted == 2
+    assert [offset for offset, _ in errors] == [1]
+    assert "ORA-00001" in errors[0][1]
+    assert db.get_max_statrep_id() == (True, 3)
+    db.close()
+
+
+def test_pool_is_sized_from_sessions_writers_and_services(monkeypatch):
+    monkeypatch.setenv(config_module.EXPECTED_SESSIONS_ENV, "50")
+    assert default_pool_max() == 50 * 2 + config_module.WRITER_COUNT + config_module.SERVICE_CONNECTIONS
+    monkeypatch.setenv("STATREP_DB_WRITE_POOL_MAX", "12")
+    assert config_module.get_settings("write").pool_max == 12
+
+
+def test_pool_waits_a_bounded_time_for_a_connection(monkeypatch):
+    created = {}
+    monkeypatch.setattr(config_module.oracledb, "create_pool", lambda **kwargs: created.update(kwargs) or object())
+    monkeypatch.setattr(config_module, "_pools", {})
+    monkeypatch.delenv("STATREP_DB_WRITE_SQLITE", raising=False)
+    config_module.get_pool("write")
+    assert created["getmode"] == config_module.oracledb.POOL_GETMODE_TIMEDWAIT
+    assert created["wait_timeout"] == config_module.POOL_WAIT_TIMEOUT_MS
+    assert created["max"] == default_pool_max()
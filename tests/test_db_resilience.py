@@ -0,0 +1,154 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import statrep_db_v3_prod as db_module
+from db_resilience_v3_prod import DatabaseUnavailable
+from statrep_db_v3_prod import StatrepDatabase
+
+DROPPED = "DPY-4011: the database or network closed the connection"
+
+
+class FakeVar:
+    def __init__(self):
+        self.value = None
+
+    def getvalue(self):
+        return [self.value]
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowfactory = None
+        self.arraysize = 100
+
+    def _check(self):
+        if not self.connection.alive:
+            raise Exception(DROPPED)
+
+    def var(self, kind):
+        return FakeVar()
+
+    def execute(self, statement, params=None):
+        self._check()
+        self.connection.statements.append(statement.split()[0])
+        if params and isinstance(params[-1], FakeVar):
+            self.connection.server.last_id += 1
+            params[-1].value = self.connection.server.last_id
+
+    def fetchone(self):
+        self._check()
+        return (self.connection.server.last_id,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.alive = True
+        self.statements = []
+
+    def cursor(self):
+        if not self.alive:
+            raise Exception(DROPPED)
+        return FakeCursor(self)
+
+    def ping(self):
+        if not self.alive:
+            raise Exception(DROPPED)
+
+    def commit(self):
+        if not self.alive:
+            raise Exception(DROPPED)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.alive = False
+
+
+class FakeServer:
+    """Hands out connections like acquire_connection; drop() kills the current one"""
+    def __init__(self):
+        self.connections = []
+        self.last_id = 0
+        self.down = False
+
+    def acquire(self, role="write"):
+        if self.down:
+            raise Exception("DPY-6005: cannot connect to database")
+        self.connections.append(FakeConnection(self))
+        return self.connections[-1]
+
+    def drop(self):
+        self.connections[-1].alive = False
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(db_module, "acquire_connection", server.acquire)
+    yield server
+    # Leave the shared breaker closed for the next test
+    db = StatrepDatabase()
+    db.breaker.record_success()
+
+
+def connected(server):
+    db = StatrepDatabase()
+    assert db.connect() == (True, None)
+    return db
+
+
+def insert(db, key):
+    return db.insert_statrep("N0CALL", datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc), "TX", "Austin",
+                             "Main St", "A", idempotency_key=key)
+
+
+def test_insert_after_a_dropped_insert_reconnects(server):
+    db = connected(server)
+    assert insert(db, "resilience-1") == (True, 1)
+    server.drop()
+    success, error = insert(db, "resilience-2")
+    assert not success and "DPY-4011" in error
+    assert db.connection_lost
+    # cursor.var() used to hit the dropped cursor (None) here
+    assert insert(db, "resilience-3") == (True, 2)
+    assert len(server.connections) == 2
+    assert not db.connection_lost
+
+
+def test_cursor_attributes_resolve_against_the_new_cursor(server):
+    db = connected(server)
+    server.drop()
+    db.get_max_statrep_id()   # read-only: reconnects and retries
+    assert len(server.connections) == 2
+    server.drop()
+    db._mark_dead(Exception(DROPPED))
+    db.cursor.arraysize = 500
+    assert server.connections[-1].alive
+    assert db._raw_cursor.arraysize == 500
+
+
+def test_idle_connection_is_pinged_and_replaced(server):
+    db = connected(server)
+    server.drop()
+    db._last_used = 0
+    assert db.get_max_statrep_id() == (True, 0)
+    assert len(server.connections) == 2
+    assert server.connections[-1].statements == ["SELECT"]
+
+
+def test_attribute_access_fails_fast_while_the_database_is_down(server):
+    db = connected(server)
+    server.drop()
+    db._mark_dead(Exception(DROPPED))
+    server.down = True
+    with pytest.raises(DatabaseUnavailable):
+        db.cursor.var(int)
+    db.close()   # closing a dropped session doesn't try to reconnect
+    assert len(server.connections) == 1
@@ -0,0 +1,90 @@
+import csv
+import glob
+import gzip
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from export_statreps_v3_prod import export_statreps
+
+COLUMNS = ["id", "amcon_handle", "datetime_group", "comments"]
+PART_SIZE_MB = 16 / 1024  # 16 KB parts
+
+
+class ExportDatabase:
+    """iter_statreps over in-memory rows; fail_after raises mid-stream like a dropped connection"""
+
+    def __init__(self, count, fail_after=None):
+        rng = random.Random(5)
+        start = datetime(2025, 7, 4, 12, 0)
+        self.rows = [(n, f"N{n % 50}CALL", start + timedelta(minutes=n),
+                      "".join(rng.choice("abcdefghijklmnop ") for _ in range(120)))
+                     for n in range(1, count + 1)]
+        self.fail_after = fail_after
+
+    def iter_statreps(self, after_id=0, batch_size=1000, **filters):
+        for served, row in enumerate(row for row in self.rows if row[0] > after_id):
+            if self.fail_after is not None and served >= self.fail_after:
+                raise ConnectionError("DPY-4011: the database or network closed the connection")
+            yield COLUMNS, row
+
+
+def parts(out_dir, ext="csv"):
+    return sorted(glob.glob(os.path.join(out_dir, f"statrep_export-*.{ext}.gz")))
+
+
+def exported_ids(out_dir):
+    ids = []
+    for path in parts(out_dir):
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            assert next(reader) == COLUMNS
+            ids += [int(row[0]) for row in reader]
+    return ids
+
+
+def checkpoint(out_dir):
+    with open(os.path.join(out_dir, "statrep_export.state.json")) as f:
+        return json.load(f)
+
+
+def test_parts_roll_over_at_the_size_limit(tmp_path):
+    success, total = export_statreps(ExportDatabase(3000), str(tmp_path), part_size_mb=PART_SIZE_MB)
+    assert success and total == 3000
+    written = parts(str(tmp_path))
+    assert len(written) > 2
+    # Every part but the last reached the limit; none ran far past it
+    for path in written[:-1]:
+        assert 16 * 1024 <= os.path.getsize(path) < 2 * 16 * 1024 + 1024
+    assert exported_ids(str(tmp_path)) == list(range(1, 3001))
+    assert checkpoint(str(tmp_path))["last_id"] == 3000
+    assert checkpoint(str(tmp_path))["next_part"] == len(written) + 1
+
+
+def test_ndjson_parts_carry_column_names(tmp_path):
+    success, _ = export_statreps(ExportDatabase(10), str(tmp_path), fmt="ndjson")
+    assert success
+    with gzip.open(parts(str(tmp_path), "ndjson")[0], "rt", encoding="utf-8") as f:
+        first = json.loads(f.readline())
+    assert first["id"] == 1 and first["datetime_group"] == "2025-07-04T12:01:00+00:00"
+
+
+def test_resume_rewrites_the_partial_part(tmp_path):
+    success, error = export_statreps(ExportDatabase(3000, fail_after=1700), str(tmp_path),
+                                     part_size_mb=PART_SIZE_MB)
+    assert not success and "after 1700 rows" in error
+    saved = checkpoint(str(tmp_path))
+    assert 0 < saved["last_id"] < 1700
+
+    success, total = export_statreps(ExportDatabase(3000), str(tmp_path), part_size_mb=PART_SIZE_MB,
+                                     resume=True)
+    assert success and total == 3000 - saved["last_id"]
+    # No row lost or written twice across the failed run and the resumed one
+    assert exported_ids(str(tmp_path)) == list(range(1, 3001))
+
+
+def test_after_id_overrides_the_checkpoint(tmp_path):
+    success, total = export_statreps(ExportDatabase(100), str(tmp_path), after_id=60)
+    assert success and total == 40
+    assert exported_ids(str(tmp_path)) == list(range(61, 101))
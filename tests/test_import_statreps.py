@@ -0,0 +1,58 @@
+from import_statreps_v3_prod import _init_worker, parse_message, run_import
+
+HANDLES = ["N0CALL", "W1AW"]
+STATES = ["Texas"]
+NEIGHBORHOODS = ["Downtown"]
+
+MESSAGE = ("HANDLE: N0CALL\nDTG: 2025-07-04 08:05\nSTATE: Texas\nNEIGHBORHOOD: Downtown\n"
+           "LOCATION: EM12ab\nCONDITIONS: B\nPOWER: N\nWATER: Y\nCOMMENTS: bridge out")
+
+
+class KeyedDatabase:
+    """insert_statreps_batch with the unique idempotency_key of the real table"""
+
+    def __init__(self):
+        self.keys = set()
+
+    def insert_statreps_batch(self, records):
+        inserted, errors = 0, []
+        for offset, record in enumerate(records):
+            if record["idempotency_key"] in self.keys:
+                errors.append((offset, "ORA-00001: unique constraint (STATREP_IDEM_KEY_UX) violated"))
+            elif record["location"] == "BAD":
+                errors.append((offset, "ORA-12899: value too large for column"))
+            else:
+                self.keys.add(record["idempotency_key"])
+                inserted += 1
+        return True, (inserted, errors)
+
+
+def setup_module():
+    _init_worker(HANDLES, STATES, NEIGHBORHOODS)
+
+
+def test_retransmission_gets_the_same_key():
+    record, _ = parse_message(MESSAGE)
+    rewrapped, _ = parse_message("  " + MESSAGE.lower().replace("\n", "\r\n  ") + "\n")
+    assert record["idempotency_key"] == rewrapped["idempotency_key"]
+    assert len(record["idempotency_key"]) <= 64
+
+
+def test_key_follows_content_handle_and_dtg():
+    key = parse_message(MESSAGE)[0]["idempotency_key"]
+    assert parse_message(MESSAGE.replace("bridge out", "bridge open"))[0]["idempotency_key"] != key
+    assert parse_message(MESSAGE.replace("N0CALL", "W1AW"))[0]["idempotency_key"] != key
+    assert parse_message(MESSAGE.replace("08:05", "08:06"))[0]["idempotency_key"] != key
+
+
+def test_import_counts_duplicates_apart_from_rejects():
+    db = KeyedDatabase()
+    messages = [MESSAGE, MESSAGE.upper(), MESSAGE.replace("EM12ab", "BAD"), "STATREP/UNKNOWN/x"]
+    stats = run_import(messages, HANDLES, STATES, NEIGHBORHOODS, db=db, workers=1, batch_size=2)
+    assert stats["parsed"] == 3
+    assert stats["inserted"] == 1
+    assert stats["duplicates"] == 1
+    assert stats["rejected"] == 2
+
+    again = run_import([MESSAGE], HANDLES, STATES, NEIGHBORHOODS, db=db, workers=1)
+    assert again["inserted"] == 0 and again["duplicates"] == 1 and again["rejected"] == 0
@@ -0,0 +1,103 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from maidenhead_v3_prod import (distance_km, find_grid, grid_key, grid_to_latlon, latlon_to_grid,
+                                normalize_grid)
+from statrep_db_v3_prod import StatrepRow, locate_grid
+from statrep_nearby_v3_prod import GridSpatialIndex
+
+REPORTED = datetime(2025, 7, 4, 12, 0)
+
+
+@pytest.mark.parametrize("text, grid", [
+    ("fn20XB", "FN20xb"), (" EM12 ", "EM12"), ("fn20xb47", "FN20xb47"), ("RR99xx99", "RR99xx99"),
+    ("SA00", None), ("FN2", None), ("FN20x", None), ("FN20xb4", None), ("FN20yb", None), ("", None), (None, None),
+])
+def test_normalize_grid(text, grid):
+    assert normalize_grid(text) == grid
+
+
+def test_find_grid_in_free_text():
+    assert find_grid("Main St shelter, em10dx") == "EM10dx"
+    assert find_grid("2nd floor, FN20xb47 rear") == "FN20xb47"
+    assert find_grid("I-35 near exit 12") is None
+    assert find_grid("AFN20xb") is None     # part of a longer word
+    assert locate_grid("shelter EM12") == ("EM12", 32.5, -97.0)
+    assert locate_grid("no grid here") == (None, None, None)
+
+
+def test_grid_to_latlon_returns_the_square_center():
+    assert grid_to_latlon("FN20") == (40.5, -75.0)
+    lat, lon = grid_to_latlon("FN20xb")
+    assert lat == pytest.approx(40 + 1 / 24 + 1 / 48) and lon == pytest.approx(-76 + 23 / 12 + 1 / 24)
+    lat, lon = grid_to_latlon("FN20xb47")
+    assert lat == pytest.approx(40 + 1 / 24 + 7 / 240 + 1 / 480)
+    assert lon == pytest.approx(-76 + 23 / 12 + 4 / 120 + 1 / 240)
+    with pytest.raises(ValueError):
+        grid_to_latlon("not a grid")
+
+
+def test_latlon_to_grid_round_trips():
+    rng = random.Random(35)
+    for _ in range(2000):
+        lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        for precision in (4, 6, 8):
+            grid = latlon_to_grid(lat, lon, precision)
+            assert len(grid) == precision
+            assert latlon_to_grid(*grid_to_latlon(grid), precision) == grid
+    assert latlon_to_grid(90.0, 180.0, 4) == "RR99"    # clamped onto the grid
+
+
+def test_grid_key():
+    assert grid_key("fn20xb47") == ("FN", "FN20", "FN20xb")
+    assert grid_key("EM12") == ("EM", "EM12", None)
+    assert grid_key("nowhere") == (None, None, None)
+
+
+def test_distance_km():
+    assert distance_km(40, -75, 40, -75) == 0
+    assert distance_km(0, 0, 1, 0) == pytest.approx(math.pi * 6371.0 / 180)
+    assert distance_km(0, 0, 0, 180) == pytest.approx(math.pi * 6371.0)
+    assert distance_km(0, 179.5, 0, -179.5) == pytest.approx(distance_km(0, 0, 0, 1))
+    # Dallas to Houston, roughly 362 km
+    assert distance_km(32.7767, -96.7970, 29.7604, -95.3698) == pytest.approx(362, abs=3)
+
+
+def station(n, lat, lon, minutes=0):
+    return StatrepRow(id=n, amcon_handle=f"N{n}", datetime_group=REPORTED + timedelta(minutes=minutes),
+                      latitude=lat, longitude=lon)
+
+
+@pytest.mark.parametrize("lat, lon, radius_km", [
+    (32.8, -96.8, 150), (0.0, 179.8, 300), (-0.5, -179.9, 500), (78.0, 15.0, 800), (45.0, 0.0, 60),
+])
+def test_nearby_matches_a_full_scan(lat, lon, radius_km):
+    rng = random.Random(46)
+    rows = [station(n, rng.uniform(-85, 85), rng.uniform(-180, 180)) for n in range(1, 3001)]
+    rows += [station(n, lat + rng.uniform(-3, 3), (lon + rng.uniform(-6, 6) + 180) % 360 - 180)
+             for n in range(3001, 3401)]
+    index = GridSpatialIndex()
+    index.update(rows)
+
+    expected = sorted((distance_km(lat, lon, row.latitude, row.longitude), row.id) for row in rows
+                      if distance_km(lat, lon, row.latitude, row.longitude) <= radius_km)
+    found = [(distance, row.id) for distance, row in index.nearby(lat, lon, radius_km)]
+    assert found == expected and found
+    assert index.nearby(lat, lon, radius_km, limit=3) == index.nearby(lat, lon, radius_km)[:3]
+
+
+def test_newer_reports_move_or_remove_a_station():
+    index = GridSpatialIndex()
+    index.update([station(1, 32.5, -97.0, minutes=10)])
+    index.update([station(2, 40.5, -75.0, minutes=5)._replace(amcon_handle="N1")])   # older - ignored
+    assert [row.id for _, row in index.nearby(32.5, -97.0, 10)] == [1]
+
+    index.update([station(3, 40.5, -75.0, minutes=20)._replace(amcon_handle="N1")])  # moved
+    assert index.nearby(32.5, -97.0, 10) == []
+    assert [row.id for _, row in index.nearby(40.5, -75.0, 10)] == [3]
+
+    index.update([station(4, None, None, minutes=30)._replace(amcon_handle="N1")])   # no grid any more
+    assert len(index) == 0 and index.nearby(40.5, -75.0, 10) == []
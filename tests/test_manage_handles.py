@@ -0,0 +1,37 @@
+import sqlite3
+from manage_schema_v3_prod import SchemaManager
+from manage_handles_v3_prod import HandlesDatabase, hash_pin
+
+
+def make_handles_db():
+    manager = SchemaManager(sqlite3.connect(":memory:"), "sqlite")
+    manager.apply()
+    db = HandlesDatabase()
+    db.connection = manager.connection
+    db.cursor = manager.cursor
+    return db
+
+
+def add_directly(db, handle, modified_at):
+    """A handle written by another process - no hub message reaches this one"""
+    db.cursor.execute("INSERT INTO handles (handle, pin_hash, modified_at) VALUES (?, ?, ?)",
+                      (handle, hash_pin("1234"), modified_at))
+    db.connection.commit()
+
+
+def test_handles_added_elsewhere_show_up_without_invalidation():
+    db = make_handles_db()
+    add_directly(db, "W1AW", "2025-01-01 00:00:00")
+    assert db.get_all_handles() == (True, ["W1AW"])
+    add_directly(db, "N0CALL", "2025-01-02 00:00:00")
+    assert db.get_all_handles() == (True, ["N0CALL", "W1AW"])
+
+
+def test_unchanged_handles_are_served_from_the_cache():
+    db = make_handles_db()
+    add_directly(db, "W1AW", "2025-01-01 00:00:00")
+    db.get_all_handles()
+    queries = []
+    db.connection.set_trace_callback(queries.append)
+    assert db.get_all_handles() == (True, ["W1AW"])
+    assert queries == ["SELECT COUNT(*), MAX(modified_at) FROM handles"]
@@ -0,0 +1,75 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from manage_schema_v3_prod import SchemaManager
+from manage_retention_v3_prod import RetentionManager, prefix_pattern
+
+
+def make_stand_in(rows):
+    """rows: (handle, age in days)"""
+    manager = SchemaManager(sqlite3.connect(":memory:"), "sqlite")
+    manager.apply()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    manager.cursor.executemany(
+        """INSERT INTO statrep (amcon_handle, datetime_group, state, neighborhood, conditions)
+           VALUES (?, ?, 'Texas', 'Downtown', 'A')""",
+        [(handle, (now - timedelta(days=age)).isoformat(sep=" ")) for handle, age in rows])
+    manager.connection.commit()
+    return manager
+
+
+def handles(manager, table):
+    manager.cursor.execute(f"SELECT amcon_handle FROM {table} ORDER BY id")
+    return [row[0] for row in manager.cursor.fetchall()]
+
+
+def test_prefix_pattern_escapes_wildcards():
+    assert prefix_pattern("TEST-") == "TEST-%"
+    assert prefix_pattern("EX_1%") == "EX\\_1\\%%"
+
+
+def test_purge_only_touches_prefixed_exercise_handles():
+    manager = make_stand_in([("TEST-01", 10), ("TESTER1", 10), ("DRILLMAN", 10),
+                             ("DRILL-7", 10), ("TEST-02", 1)])
+    success, deleted = RetentionManager(manager, "sqlite").purge_exercise_data(days=7)
+    assert success and deleted == 2
+    assert handles(manager, "statrep") == ["TESTER1", "DRILLMAN", "TEST-02"]
+
+
+def test_archive_moves_only_rows_past_the_window():
+    manager = make_stand_in([("N0CALL", 45), ("N0CALL", 31), ("N0CALL", 2), ("W1AW", 40)])
+    retention = RetentionManager(manager, "sqlite")
+    success, moved = retention.archive_older_than(days=30, batch_size=2)
+    assert success and moved == 3
+    assert handles(manager, "statrep") == ["N0CALL"]
+    assert handles(manager, "statrep_archive") == ["N0CALL", "N0CALL", "W1AW"]
+    assert retention.slowest_batch_seconds > 0
+
+
+class LateCommitCursor:
+    """Cursor that makes an old row with a lower id visible right after the archive copy"""
+    def __init__(self, cursor, late_row):
+        self.cursor = cursor
+        self.late_row = late_row
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(sql, params)
+        if sql.lstrip().startswith("INSERT INTO statrep_archive") and self.late_row:
+            self.cursor.execute(
+                """INSERT INTO statrep (id, amcon_handle, datetime_group, state, neighborhood, conditions)
+                   VALUES (?, ?, ?, 'Texas', 'Downtown', 'A')""", self.late_row)
+            self.late_row = None
+
+
+def test_archive_keeps_a_row_that_commits_between_copy_and_delete():
+    manager = make_stand_in([("N0CALL", 45), ("N0CALL", 44), ("N0CALL", 43)])
+    manager.cursor.execute("DELETE FROM statrep WHERE id = 2")   # id 2 is still uncommitted elsewhere
+    old = (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=44)).isoformat(sep=" ")
+    db = type("Db", (), {"cursor": LateCommitCursor(manager.cursor, (2, "W1LATE", old)),
+                         "connection": manager.connection})()
+    success, moved = RetentionManager(db, "sqlite").archive_older_than(days=30)
+    assert success and moved == 3
+    assert handles(manager, "statrep") == []
+    assert handles(manager, "statrep_archive") == ["N0CALL", "W1LATE", "N0CALL"]
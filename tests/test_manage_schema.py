@@ -0,0 +1,70 @@
+import manage_schema_v3_prod as schema_module
+from manage_schema_v3_prod import SchemaManager
+
+
+class ScriptedOracle:
+    """Oracle connection that records DDL/DML and answers migration 3's checks"""
+    def __init__(self, data_type="TIMESTAMP(6)", counts=(3, 3, 3)):
+        self.data_type = data_type
+        self.counts = counts
+        self.statements = []
+        self.rowcount = 0
+        self._result = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.statements.append(sql)
+        self.rowcount = 2 if sql.startswith("UPDATE statrep SET datetime_group_tz") else 0
+        if "FROM schema_migrations" in sql:
+            self._result = [(1,), (2,)]
+        elif "FROM user_tab_columns" in sql:
+            self._result = [(self.data_type,)]
+        elif sql.startswith("SELECT NVL(MIN(id), 0)"):
+            self._result = [(1, 3)]
+        elif sql.startswith("SELECT COUNT(*), COUNT(datetime_group)"):
+            self._result = [self.counts]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def ran(connection, prefix):
+    return any(statement.startswith(prefix) for statement in connection.statements)
+
+
+def test_datetime_group_is_not_dropped_when_the_backfill_left_nulls():
+    connection = ScriptedOracle(counts=(3, 3, 2))
+    success, error = SchemaManager(connection, "oracle").apply(target=3)
+    assert not success and "backfill incomplete" in error
+    assert ran(connection, "UPDATE statrep SET datetime_group_tz")
+    assert not ran(connection, "ALTER TABLE statrep SET UNUSED")
+    assert not ran(connection, "ALTER TABLE statrep RENAME COLUMN")
+
+
+def test_an_already_converted_column_is_left_alone():
+    connection = ScriptedOracle(data_type="TIMESTAMP(6) WITH TIME ZONE")
+    success, error = SchemaManager(connection, "oracle").apply(target=3)
+    assert not success and "not a local TIMESTAMP" in error
+    assert not ran(connection, "ALTER TABLE statrep ADD")
+
+
+def test_a_complete_backfill_swaps_the_columns(monkeypatch):
+    monkeypatch.setattr(schema_module, "BACKFILL_BATCH_SIZE", 2)
+    connection = ScriptedOracle()
+    success, applied = SchemaManager(connection, "oracle").apply(target=3)
+    assert success and applied == [3]
+    updates = [s for s in connection.statements if s.startswith("UPDATE statrep SET datetime_group_tz")]
+    assert len(updates) == 2   # ids 1-2 and 3-4
+    assert ran(connection, "ALTER TABLE statrep SET UNUSED (datetime_group)")
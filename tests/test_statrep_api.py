@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import statrep_api_v3_prod as api_module
+from manage_handles_v3_prod import invalidate_handles_cache
+from statrep_api_v3_prod import StatrepApi, Authenticator, ReferenceLists, ApiError, Principal, parse_record
+from statrep_submit_queue_v3_prod import SubmissionTicket
+from statrep_db_v3_prod import StatrepRow
+from statrep_heatmap_v3_prod import ConditionHeatmap
+
+TOKEN_HEADERS = {"Authorization": "Bearer gateway-secret"}
+
+
+def make_api(monkeypatch, rows):
+    heatmap = ConditionHeatmap()
+    heatmap.update(rows)
+    monkeypatch.setattr(api_module, "get_condition_heatmap", lambda: heatmap)
+    tokens = {api_module.hashlib.sha256(b"gateway-secret").hexdigest(): "gateway"}
+    return StatrepApi(authenticator=Authenticator(tokens), references=object()), heatmap
+
+
+def report(row_id, handle, grid, condition):
+    return StatrepRow(id=row_id, amcon_handle=handle, datetime_group=datetime(2025, 1, 1, 12, row_id),
+                      grid_square=grid, conditions=condition)
+
+
+def test_heatmap_tile_is_json_with_an_etag(monkeypatch):
+    api, _ = make_api(monkeypatch, [report(1, "N0A", "EM10ab", "A"), report(2, "N0B", "EM12", "C")])
+    status, body, headers = api.dispatch("GET", "/api/v1/heatmap/em", TOKEN_HEADERS, b"")
+    assert status == 200
+    assert headers["Content-Type"] == "application/json"
+    tile = json.loads(body)
+    assert tile["total"] == {"A": 1, "B": 0, "C": 1}
+    assert tile["subsquares"] == {"EM10ab": {"A": 1, "B": 0, "C": 0}}
+
+
+def test_unchanged_tile_answers_304_until_a_report_lands(monkeypatch):
+    api, heatmap = make_api(monkeypatch, [report(1, "N0A", "EM10", "A")])
+    _, _, headers = api.dispatch("GET", "/api/v1/heatmap", TOKEN_HEADERS, b"")
+    polling = dict(TOKEN_HEADERS, **{"If-None-Match": headers["ETag"]})
+    status, body, _ = api.dispatch("GET", "/api/v1/heatmap", polling, b"")
+    assert (status, body) == (304, b"")
+
+    heatmap.update([report(2, "N0A", "EM10", "B")])
+    status, body, headers = api.dispatch("GET", "/api/v1/heatmap", polling, b"")
+    assert status == 200
+    assert json.loads(body)["fields"] == {"EM": {"A": 0, "B": 1, "C": 0}}
+    assert headers["ETag"] != polling["If-None-Match"]
+
+
+def test_other_fields_keep_their_etag(monkeypatch):
+    api, heatmap = make_api(monkeypatch, [report(1, "N0A", "EM10", "A")])
+    _, _, headers = api.dispatch("GET", "/api/v1/heatmap/EM", TOKEN_HEADERS, b"")
+    heatmap.update([report(2, "N0B", "FN20", "C")])
+    polling = dict(TOKEN_HEADERS, **{"If-None-Match": headers["ETag"]})
+    assert api.dispatch("GET", "/api/v1/heatmap/EM", polling, b"")[0] == 304
+
+
+def test_handles_change_forgets_verified_pins():
+    auth = Authenticator({})
+    auth._verified[("N0CALL", "old-pin-hash")] = time.monotonic() + 300
+    invalidate_handles_cache()
+    assert auth._verified == {}
+
+
+def test_reference_refresh_does_not_hold_up_other_requests():
+    references = ReferenceLists(ttl=0)
+    references._lists["handles"] = (time.monotonic() - 1, {"N0CALL": "N0CALL"})
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        loading.set()
+        release.wait(5)
+        return {"N0CALL": "N0CALL", "N1CALL": "N1CALL"}
+
+    references._load_handles = slow_load
+    refresher = threading.Thread(target=references.handles)
+    refresher.start()
+    assert loading.wait(5)
+    started = time.monotonic()
+    assert references.handles() == {"N0CALL": "N0CALL"}   # the previous list, without waiting
+    assert time.monotonic() - started < 1
+    release.set()
+    refresher.join(5)
+    assert "N1CALL" in references._lists["handles"][1]
+
+
+class SlowQueue:
+    def __init__(self):
+        self.tickets = []
+
+    def submit(self, record, on_done=None, run_callback=None):
+        ticket = SubmissionTicket(record["amcon_handle"], record, on_done, run_callback)
+        self.tickets.append(ticket)
+        return True, ticket
+
+    def position(self, ticket):
+        return 1
+
+
+class References:
+    def handles(self):
+        return {"N0CALL": "N0CALL", "W1AW": "W1AW"}
+
+    def locations(self):
+        return {"TEXAS": "Texas"}, {"DOWNTOWN": "Downtown"}
+
+
+def submission(**fields):
+    return dict({"amcon_handle": "N0CALL", "datetime_group": "2025-01-01T12:00:00+00:00", "state": "Texas",
+                 "neighborhood": "Downtown", "location": "Main St", "conditions": "A",
+                 "idempotency_key": "k/1"}, **fields)
+
+
+def test_slow_submit_answers_202_and_the_status_url_follows_it(monkeypatch):
+    api, _ = make_api(monkeypatch, [])
+    queue = SlowQueue()
+    monkeypatch.setattr(api_module, "get_submission_queue", lambda: queue)
+    monkeypatch.setattr(api_module, "SUBMIT_WAIT_SECONDS", 0.01)
+    api.references = References()
+    report = submission()
+
+    status, body, headers = api.dispatch("POST", "/api/v1/statreps", TOKEN_HEADERS, json.dumps(report).encode())
+    assert status == 202
+    assert headers["Location"] == body["status_url"] == "/api/v1/statreps/status/k%2F1"
+    status, body, _ = api.dispatch("GET", headers["Location"], TOKEN_HEADERS, b"")
+    assert (status, body["status"]) == (200, "queued")
+
+    ticket = queue.tickets[0]
+    ticket.success, ticket.result = True, 42
+    ticket.done.set()
+    status, body, _ = api.dispatch("GET", headers["Location"], TOKEN_HEADERS, b"")
+    assert (status, body["status"], body["id"]) == (200, "stored", 42)
+
+
+@pytest.mark.parametrize("conditions", [None, "", "-"])
+def test_submission_without_conditions_is_rejected_up_front(conditions):
+    states, neighborhoods = References().locations()
+    with pytest.raises(ValueError, match="missing conditions"):
+        parse_record(submission(conditions=conditions), Principal("token", "gateway"),
+                     References().handles(), states, neighborhoods)
+
+
+def test_failed_insert_does_not_show_database_errors(monkeypatch):
+    api, _ = make_api(monkeypatch, [])
+    queue = SlowQueue()
+    failed = "ORA-01400: cannot insert NULL into (\"STATREP\".\"STATREP\".\"CONDITIONS\")"
+
+    def submit(record, on_done=None, run_callback=None):
+        accepted, ticket = SlowQueue.submit(queue, record, on_done, run_callback)
+        ticket.success, ticket.result = False, failed
+        ticket.done.set()
+        return accepted, ticket
+
+    monkeypatch.setattr(queue, "submit", submit)
+    monkeypatch.setattr(api_module, "get_submission_queue", lambda: queue)
+    api.references = References()
+    with pytest.raises(ApiError) as raised:
+        api.dispatch("POST", "/api/v1/statreps", TOKEN_HEADERS, json.dumps(submission()).encode())
+    assert raised.value.status == 500
+    assert "ORA-" not in raised.value.message
+
+
+def test_status_from_the_table_only_finds_the_handles_own_submission(monkeypatch):
+    api, _ = make_api(monkeypatch, [])
+    stored = {("k-w1aw", "W1AW"): 7}
+
+    class Database:
+        def __init__(self, role):
+            pass
+
+        def connect(self):
+            return True, None
+
+        def get_statrep_id_for_key(self, key, amcon_handle=None):
+            return stored.get((key, amcon_handle or "W1AW"))
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(api_module, "StatrepDatabase", Database)
+    monkeypatch.setattr(api.auth, "authenticate", lambda headers: Principal("handle", "N0CALL"))
+    with pytest.raises(ApiError) as raised:
+        api.dispatch("GET", "/api/v1/statreps/status/k-w1aw", {}, b"")
+    assert raised.value.status == 404
+    monkeypatch.setattr(api.auth, "authenticate", lambda headers: Principal("handle", "W1AW"))
+    assert api.dispatch("GET", "/api/v1/statreps/status/k-w1aw", {}, b"")[1]["id"] == 7
@@ -0,0 +1,99 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import statrep_cache_v3_prod
+from manage_schema_v3_prod import SchemaManager
+from statrep_cache_v3_prod import IdempotencyCache, LocationResultCache, get_location_cache
+from statrep_db_v3_prod import StatrepDatabase
+from statrep_hub_v3_prod import TOPIC_LOCATION_CHANGED, _deliver
+
+KEY = ("Texas", "Downtown")
+
+
+def test_entry_is_reused_only_at_its_version():
+    cache = LocationResultCache()
+    cache.put(KEY, (10, 3), ["a", "b", "c"])
+    assert cache.get(KEY, (10, 3)) == ["a", "b", "c"]
+    assert cache.get(KEY, (11, 4)) is None      # an insert moved the max id
+    assert cache.get(KEY, (10, 2)) is None      # an archive or purge moved the count
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_lru_and_row_bounds():
+    cache = LocationResultCache(max_entries=2, max_rows=5)
+    cache.put(("TX", "A"), 1, [1, 2])
+    cache.put(("TX", "B"), 1, [1, 2])
+    cache.get(("TX", "A"), 1)
+    cache.put(("TX", "C"), 1, [1])              # over max_entries: B is least recently used
+    assert cache.get(("TX", "B"), 1) is None
+    cache.put(("TX", "D"), 1, [1, 2, 3, 4])     # over max_rows: evicts until it fits
+    assert cache.stats()["rows"] <= 5
+    cache.put(("TX", "E"), 1, list(range(6)))   # bigger than the whole cache - not held
+    assert cache.get(("TX", "E"), 1) is None
+
+
+def test_invalidate_reaches_the_other_workers(monkeypatch):
+    published = []
+    monkeypatch.setattr(statrep_cache_v3_prod, "publish", lambda topic, payload: published.append((topic, payload)))
+    cache = LocationResultCache()
+    cache.put(KEY, 1, ["row"])
+    cache.invalidate(KEY)
+    assert cache.get(KEY, 1) is None
+    assert published == [(TOPIC_LOCATION_CHANGED, KEY)]
+
+    # And a message from another worker drops the entry here, without echoing it back
+    get_location_cache().put(KEY, 1, ["row"])
+    _deliver(TOPIC_LOCATION_CHANGED, list(KEY))
+    assert get_location_cache().get(KEY, 1) is None
+    assert len(published) == 1
+
+
+def test_idempotency_keys_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(statrep_cache_v3_prod.time, "monotonic", lambda: now[0])
+    cache = IdempotencyCache(ttl=60, max_entries=2)
+    cache.put("k1", 1, broadcast=False)
+    assert cache.get("k1") == 1
+    now[0] += 61
+    assert cache.get("k1") is None
+    cache.put("k2", 2, broadcast=False)
+    cache.put("k3", 3, broadcast=False)
+    cache.put("k4", 4, broadcast=False)
+    assert cache.get("k2") is None and len(cache) == 2
+
+
+def test_rows_written_elsewhere_move_the_version_stamp(tmp_path, monkeypatch):
+    path = str(tmp_path / "standin.sqlite")
+    connection = sqlite3.connect(path)
+    SchemaManager(connection, "sqlite").apply()
+    connection.close()
+    monkeypatch.setenv("STATREP_DB_WRITE_SQLITE", path)
+    monkeypatch.delenv("STATREP_DB_READ_SQLITE", raising=False)
+    get_location_cache().clear()
+
+    reported = datetime(2025, 3, 1, 18, 30, tzinfo=timezone.utc)
+    db = StatrepDatabase()
+    assert db.connect() == (True, None)
+    try:
+        db.insert_statrep("N0CALL", reported, "Texas", "Downtown", "Main St", "A")
+        _, first = db.get_latest_statreps_by_location(*KEY)
+        _, again = db.get_latest_statreps_by_location(*KEY)
+        assert again == first and get_location_cache().stats()["hits"] == 1
+
+        # Another process inserts and its invalidation never arrives here
+        other = sqlite3.connect(path)
+        other.execute("""INSERT INTO statrep (amcon_handle, datetime_group, state, neighborhood, location, conditions)
+                         VALUES ('W1AW', '2025-03-01 19:00:00', 'Texas', 'Downtown', 'Elm St', 'B')""")
+        other.commit()
+        _, fresh = db.get_latest_statreps_by_location(*KEY)
+        assert [row.amcon_handle for row in fresh] == ["W1AW", "N0CALL"]
+
+        # Archiving an older row leaves the max id alone; the count still moves the stamp
+        other.execute("DELETE FROM statrep WHERE amcon_handle = 'N0CALL'")
+        other.commit()
+        other.close()
+        _, after_archive = db.get_latest_statreps_by_location(*KEY)
+        assert [row.amcon_handle for row in after_archive] == ["W1AW"]
+    finally:
+        db.close()
+        get_location_cache().clear()
@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from statrep_codec_v3_prod import (CodecDictionary, CodecError, _sample_dictionary, armor, dearmor,
+                                   decode_batch, decode_record, encode_batch, encode_record,
+                                   sample_records)
+
+
+@pytest.fixture(scope="module")
+def dictionary():
+    return _sample_dictionary()
+
+
+@pytest.fixture(scope="module")
+def records(dictionary):
+    """Random records plus the edge cases: literals, empty location, epoch, grid case"""
+    records = sample_records(2000, dictionary, seed=7)
+    records += [
+        dict(records[0], amcon_handle="W9UNLISTED", state="Guam", neighborhood="Off-list Hollow",
+             location="ferry dock ✓", comments="unicode ok – ünïcode"),
+        dict(records[1], location="", comments=None,
+             datetime_group=datetime(2020, 1, 1, tzinfo=timezone.utc)),
+        dict(records[2], location="FN20", datetime_group=datetime(2031, 12, 31, 23, 59, tzinfo=timezone.utc)),
+        dict(records[3], location="fn20XB"),  # not canonical case - must survive as text
+    ]
+    for record in records:
+        record["datetime_group"] = record["datetime_group"].replace(second=0, microsecond=0)
+    return records
+
+
+@pytest.mark.parametrize("size", [None, 1, 0])
+def test_batch_round_trip(dictionary, records, size):
+    batch = records if size is None else records[:size]
+    data = encode_batch(batch, dictionary)
+    assert decode_batch(data, dictionary) == batch
+    assert decode_batch(dearmor(armor(data)), dictionary) == batch
+
+
+def test_single_record_round_trip(dictionary, records):
+    for record in records[-4:]:
+        assert decode_record(encode_record(record, dictionary), dictionary) == record
+
+
+def test_bit_flips_are_detected(dictionary, records):
+    data = encode_batch(records[:20], dictionary)
+    for position in range(0, len(data), 7):
+        damaged = bytearray(data)
+        damaged[position] ^= 0x10
+        with pytest.raises(CodecError):
+            decode_batch(bytes(damaged), dictionary)
+
+
+@pytest.mark.parametrize("cut", [1, 5, 0.5])
+def test_truncation_is_detected(dictionary, records, cut):
+    data = encode_batch(records[:20], dictionary)
+    cut = int(len(data) * cut) if isinstance(cut, float) else cut
+    with pytest.raises(CodecError):
+        decode_batch(data[:-cut], dictionary)
+
+
+def test_dictionary_mismatch_is_detected(dictionary, records):
+    data = encode_batch(records[:20], dictionary)
+    other = CodecDictionary(dictionary.handles + ["NEW1"], dictionary.states, dictionary.neighborhoods)
+    with pytest.raises(CodecError):
+        decode_batch(data, other)
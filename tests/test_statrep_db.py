@@ -0,0 +1,36 @@
+import sqlite3
+from datetime import datetime, timezone
+
+from manage_schema_v3_prod import SchemaManager
+from statrep_db_v3_prod import StatrepDatabase, latest_by_location_sql, DISPLAY_FIELDS
+
+REPORTED = datetime(2025, 3, 1, 18, 30, tzinfo=timezone.utc)
+
+
+def test_latest_by_location_breaks_a_datetime_group_tie_by_the_higher_id(tmp_path, monkeypatch):
+    path = str(tmp_path / "standin.sqlite")
+    connection = sqlite3.connect(path)
+    SchemaManager(connection, "sqlite").apply()
+    connection.close()
+    monkeypatch.setenv("STATREP_DB_WRITE_SQLITE", path)
+    monkeypatch.delenv("STATREP_DB_READ_SQLITE", raising=False)
+
+    db = StatrepDatabase()
+    assert db.connect() == (True, None)
+    try:
+        assert db.dialect == "sqlite"
+        db.insert_statrep("N0TIE", REPORTED, "Texas", "Downtown", "First copy", "A")
+        db.insert_statrep("N0TIE", REPORTED, "Texas", "Downtown", "Corrected resend", "B")
+        db.insert_statrep("W1AW", REPORTED.replace(hour=17), "Texas", "Downtown", "Main St", "C")
+        success, rows = db.get_latest_statreps_by_location("Texas", "Downtown", use_cache=False)
+    finally:
+        db.close()
+    assert success
+    assert [(row.amcon_handle, row.location) for row in rows] == [("N0TIE", "Corrected resend"),
+                                                                 ("W1AW", "Main St")]
+
+
+def test_oracle_latest_by_location_takes_every_column_from_the_same_row():
+    sql = latest_by_location_sql("oracle", DISPLAY_FIELDS)
+    assert "ROW_NUMBER" not in sql and sql.count("FROM statrep") == 1
+    assert sql.count("KEEP (DENSE_RANK LAST ORDER BY datetime_group, id)") == len(DISPLAY_FIELDS)
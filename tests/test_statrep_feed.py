@@ -0,0 +1,157 @@
+import pytest
+
+import statrep_feed_v3_prod as feed_module
+from statrep_db_v3_prod import StatrepRow
+from statrep_feed_v3_prod import StatrepChangeFeed
+
+
+class CommitOrderDatabase:
+    """Stands in for StatrepDatabase: only committed rows are visible, in id order"""
+    def __init__(self):
+        self.committed = {}
+
+    def commit(self, *ids):
+        for row_id in ids:
+            self.committed[row_id] = StatrepRow(id=row_id, amcon_handle=f"N{row_id}")
+
+    def get_statreps_since(self, last_id, limit=500):
+        rows = [self.committed[row_id] for row_id in sorted(self.committed) if row_id > last_id]
+        return True, rows[:limit]
+
+    def close(self):
+        pass
+
+
+def make_feed(db, batch_size=500):
+    feed = StatrepChangeFeed(start_id=0, batch_size=batch_size)
+    feed.db = db
+    delivered = []
+    feed.subscribe(lambda rows: delivered.extend(row.id for row in rows))
+    return feed, delivered
+
+
+def test_late_commit_below_watermark_is_delivered():
+    db = CommitOrderDatabase()
+    feed, delivered = make_feed(db)
+    db.commit(1, 3)            # 2 is still in flight
+    assert feed.poll_once() == 2
+    assert feed.watermark == 3
+    db.commit(2)
+    assert feed.poll_once() == 1
+    assert feed.poll_once() == 0
+    assert delivered == [1, 3, 2]
+
+
+def test_interleaved_writers_deliver_every_row_once():
+    db = CommitOrderDatabase()
+    feed, delivered = make_feed(db, batch_size=7)
+    # A 50-row batch (ids 1-50) commits after single inserts that took 51-80
+    for row_id in range(51, 81, 2):
+        db.commit(row_id)
+        feed.poll_once()
+    db.commit(*range(1, 51))
+    feed.poll_once()
+    db.commit(*range(52, 81, 2))
+    feed.poll_once()
+    feed.poll_once()
+    assert sorted(delivered) == list(range(1, 81))
+    assert len(delivered) == 80
+
+
+def test_gaps_that_never_fill_expire(monkeypatch):
+    db = CommitOrderDatabase()
+    feed, delivered = make_feed(db)
+    db.commit(1, 5)            # 2-4 rolled back
+    feed.poll_once()
+    assert sorted(feed._gaps) == [2, 3, 4]
+    monkeypatch.setattr(feed_module, "COMMIT_LAG", -1)
+    feed.poll_once()
+    assert feed._gaps == {}
+    assert delivered == [1, 5]
+
+
+class SeedDatabase:
+    """Read connection for FeedIndexLoader: the seed sees whatever rows it is handed"""
+    def __init__(self, role="write"):
+        self.role = role
+
+    def connect(self):
+        return True, None
+
+    def get_max_statrep_id(self):
+        return True, 0
+
+    def close(self):
+        pass
+
+
+class ListIndex:
+    def __init__(self):
+        self.ids = []
+
+    def update(self, rows):
+        self.ids.extend(row.id for row in rows if row.id not in self.ids)
+
+
+def test_loader_keeps_rows_that_arrive_while_seeding(monkeypatch):
+    db = CommitOrderDatabase()
+    feed, _ = make_feed(db)
+    monkeypatch.setattr(feed_module, "get_change_feed", lambda: feed)
+    monkeypatch.setattr(feed_module, "StatrepDatabase", SeedDatabase)
+
+    def seed(index, seed_db):
+        index.update([StatrepRow(id=1), StatrepRow(id=2)])
+        # 2 is seen by the feed too; 3 commits after the seed query ran
+        db.commit(2, 3)
+        feed.poll_once()
+        return 2
+
+    loader = feed_module.FeedIndexLoader("Test index", ListIndex, seed)
+    index = loader.get()
+    assert index.ids == [1, 2, 3]
+    db.commit(4)
+    feed.poll_once()
+    assert index.ids == [1, 2, 3, 4]
+    assert loader.get() is index
+
+
+def test_loader_unsubscribes_when_seed_fails(monkeypatch):
+    feed, _ = make_feed(CommitOrderDatabase())
+    monkeypatch.setattr(feed_module, "get_change_feed", lambda: feed)
+    monkeypatch.setattr(feed_module, "StatrepDatabase", SeedDatabase)
+
+    def seed(index, seed_db):
+        raise RuntimeError("read replica down")
+
+    loader = feed_module.FeedIndexLoader("Test index", ListIndex, seed)
+    with pytest.raises(RuntimeError):
+        loader.get()
+    assert len(feed._subscribers) == 1   # only make_feed's collector
+
+
+def test_loader_reads_rows_the_replica_has_not_applied_from_the_primary(monkeypatch):
+    primary = CommitOrderDatabase()
+    primary.commit(1, 2, 3, 4)
+    feed = StatrepChangeFeed(start_id=4)   # watermark read on the primary
+    feed.db = primary
+    monkeypatch.setattr(feed_module, "get_change_feed", lambda: feed)
+
+    class Database(SeedDatabase):
+        def get_max_statrep_id(self):
+            return True, 2 if self.role == "read" else 4
+
+        def get_statreps_since(self, last_id, limit=500):
+            assert self.role == "write"
+            return primary.get_statreps_since(last_id, limit)
+
+    monkeypatch.setattr(feed_module, "StatrepDatabase", Database)
+
+    def seed(index, seed_db):
+        index.update([StatrepRow(id=1), StatrepRow(id=2)])   # the replica is two rows behind
+        return 2
+
+    index = feed_module.FeedIndexLoader("Test index", ListIndex, seed).get()
+    assert index.ids == [1, 2, 3, 4]
+    primary.commit(5)
+    feed.poll_once()
+    assert index.ids == [1, 2, 3, 4, 5]
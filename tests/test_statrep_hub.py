@@ -0,0 +1,45 @@
+import threading
+import time
+from multiprocessing.connection import Client
+
+from statrep_hub_v3_prod import PubSubHub
+
+
+def test_concurrent_publishers_never_corrupt_a_subscriber_stream():
+    hub = PubSubHub()
+    hub.start()
+    try:
+        listener = Client(hub.address, authkey=hub.authkey)
+        publishers = [Client(hub.address, authkey=hub.authkey) for _ in range(4)]
+        payload = "x" * 20000   # several socket writes per message
+        count = 200
+        while len(hub._clients) < 5:
+            time.sleep(0.01)
+
+        def publish(n, conn):
+            # Publishers get each other's messages too - keep reading them
+            threading.Thread(target=drain, args=(conn,), daemon=True).start()
+            for k in range(count):
+                conn.send(("topic", (n, k, payload)))
+
+        def drain(conn):
+            try:
+                while True:
+                    conn.recv()
+            except (EOFError, OSError):
+                pass
+
+        threads = [threading.Thread(target=publish, args=(n, conn)) for n, conn in enumerate(publishers)]
+        for thread in threads:
+            thread.start()
+        received = {}
+        for _ in range(count * len(publishers)):
+            assert listener.poll(10)
+            topic, (n, k, body) = listener.recv()
+            assert body == payload
+            assert received.get(n, -1) == k - 1   # in order per publisher
+            received[n] = k
+        for thread in threads:
+            thread.join()
+    finally:
+        hub.stop()
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+
+from statrep_db_v3_prod import StatrepRow
+from statrep_search_v3_prod import CommentSearchIndex
+
+NOW = datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def report(row_id, comments, days_ago):
+    return StatrepRow(id=row_id, amcon_handle=f"N{row_id}", datetime_group=NOW - timedelta(days=days_ago),
+                      comments=comments)
+
+
+def test_prune_drops_old_reports_and_their_postings():
+    index = CommentSearchIndex()
+    index.update([report(1, "bridge out on route 9", 40), report(2, "water main break", 1),
+                  report(3, "bridge closed", 2)])
+    assert index.prune(datetime.now(timezone.utc) - timedelta(days=30)) == 1
+    assert len(index) == 2
+    assert "route" not in index._postings
+    assert set(index._postings["bridge"]) == {3}
+    assert index._total_tokens == 5
+    assert [row.id for _, row in index.search("bridge")] == [3]
+
+
+def test_update_prunes_on_schedule():
+    index = CommentSearchIndex()
+    index.update([report(1, "tree down", 45)])
+    assert len(index) == 1
+    index._next_prune = 0
+    index.update([report(2, "tree down again", 0)])
+    assert [row.id for _, row in index.search("tree")] == [2]
+    assert index._next_prune > 0
@@ -0,0 +1,134 @@
+import json
+import lzma
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+import statrep_snapshot_v3_prod
+from statrep_db_v3_prod import StatrepRow
+from statrep_snapshot_v3_prod import (CURRENT_NAME, MANIFEST_NAME, SNAPSHOT_TABLES, apply_delta, build_snapshot,
+                                      generate_snapshot, write_delta)
+
+REPORTED = datetime(2025, 7, 4, 12, 0)
+HANDLES = ["N0CALL", "W1AW", "K5ABC"]
+STATES = ["Texas"]
+NEIGHBORHOODS = ["Downtown", "Uptown"]
+
+
+def report(n, handle, neighborhood="Downtown", conditions="A", minutes=0, **fields):
+    return StatrepRow(id=n, amcon_handle=handle, datetime_group=REPORTED + timedelta(minutes=minutes),
+                      state="Texas", neighborhood=neighborhood, location="EM12ab", conditions=conditions,
+                      grid_square="EM12ab", latitude=32.02083, longitude=-96.95833, **fields)
+
+
+FIRST = [report(1, "N0CALL"), report(2, "W1AW", conditions="B", commercial_power="N", water="Y"),
+         report(3, "K5ABC", "Uptown", conditions="C", grid_comms="N")]
+SECOND = [report(4, "N0CALL", conditions="B", commercial_power="N", minutes=30,
+                 comments="power out since 11:00"),
+          report(3, "K5ABC", "Uptown", conditions="C", grid_comms="N")]    # W1AW gone (archived)
+
+
+def contents(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall())
+                for table in ("meta", *SNAPSHOT_TABLES)}
+    finally:
+        conn.close()
+
+
+def test_snapshot_holds_latest_reports_and_location_rollups(tmp_path):
+    path = str(tmp_path / "snapshot.sqlite")
+    assert build_snapshot(path, iter(FIRST), HANDLES, STATES, NEIGHBORHOODS, "20250704T1200Z") == 3
+    tables = contents(path)
+    assert [row[0] for row in tables["latest_statreps"]] == ["K5ABC", "N0CALL", "W1AW"]
+    assert tables["latest_statreps"][1][2] == "2025-07-04T12:00:00+00:00"
+    assert tables["location_summary"] == [
+        ("Texas", "Downtown", 2, 1, 1, 0, 1, 0, 0, "2025-07-04T12:00:00+00:00"),
+        ("Texas", "Uptown", 1, 0, 0, 1, 0, 0, 1, "2025-07-04T12:00:00+00:00"),
+    ]
+    assert ("snapshot_id", "20250704T1200Z") in tables["meta"]
+
+
+def test_delta_brings_the_old_snapshot_to_the_new_one(tmp_path):
+    old, new = str(tmp_path / "old.sqlite"), str(tmp_path / "new.sqlite")
+    build_snapshot(old, iter(FIRST), HANDLES, STATES, NEIGHBORHOODS, "20250704T1200Z")
+    build_snapshot(new, iter(SECOND), HANDLES + ["KD2XYZ"], STATES, NEIGHBORHOODS[:1], "20250704T1230Z")
+    delta = str(tmp_path / "delta.ndjson.xz")
+    changes = write_delta(new, old, delta)
+
+    with lzma.open(delta, "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0] == {"delta": {"from": "20250704T1200Z", "to": "20250704T1230Z", "schema_version": 1}}
+    ops = {(line["table"], line["op"]) for line in lines[1:]}
+    assert {("handles", "upsert"), ("neighborhoods", "delete"), ("latest_statreps", "upsert"),
+            ("latest_statreps", "delete"), ("location_summary", "upsert")} <= ops
+    # Unchanged rows are not sent
+    assert not any(line.get("row", {}).get("amcon_handle") == "K5ABC" for line in lines[1:])
+    assert changes == sum(1 for line in lines[1:] if line["table"] != "meta")
+
+    station = str(tmp_path / "station.sqlite")
+    shutil.copy(old, station)
+    assert apply_delta(station, delta) == (True, "20250704T1230Z")
+    assert contents(station) == contents(new)
+
+    # Applying it twice is refused - the station is no longer at the delta's start
+    success, error = apply_delta(station, delta)
+    assert not success and "starts at 20250704T1200Z" in error
+
+
+def test_a_tampered_delta_changes_nothing(tmp_path):
+    old, new = str(tmp_path / "old.sqlite"), str(tmp_path / "new.sqlite")
+    build_snapshot(old, iter(FIRST), HANDLES, STATES, NEIGHBORHOODS, "20250704T1200Z")
+    build_snapshot(new, iter(SECOND), HANDLES, STATES, NEIGHBORHOODS, "20250704T1230Z")
+    delta = str(tmp_path / "delta.ndjson.xz")
+    write_delta(new, old, delta)
+    with lzma.open(delta, "at", encoding="utf-8") as f:
+        f.write(json.dumps({"table": "sqlite_master", "op": "delete", "key": {"name": "handles"}}) + "\n")
+
+    before = contents(old)
+    success, error = apply_delta(old, delta)
+    assert not success and "unexpected change" in error
+    assert contents(old) == before
+
+
+class SnapshotDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def iter_latest_statreps(self, batch_size=1000):
+        return iter(self.rows)
+
+
+def test_generate_publishes_snapshots_deltas_and_a_manifest(tmp_path, monkeypatch):
+    ids = iter(["20250704T1200Z", "20250704T1230Z", "20250704T1230Z", "20250704T1300Z"])
+    monkeypatch.setattr(statrep_snapshot_v3_prod, "snapshot_id", lambda: next(ids))
+    out_dir = str(tmp_path)
+    lists = (HANDLES, STATES, NEIGHBORHOODS)
+
+    success, stats = generate_snapshot(out_dir, db=SnapshotDatabase(FIRST), reference_lists=lists)
+    assert success and stats["latest_statreps"] == 3 and "delta_changes" not in stats
+    success, stats = generate_snapshot(out_dir, db=SnapshotDatabase(SECOND), reference_lists=lists)
+    assert success and stats["delta_changes"] > 0
+
+    # Two runs in the same minute would overwrite the published snapshot
+    success, error = generate_snapshot(out_dir, db=SnapshotDatabase(SECOND), reference_lists=lists)
+    assert not success and "already exists" in error
+
+    success, _ = generate_snapshot(out_dir, keep=1, db=SnapshotDatabase(FIRST), reference_lists=lists)
+    assert success
+    with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    assert manifest["latest"] == "20250704T1300Z"
+    assert [entry["name"] for entry in manifest["files"]] == [
+        "statrep_delta_20250704T1230Z_20250704T1300Z.ndjson.xz", "statrep_snapshot_20250704T1300Z.sqlite.xz"]
+    assert sorted(os.listdir(out_dir)) == sorted([CURRENT_NAME, MANIFEST_NAME] +
+                                                 [entry["name"] for entry in manifest["files"]])
+
+    # The published snapshot decompresses to the current one
+    station = str(tmp_path / "station.sqlite")
+    with lzma.open(os.path.join(out_dir, "statrep_snapshot_20250704T1300Z.sqlite.xz")) as src, \
+            open(station, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    assert contents(station) == contents(os.path.join(out_dir, CURRENT_NAME))
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+import pytest
+
+from statrep_codec_v3_prod import CodecDictionary, sample_records
+from statrep_sync_v3_prod import (CENTRAL_NODE_ID, SimulatedLink, SyncResponder, SyncSession, _insert_local,
+                                  _keys, _sqlite_store, simulate)
+
+DICTIONARY = CodecDictionary(["N0CALL", "N1CALL"], ["Texas"], ["Downtown"])
+
+
+def sync(node, link, commit_lag=timedelta(0)):
+    complete, stats = SyncSession(node, link, commit_lag=commit_lag).run()
+    assert complete
+    return stats
+
+
+def test_pull_picks_up_a_report_that_committed_behind_the_watermark():
+    central, node = _sqlite_store(CENTRAL_NODE_ID), _sqlite_store("node0")
+    link = SimulatedLink(SyncResponder(central), loss=0.0)
+    records = sample_records(4, DICTIONARY, seed=1)
+    _insert_local(central, records[:2])
+    sync(node, link)
+    # id 3 is handed out, then 4 commits first and the node syncs past it
+    _insert_local(central, records[3:], first_id=4)
+    sync(node, link)
+    _insert_local(central, records[2:3], first_id=3)
+    stats = sync(node, link)
+    assert stats["pulled"] == 1
+    assert sorted(_keys(node)) == sorted(_keys(central))
+    # nothing moved since: the check costs one count, no rows
+    before = link.bytes_received
+    assert sync(node, link)["pulled"] == 0
+    assert link.bytes_received - before < 200
+
+
+def test_trusting_the_watermark_misses_it():
+    central, node = _sqlite_store(CENTRAL_NODE_ID), _sqlite_store("node0")
+    link = SimulatedLink(SyncResponder(central), loss=0.0)
+    records = sample_records(2, DICTIONARY, seed=1)
+    _insert_local(central, records[1:], first_id=2)
+    sync(node, link, commit_lag=None)
+    _insert_local(central, records[:1], first_id=1)
+    assert sync(node, link, commit_lag=None)["pulled"] == 0
+    assert len(_keys(node)) == 1
+
+
+def test_simulation_converges_with_late_commits_and_lossy_links():
+    stats = simulate(nodes=3, reports=300, rounds=5, loss=0.2, late=0.2)
+    assert stats["reports"] == 300
+    with pytest.raises(AssertionError):
+        simulate(nodes=3, reports=300, rounds=5, loss=0.2, late=0.2, recheck=False)
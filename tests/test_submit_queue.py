@@ -0,0 +1,98 @@
+import threading
+
+import statrep_submit_queue_v3_prod as queue_module
+from statrep_submit_queue_v3_prod import SubmissionQueue
+from statrep_logging_v3_prod import correlation_context, get_correlation_id
+
+
+class FlakyDatabase:
+    """Writer connection whose first insert loses the session"""
+    opened = []
+
+    def __init__(self):
+        self.closed = False
+        self.connection_lost = False
+        FlakyDatabase.opened.append(self)
+
+    def connect(self):
+        return True, None
+
+    def insert_statrep(self, **record):
+        if len(FlakyDatabase.opened) == 1:
+            self.connection_lost = True
+            return False, "Insert failed: DPY-4011: the database or network closed the connection"
+        return True, 42
+
+    def close(self):
+        self.closed = True
+
+
+def record(handle, key):
+    return {"amcon_handle": handle, "idempotency_key": key}
+
+
+def test_writer_reconnects_after_a_dropped_session(monkeypatch):
+    FlakyDatabase.opened = []
+    monkeypatch.setattr(queue_module, "StatrepDatabase", FlakyDatabase)
+    queue = SubmissionQueue(writers=1)
+    queue.start()
+    try:
+        _, first = queue.submit(record("N0A", "k1"))
+        assert first.done.wait(5) and first.success is False
+        _, second = queue.submit(record("N0A", "k2"))
+        assert second.done.wait(5) and (second.success, second.result) == (True, 42)
+    finally:
+        queue.stop()
+    assert len(FlakyDatabase.opened) == 2
+    assert FlakyDatabase.opened[0].closed
+
+
+def test_on_done_is_handed_to_run_callback(monkeypatch):
+    FlakyDatabase.opened = [None]   # skip the dropped session
+    monkeypatch.setattr(queue_module, "StatrepDatabase", FlakyDatabase)
+    called = threading.Event()
+    results = []
+
+    def run_thread(handler, *args):
+        threading.Thread(target=handler, args=args).start()
+
+    def on_done(success, result):
+        results.append((success, result, threading.current_thread().name))
+        called.set()
+
+    queue = SubmissionQueue(writers=1)
+    queue.start()
+    try:
+        queue.submit(record("N0A", "k3"), on_done, run_callback=run_thread)
+        assert called.wait(5)
+    finally:
+        queue.stop()
+    success, result, thread_name = results[0]
+    assert (success, result) == (True, 42)
+    assert not thread_name.startswith("statrep-writer")
+
+
+def test_writer_and_callback_run_under_the_submitters_correlation_id(monkeypatch):
+    seen = []
+
+    class TracingDatabase(FlakyDatabase):
+        def insert_statrep(self, **record):
+            seen.append(("insert", get_correlation_id()))
+            return True, 42
+
+    monkeypatch.setattr(queue_module, "StatrepDatabase", TracingDatabase)
+    called = threading.Event()
+
+    def on_done(success, result):
+        seen.append(("on_done", get_correlation_id()))
+        called.set()
+
+    queue = SubmissionQueue(writers=1)
+    queue.start()
+    try:
+        with correlation_context("req-1234"):
+            queue.submit(record("N0A", "k4"), on_done)
+        assert called.wait(5)
+    finally:
+        queue.stop()
+    assert seen == [("insert", "req-1234"), ("on_done", "req-1234")]
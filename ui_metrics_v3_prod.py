@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Opt in with STATREP_UI_METRICS=1 - measuring serializes every update a second time
+UI_METRICS_ENV = "STATREP_UI_METRICS"
+
+def ui_metrics_enabled():
+    return os.getenv(UI_METRICS_ENV, "").lower() in ("1", "true", "yes")
+
+def _event_name():
+    """Name of the app function that triggered the update (first frame outside flet and this module)"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if f"{os.sep}flet{os.sep}" not in filename and filename != __file__:
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return "unknown"
+
+class UpdateMetrics:
+    def __init__(self, parent=None):
+        """
+        Per-event totals of the diff payloads Flet sends to the browser:
+        number of updates, commands and JSON bytes, the largest update, and
+        the server time spent walking the control tree to build the diff.
+        A session's metrics pass every record on to parent (the process totals).
+        """
+        self.parent = parent
+        self._events = {}  # event -> {"updates", "commands", "bytes", "max_bytes", "diff_ms"}
+        self._lock = threading.Lock()
+
+    def record(self, event, commands, size, diff_seconds=0.0):
+        if self.parent is not None:
+            self.parent.record(event, commands, size, diff_seconds)
+        with self._lock:
+            entry = self._events.setdefault(
+                event, {"updates": 0, "commands": 0, "bytes": 0, "max_bytes": 0, "diff_ms": 0.0})
+            entry["updates"] += 1
+            entry["commands"] += commands
+            entry["bytes"] += size
+            entry["max_bytes"] = max(entry["max_bytes"], size)
+            entry["diff_ms"] += diff_seconds * 1000
+
+    def snapshot(self):
+        """{event: totals}, largest total payload first"""
+        with self._lock:
+            items = sorted(self._events.items(), key=lambda item: item[1]["bytes"], reverse=True)
+            return {event: dict(entry) for event, entry in items}
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+
+    def log_summary(self, label="", limit=15):
+        for event, entry in list(self.snapshot().items())[:limit]:
+            logger.info(f"UI updates{label} {event}: {entry['updates']} updates, {entry['commands']} commands, "
+                        f"{entry['bytes']} bytes (avg {entry['bytes'] // entry['updates']}, max {entry['max_bytes']}), "
+                        f"{entry['diff_ms']:.1f} ms building diffs")
+
+
+_metrics = UpdateMetrics()
+
+def get_update_metrics():
+    """Return the process-wide UI update metrics"""
+    return _metrics
+
+def instrument_page(page, metrics=None):
+    """
+    Record the size of every update diff this page sends. Wraps the page's
+    private update builder, so it sees page.update(), control.update() and
+    batched page.update(a, b) alike.
+    Returns: this session's UpdateMetrics (also added to metrics, default the
+    process totals), or None if this Flet version has no such builder
+    """
+    try:
+        from flet.core.protocol import CommandEncoder
+    except ImportError:
+        CommandEncoder = None
+    prepare_update = getattr(page, "_Page__prepare_update", None)
+    if CommandEncoder is None or prepare_update is None:
+        logger.warning("UI metrics unavailable with this Flet version - page updates are not measured")
+        return None
+    metrics = UpdateMetrics(parent=metrics or _metrics)
+
+    def measured_prepare_update(*controls):
+        started = time.perf_counter()
+        commands, added_controls, removed_controls = prepare_update(*controls)
+        elapsed = time.perf_counter() - started
+        size = len(json.dumps(commands, cls=CommandEncoder, separators=(",", ":")))
+        metrics.record(_event_name(), len(commands), size, elapsed)
+        return commands, added_controls, removed_controls
+
+    page._Page__prepare_update = measured_prepare_update
+    return metrics